@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Benchmark the ECDSA backends
+
+Reports verify, sign and compact signature recovery throughput of every
+available backend, along with that of verify_batch() on four threads. Set
+GOZER_SECP256K1_LIBRARY to the path of a locally built libsecp256k1 if it
+isn't installed system-wide.
+"""
+
+import hashlib
+import sys
+import timeit
+
+sys.path.insert(0, '.')
+
+from gozer.core.key import *
+from gozer.wallet import CKey
+
+hashes = [hashlib.sha256(str(i).encode()).digest() for i in range(100)]
+
+print('%-10s %12s %12s %12s %12s' % ('', 'verify/s', 'batch/s', 'sign/s', 'recover/s'))
+for backend in available_ecdsa_backends():
+    set_ecdsa_backend(backend)
+    key = CKey(hashlib.sha256(b'bench').digest())
+    pub = CPubKey(key.pub)
+    sigs = [key.sign(h) for h in hashes]
+    compact_sigs = []
+    for h in hashes:
+        (sig, recid) = key.sign_compact(h)
+        compact_sigs.append(bytes([31 + recid]) + sig)
+
+    def verify():
+        for h, sig in zip(hashes, sigs):
+            assert pub.verify(h, sig)
+
+    def batch():
+        assert verify_batch([(pub, h, sig) for h, sig in zip(hashes, sigs)], all_valid=True,
+                            workers=4)
+
+    def sign():
+        for h in hashes:
+            key.sign(h)
+
+    def recover():
+        for h, sig in zip(hashes, compact_sigs):
+            CPubKey.recover_compact(h, sig)
+
+    number = 1 if backend == 'python' else 10
+    rates = []
+    for f in (verify, batch, sign, recover):
+        t = min(timeit.repeat(f, number=number, repeat=3)) / number
+        rates.append(len(hashes) / t)
+    print('%-10s %12.0f %12.0f %12.0f %12.0f' % ((backend,) + tuple(rates)))
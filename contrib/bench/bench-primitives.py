@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Benchmark construction and memory use of the transaction primitives
+
+Compares the public, validating constructors with the _from_fields() path
+used by deserialization, and reports the memory taken per CTxOut.
+"""
+
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, '.')
+
+from gozer.core import *
+from gozer.core.script import CScript
+
+N = 200000
+
+script = CScript(b'\x76\xa9\x14' + b'\x11'*20 + b'\x88\xac')
+outpoint = COutPoint(b'\x22'*32, 1)
+txin = CTxIn(outpoint, script, 0xfffffffe)
+txout = CTxOut(12345, script)
+vin = (txin,) * 2
+vout = (txout,) * 2
+
+cases = [
+    ('COutPoint',    lambda: COutPoint(b'\x22'*32, 1),
+                     lambda: COutPoint._from_fields(b'\x22'*32, 1)),
+    ('CTxIn',        lambda: CTxIn(outpoint, script, 0xfffffffe),
+                     lambda: CTxIn._from_fields(outpoint, script, 0xfffffffe)),
+    ('CTxOut',       lambda: CTxOut(12345, script),
+                     lambda: CTxOut._from_fields(12345, script)),
+    ('CTransaction', lambda: CTransaction(vin, vout, 0, 1),
+                     lambda: CTransaction._from_fields(vin, vout, 0, 1)),
+    ('CBlockHeader', lambda: CBlockHeader(1, b'\x00'*32, b'\x00'*32, 0, 0, 0),
+                     lambda: CBlockHeader._from_fields(1, b'\x00'*32, b'\x00'*32, 0, 0, 0)),
+]
+
+print('%-14s %12s %12s %8s' % ('', '__init__', '_from_fields', 'speedup'))
+for name, slow, fast in cases:
+    t_slow = min(timeit.repeat(slow, number=N, repeat=3)) / N * 1e9
+    t_fast = min(timeit.repeat(fast, number=N, repeat=3)) / N * 1e9
+    print('%-14s %10.0fns %10.0fns %7.2fx' % (name, t_slow, t_fast, t_slow / t_fast))
+
+serialized = CTransaction(vin, vout).serialize()
+t = min(timeit.repeat(lambda: CTransaction.deserialize(serialized), number=N//10, repeat=3)) / (N//10) * 1e6
+print('\nCTransaction.deserialize(), 2 in 2 out: %.1fus' % t)
+
+tracemalloc.start()
+before = tracemalloc.get_traced_memory()[0]
+txouts = [CTxOut._from_fields(12345, script) for i in range(N)]
+after = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+print('\nMemory per CTxOut: %d bytes (object), %d bytes (allocated, incl. list slot; script shared)'
+      % (sys.getsizeof(txouts[0]), (after - before) / N))
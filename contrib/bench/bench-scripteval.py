@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Copyright (C) 2013-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Benchmark script interpreter throughput
+
+Reports opcodes executed per second by EvalScript() for a few synthetic
+scripts and for the signature-free scripts of script_valid.json. Signature
+checks are left out, as their cost is that of the ECDSA library rather than
+of the interpreter.
+"""
+
+import sys
+import timeit
+
+sys.path.insert(0, '.')
+
+from gozer.core import *
+from gozer.core.script import *
+from gozer.core.scripteval import *
+from gozer.tests.test_scripteval import load_test_vectors
+
+tx = CTransaction([CTxIn()], [CTxOut()])
+
+# Each script stays within MAX_SCRIPT_OPCODES
+scripts = [
+    ('arithmetic',   CScript([1, 2, OP_ADD, 3, OP_SUB, OP_1ADD, OP_ABS, OP_NEGATE, OP_DROP] * 30)),
+    ('stack',        CScript([1, 2, 3, OP_ROT, OP_SWAP, OP_OVER, OP_2DUP, OP_2DROP, OP_TUCK,
+                              OP_NIP, OP_TOALTSTACK, OP_FROMALTSTACK, OP_2DROP, OP_2DROP] * 18)),
+    ('conditionals', CScript([1, OP_IF, 2, OP_ELSE, 3, OP_ENDIF,
+                              0, OP_IF, 2, OP_DUP, OP_ELSE, 3, OP_ENDIF, OP_2DROP] * 25)),
+    ('hashing',      CScript([b'x' * 32] + [OP_SHA256, OP_HASH160, OP_HASH256, OP_RIPEMD160] * 45)),
+]
+
+SIG_OPS = {OP_CHECKSIG, OP_CHECKSIGVERIFY, OP_CHECKMULTISIG, OP_CHECKMULTISIGVERIFY}
+
+vectors = []
+for scriptSig, scriptPubKey, flags, comment, test_case in load_test_vectors('script_valid.json'):
+    try:
+        if SIG_OPS.intersection(op for op, data, pc in scriptPubKey.raw_iter()):
+            continue
+        ops = [op for script in (scriptSig, scriptPubKey) for op in script.raw_iter()]
+    except CScriptInvalidError:
+        continue
+    vectors.append((scriptSig, scriptPubKey, flags, len(ops)))
+
+def eval_script(script):
+    EvalScript([], script, tx, 0)
+
+def eval_vectors():
+    for scriptSig, scriptPubKey, flags, n in vectors:
+        stack = []
+        try:
+            EvalScript(stack, scriptSig, tx, 0, flags)
+            EvalScript(stack, scriptPubKey, tx, 0, flags)
+        except EvalScriptError:
+            pass
+
+print('%-14s %8s %14s' % ('', 'opcodes', 'opcodes/s'))
+for name, script in scripts:
+    n = len(list(script.raw_iter()))
+    number = max(1, 200000 // n)
+    t = min(timeit.repeat(lambda: eval_script(script), number=number, repeat=3)) / number
+    print('%-14s %8d %14.0f' % (name, n, n / t))
+
+n = sum(v[3] for v in vectors)
+t = min(timeit.repeat(eval_vectors, number=5, repeat=3)) / 5
+print('%-14s %8d %14.0f' % ('script_valid', n, n / t))
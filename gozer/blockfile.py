@@ -0,0 +1,228 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Reading the node's raw block files
+
+The node stores blocks in blocks/blk?????.dat, each block prefixed by the
+network's message start magic and its length. Files are memory-mapped rather
+than read into memory, and blocks are yielded one at a time.
+
+Blocks can be returned in one of three modes:
+
+    'block' - CBlock instances
+    'lazy'  - CBlock instances whose transactions are CLazyTransactions
+    'raw'   - the serialized block, as bytes
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import mmap
+import os
+import re
+import struct
+
+import gozer
+from gozer.core import CBlock, MAX_BLOCK_WEIGHT
+
+BLOCK_MODES = ('block', 'lazy', 'raw')
+
+_BLOCK_FILE_RE = re.compile(r'^blk(\d+)\.dat$')
+
+
+def block_files(blocks_dir):
+    """Return the paths of the blk*.dat files in blocks_dir, in file order"""
+    files = []
+    for name in os.listdir(blocks_dir):
+        m = _BLOCK_FILE_RE.match(name)
+        if m:
+            files.append((int(m.group(1)), os.path.join(blocks_dir, name)))
+    return [path for n, path in sorted(files)]
+
+
+class _MappedFile(object):
+    """Context manager mapping a file read-only; None for empty files"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.f = open(self.path, 'rb')
+        self.m = None
+        if os.fstat(self.f.fileno()).st_size:
+            self.m = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.m
+
+    def __exit__(self, *exc):
+        if self.m is not None:
+            try:
+                self.m.close()
+            except BufferError:
+                # Something, e.g. a traceback, still holds a view of the
+                # mapping; it'll be unmapped once that goes away.
+                pass
+        self.f.close()
+
+
+def _scan(m, magic):
+    # Mirrors the node's reindexing: look for the magic, and if the length
+    # that follows doesn't make sense resume the search just past it. This
+    # also skips over the zero padding of preallocated files.
+    size = len(m)
+    pos = 0
+    while True:
+        pos = m.find(magic, pos)
+        if pos < 0 or pos + 8 > size:
+            return
+        (length,) = struct.unpack_from(b"<I", m, pos + 4)
+        start = pos + 8
+        if length < 80 or length > MAX_BLOCK_WEIGHT or start + length > size:
+            pos += 1
+            continue
+        yield start, length
+        pos = start + length
+
+
+def scan_block_file(path, magic=None):
+    """Find the blocks in a block file
+
+    Yields (offset, length) of each serialized block. magic defaults to the
+    MESSAGE_START of the currently selected chain parameters.
+    """
+    if magic is None:
+        magic = gozer.params.MESSAGE_START
+    with _MappedFile(path) as m:
+        if m is not None:
+            for span in _scan(m, magic):
+                yield span
+
+
+def _parse(m, offset, length, mode):
+    if mode == 'raw':
+        return m[offset:offset + length]
+    view = memoryview(m)
+    try:
+        return CBlock.deserialize(view[offset:offset + length], params=dict(lazy=(mode == 'lazy')),
+                                  zerocopy=True)
+    finally:
+        view.release()
+
+
+def _parse_blocks(path, spans, mode):
+    """Worker entry point: parse the blocks at spans in path"""
+    with _MappedFile(path) as m:
+        return [_parse(m, offset, length, mode) for offset, length in spans]
+
+
+def read_block_file(path, mode='block', magic=None):
+    """Yield the blocks in a block file, in file order
+
+    See the module documentation for the modes.
+    """
+    if mode not in BLOCK_MODES:
+        raise ValueError('Unknown mode %r' % mode)
+    if magic is None:
+        magic = gozer.params.MESSAGE_START
+    with _MappedFile(path) as m:
+        if m is not None:
+            for offset, length in _scan(m, magic):
+                yield _parse(m, offset, length, mode)
+
+
+def read_block_files(paths, mode='block', magic=None, executor=None, ordered=True, batch_size=64,
+                     workers=None):
+    """Yield the blocks in a sequence of block files
+
+    Without an executor the blocks are parsed in this process, in order.
+    Otherwise files are scanned here while parsing is done by executor, e.g. a
+    concurrent.futures.ProcessPoolExecutor, in batches of batch_size blocks.
+    Each worker maps the file itself, so block data isn't sent to it. If
+    ordered is False blocks are yielded as soon as their batch is done,
+    rather than in file order.
+
+    workers is the number of workers executor has, defaulting to the number
+    of CPUs; twice as many batches as that are kept in flight.
+    """
+    if mode not in BLOCK_MODES:
+        raise ValueError('Unknown mode %r' % mode)
+    if magic is None:
+        magic = gozer.params.MESSAGE_START
+
+    if executor is None:
+        for path in paths:
+            for block in read_block_file(path, mode, magic):
+                yield block
+        return
+
+    def batches():
+        for path in paths:
+            spans = []
+            for span in scan_block_file(path, magic):
+                spans.append(span)
+                if len(spans) == batch_size:
+                    yield path, spans
+                    spans = []
+            if spans:
+                yield path, spans
+
+    # Only a bounded number of batches are in flight, so a slow consumer
+    # doesn't end up with every block of every file in memory.
+    if workers is None:
+        import multiprocessing
+        workers = multiprocessing.cpu_count()
+    max_pending = 2 * workers
+    pending = collections.deque()
+    try:
+        for path, spans in batches():
+            pending.append(executor.submit(_parse_blocks, path, spans, mode))
+            while len(pending) >= max_pending:
+                for block in _next_batch(pending, ordered):
+                    yield block
+        while pending:
+            for block in _next_batch(pending, ordered):
+                yield block
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _next_batch(pending, ordered):
+    if ordered:
+        return pending.popleft().result()
+
+    import concurrent.futures
+    done, not_done = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+    future = next(f for f in pending if f in done)
+    pending.remove(future)
+    return future.result()
+
+
+def write_block_file(f, blocks, magic=None):
+    """Write blocks to the open file f in block file format
+
+    blocks may be CBlocks or serialized blocks.
+    """
+    if magic is None:
+        magic = gozer.params.MESSAGE_START
+    for block in blocks:
+        if not isinstance(block, bytes):
+            block = block.serialize()
+        f.write(magic + struct.pack(b"<I", len(block)) + block)
+
+
+__all__ = (
+        'BLOCK_MODES',
+        'block_files',
+        'scan_block_file',
+        'read_block_file',
+        'read_block_files',
+        'write_block_file',
+)
@@ -16,6 +16,7 @@ import struct
 import sys
 import time
 
+from .merkle import MerkleTree
 from .script import CScript, CScriptWitness, CScriptOp, OP_RETURN
 
 from .serialize import *
@@ -32,6 +33,24 @@ MAX_BLOCK_WEIGHT = 40000000
 MAX_BLOCK_SIGOPS = MAX_BLOCK_SIZE/50
 WITNESS_COINBASE_SCRIPTPUBKEY_MAGIC = _bytes([OP_RETURN, 0xcc, 0xb6, 0x4a, 0xff, 0xde])
 
+# Precompiled codecs for the fixed-layout parts of the wire format
+_struct_int32 = struct.Struct(b"<i")
+_struct_uint32 = struct.Struct(b"<I")
+_struct_int64 = struct.Struct(b"<q")
+_struct_tx_prefix = struct.Struct(b"<iBB")
+_struct_outpoint = struct.Struct(b"<32sI")
+_struct_header = struct.Struct(b"<i32s32sIII")
+
+_new = object.__new__
+
+def _slot_setters(cls, *names):
+    """Return the __set__ methods of the named slots of cls
+
+    Calling these directly is the cheapest way to fill in a new instance of an
+    immutable class, and is what the _from_fields() constructors use.
+    """
+    return tuple(getattr(cls, name).__set__ for name in names)
+
 def MoneyRange(nValue, params=None):
     global coreparams
     if not params:
@@ -138,16 +157,43 @@ class COutPoint(ImmutableSerializable):
             raise ValueError('COutPoint: n must be in range 0x0 to 0xffffffff; got %x' % n)
         object.__setattr__(self, 'n', n)
 
+    @classmethod
+    def _from_fields(cls, hash, n):
+        """Create an outpoint from known-good fields, skipping validation"""
+        self = _new(cls)
+        _set_outpoint_hash(self, hash)
+        _set_outpoint_n(self, n)
+        return self
+
     @classmethod
     def stream_deserialize(cls, f):
-        hash = ser_read(f,32)
-        n = struct.unpack(b"<I", ser_read(f,4))[0]
-        return cls(hash, n)
+        hash, n = _struct_outpoint.unpack(ser_read(f, 36))
+        return cls._from_fields(hash, n)
+
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        (hash, n), offset = ser_unpack_from(_struct_outpoint, buf, offset)
+        return cls._from_fields(hash, n), offset
+
+    @classmethod
+    def deserialize_array(cls, buf, offset=0, count=None):
+        """Deserialize count consecutive outpoints from a buffer
+
+        If count is None the rest of the buffer is used. Returns (outpoints,
+        offset).
+        """
+        values, offset = ser_unpack_array(_struct_outpoint, buf, offset, count)
+        from_fields = cls._from_fields
+        return [from_fields(hash, n) for hash, n in values], offset
+
+    @staticmethod
+    def serialize_array(outpoints):
+        """Serialize outpoints back to back, as read by deserialize_array()"""
+        return ser_pack_array(_struct_outpoint, [(o.hash, o.n) for o in outpoints])
 
     def stream_serialize(self, f):
         assert len(self.hash) == 32
-        f.write(self.hash)
-        f.write(struct.pack(b"<I", self.n))
+        f.write(_struct_outpoint.pack(self.hash, self.n))
 
     def is_null(self):
         return ((self.hash == b'\x00'*32) and (self.n == 0xffffffff))
@@ -174,6 +220,8 @@ class COutPoint(ImmutableSerializable):
         else:
             return cls(outpoint.hash, outpoint.n)
 
+_set_outpoint_hash, _set_outpoint_n = _slot_setters(COutPoint, 'hash', 'n')
+
 @__make_mutable
 class CMutableOutPoint(COutPoint):
     """A mutable COutPoint"""
@@ -200,17 +248,34 @@ class CTxIn(ImmutableSerializable):
         object.__setattr__(self, 'prevout', prevout)
         object.__setattr__(self, 'scriptSig', scriptSig)
 
+    @classmethod
+    def _from_fields(cls, prevout, scriptSig, nSequence):
+        """Create an input from known-good fields, skipping validation"""
+        self = _new(cls)
+        _set_txin_prevout(self, prevout)
+        _set_txin_scriptSig(self, scriptSig)
+        _set_txin_nSequence(self, nSequence)
+        return self
+
     @classmethod
     def stream_deserialize(cls, f):
         prevout = COutPoint.stream_deserialize(f)
         scriptSig = script.CScript(BytesSerializer.stream_deserialize(f))
-        nSequence = struct.unpack(b"<I", ser_read(f,4))[0]
-        return cls(prevout, scriptSig, nSequence)
+        (nSequence,) = _struct_uint32.unpack(ser_read(f, 4))
+        return cls._from_fields(prevout, scriptSig, nSequence)
+
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        prevout, offset = COutPoint.buffer_deserialize(buf, offset)
+        l, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        scriptSig, offset = ser_read_buffer(buf, offset, l)
+        (nSequence,), offset = ser_unpack_from(_struct_uint32, buf, offset)
+        return cls._from_fields(prevout, script.CScript(scriptSig), nSequence), offset
 
     def stream_serialize(self, f):
         COutPoint.stream_serialize(self.prevout, f)
         BytesSerializer.stream_serialize(self.scriptSig, f)
-        f.write(struct.pack(b"<I", self.nSequence))
+        f.write(_struct_uint32.pack(self.nSequence))
 
     def is_final(self):
         return (self.nSequence == 0xffffffff)
@@ -231,6 +296,9 @@ class CTxIn(ImmutableSerializable):
         else:
             return cls(COutPoint.from_outpoint(txin.prevout), txin.scriptSig, txin.nSequence)
 
+_set_txin_prevout, _set_txin_scriptSig, _set_txin_nSequence = \
+        _slot_setters(CTxIn, 'prevout', 'scriptSig', 'nSequence')
+
 @__make_mutable
 class CMutableTxIn(CTxIn):
     """A mutable CTxIn"""
@@ -265,14 +333,29 @@ class CTxOut(ImmutableSerializable):
         object.__setattr__(self, 'nValue', int(nValue))
         object.__setattr__(self, 'scriptPubKey', scriptPubKey)
 
+    @classmethod
+    def _from_fields(cls, nValue, scriptPubKey):
+        """Create an output from known-good fields, skipping validation"""
+        self = _new(cls)
+        _set_txout_nValue(self, nValue)
+        _set_txout_scriptPubKey(self, scriptPubKey)
+        return self
+
     @classmethod
     def stream_deserialize(cls, f):
-        nValue = struct.unpack(b"<q", ser_read(f,8))[0]
+        (nValue,) = _struct_int64.unpack(ser_read(f, 8))
         scriptPubKey = script.CScript(BytesSerializer.stream_deserialize(f))
-        return cls(nValue, scriptPubKey)
+        return cls._from_fields(nValue, scriptPubKey)
+
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        (nValue,), offset = ser_unpack_from(_struct_int64, buf, offset)
+        l, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        scriptPubKey, offset = ser_read_buffer(buf, offset, l)
+        return cls._from_fields(nValue, script.CScript(scriptPubKey)), offset
 
     def stream_serialize(self, f):
-        f.write(struct.pack(b"<q", self.nValue))
+        f.write(_struct_int64.pack(self.nValue))
         BytesSerializer.stream_serialize(self.scriptPubKey, f)
 
     def is_valid(self):
@@ -301,6 +384,8 @@ class CTxOut(ImmutableSerializable):
         else:
             return cls(txout.nValue, txout.scriptPubKey)
 
+_set_txout_nValue, _set_txout_scriptPubKey = _slot_setters(CTxOut, 'nValue', 'scriptPubKey')
+
 @__make_mutable
 class CMutableTxOut(CTxOut):
     """A mutable CTxOut"""
@@ -327,6 +412,11 @@ class CTxInWitness(ImmutableSerializable):
         scriptWitness = CScriptWitness.stream_deserialize(f)
         return cls(scriptWitness)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        scriptWitness, offset = CScriptWitness.buffer_deserialize(buf, offset)
+        return cls(scriptWitness), offset
+
     def stream_serialize(self, f):
         self.scriptWitness.stream_serialize(f)
 
@@ -386,8 +476,15 @@ class CTxWitness(ImmutableSerializable):
 
 
 class CTransaction(ImmutableSerializable):
-    """A transaction"""
-    __slots__ = ['nVersion', 'vin', 'vout', 'nLockTime', 'wit']
+    """A transaction
+
+    Transactions created by deserialization retain the bytes they were
+    deserialized from, so GetTxid(), GetHash() and serialize() don't have to
+    re-serialize anything.
+    """
+    __slots__ = ['nVersion', 'vin', 'vout', 'nLockTime', 'wit',
+                 '_raw', '_vin_pos', '_wit_pos', '_cached_GetTxid',
+                 '_cached_size', '_cached_stripped_size', '_cached_txdata']
 
     def __init__(self, vin=(), vout=(), nLockTime=0, nVersion=1, witness=CTxWitness()):
         """Create a new transaction
@@ -404,6 +501,21 @@ class CTransaction(ImmutableSerializable):
         object.__setattr__(self, 'vout', tuple(CTxOut.from_txout(txout) for txout in vout))
         object.__setattr__(self, 'wit', CTxWitness.from_txwitness(witness))
 
+    @classmethod
+    def _from_fields(cls, vin, vout, nLockTime, nVersion, witness=None):
+        """Create a transaction from known-good fields, skipping validation
+
+        vin and vout must be tuples of immutable inputs and outputs, and
+        witness a CTxWitness or None; nothing is copied.
+        """
+        self = _new(cls)
+        _set_tx_nLockTime(self, nLockTime)
+        _set_tx_nVersion(self, nVersion)
+        _set_tx_vin(self, vin)
+        _set_tx_vout(self, vout)
+        _set_tx_wit(self, _empty_witness if witness is None else witness)
+        return self
+
     @classmethod
     def stream_deserialize(cls, f):
         """Deserialize a transaction.  This implementation corresponds to
@@ -414,7 +526,15 @@ class CTransaction(ImmutableSerializable):
             have zero inputs: they are invalid but may be (de-)serialized anyway
             for the purpose of signing them and adding inputs.  If the behavior
             of DecodeHexTx() is needed it could be added, but not here.  """
-        nVersion = struct.unpack(b"<i", ser_read(f,4))[0]
+        # In-memory streams are deserialized in place, which lets the raw
+        # bytes be retained.
+        if hasattr(f, 'getbuffer'):
+            with f.getbuffer() as buf:
+                self, end = cls.buffer_deserialize(buf, f.tell())
+            f.seek(end)
+            return self
+
+        (nVersion,) = _struct_int32.unpack(ser_read(f, 4))
         pos = f.tell()
         markerbyte = struct.unpack(b'B', ser_read(f, 1))[0]
         flagbyte = struct.unpack(b'B', ser_read(f, 1))[0]
@@ -423,18 +543,79 @@ class CTransaction(ImmutableSerializable):
             vout = VectorSerializer.stream_deserialize(CTxOut, f)
             wit = CTxWitness(tuple(0 for dummy in range(len(vin))))
             wit = wit.stream_deserialize(f)
-            nLockTime = struct.unpack(b"<I", ser_read(f,4))[0]
-            return cls(vin, vout, nLockTime, nVersion, wit)
+            (nLockTime,) = _struct_uint32.unpack(ser_read(f, 4))
+            return cls._from_fields(tuple(vin), tuple(vout), nLockTime, nVersion, wit)
         else:
             f.seek(pos) # put marker byte back, since we don't have peek
             vin = VectorSerializer.stream_deserialize(CTxIn, f)
             vout = VectorSerializer.stream_deserialize(CTxOut, f)
-            nLockTime = struct.unpack(b"<I", ser_read(f,4))[0]
-            return cls(vin, vout, nLockTime, nVersion)
+            (nLockTime,) = _struct_uint32.unpack(ser_read(f, 4))
+            return cls._from_fields(tuple(vin), tuple(vout), nLockTime, nVersion)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        """Deserialize a transaction from a buffer
+
+        Same consensus behavior as stream_deserialize(). The boundaries of the
+        transaction are found first; unless it contains non-canonical
+        CompactSize encodings its bytes are then retained.
+        """
+        vin_pos, vout_pos, wit_pos, end, has_witness, canonical = _scan_transaction(buf, offset)
+        (nVersion,) = _struct_int32.unpack_from(buf, offset)
+        (nLockTime,) = _struct_uint32.unpack_from(buf, end - 4)
+        vin, pos = VectorSerializer.buffer_deserialize(CTxIn, buf, vin_pos)
+        vout, pos = VectorSerializer.buffer_deserialize(CTxOut, buf, vout_pos)
+        if vin_pos - offset == 6:
+            pos = wit_pos
+            vtxinwit = []
+            for dummy in range(len(vin)):
+                txinwit, pos = CTxInWitness.buffer_deserialize(buf, pos)
+                vtxinwit.append(txinwit)
+            self = cls._from_fields(tuple(vin), tuple(vout), nLockTime, nVersion,
+                                    CTxWitness(tuple(vtxinwit)))
+        else:
+            self = cls._from_fields(tuple(vin), tuple(vout), nLockTime, nVersion)
+
+        if canonical:
+            self._retain_raw(bytes(buf[offset:end]), vin_pos - offset, wit_pos - offset)
+        return self, end
+
+    def _retain_raw(self, raw, vin_pos, wit_pos):
+        """Keep the bytes this transaction was deserialized from
+
+        vin_pos and wit_pos are the offsets of the inputs and of the witness
+        section, the latter being where nLockTime starts if there is none.
+        """
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_vin_pos', vin_pos)
+        object.__setattr__(self, '_wit_pos', wit_pos)
+
+    def _stripped_raw(self):
+        """The retained bytes, less any marker, flag and witness data"""
+        if self._vin_pos == 4:
+            return self._raw
+        return self._raw[:4] + self._raw[self._vin_pos:self._wit_pos] + self._raw[-4:]
+
+    def _serialized(self, include_witness=True):
+        """Return the serialization, straight from the retained bytes if any"""
+        try:
+            self._raw
+        except AttributeError:
+            return self.serialize(dict(include_witness=include_witness))
+        if include_witness and self.has_witness():
+            return self._raw
+        return self._stripped_raw()
 
     def stream_serialize(self, f, include_witness=True):
-        f.write(struct.pack(b"<i", self.nVersion))
+        try:
+            self._raw
+        except AttributeError:
+            pass
+        else:
+            f.write(self._serialized(include_witness))
+            return
+
+        f.write(_struct_int32.pack(self.nVersion))
         if include_witness and not self.wit.is_null():
             assert(len(self.wit.vtxinwit) <= len(self.vin))
             f.write(b'\x00') # Marker
@@ -445,7 +626,7 @@ class CTransaction(ImmutableSerializable):
         else:
             VectorSerializer.stream_serialize(CTxIn, self.vin, f)
             VectorSerializer.stream_serialize(CTxOut, self.vout, f)
-        f.write(struct.pack(b"<I", self.nLockTime))
+        f.write(_struct_uint32.pack(self.nLockTime))
 
     def is_coinbase(self):
         return len(self.vin) == 1 and self.vin[0].prevout.is_null()
@@ -454,6 +635,67 @@ class CTransaction(ImmutableSerializable):
         """True if witness"""
         return not self.wit.is_null()
 
+    def _calc_stripped_size(self):
+        try:
+            self._raw
+        except AttributeError:
+            pass
+        else:
+            return self._wit_pos - self._vin_pos + 8
+
+        varint_size = VarIntSerializer.serialized_size
+        n = 8 + varint_size(len(self.vin)) + varint_size(len(self.vout))
+        for txin in self.vin:
+            l = len(txin.scriptSig)
+            n += 40 + varint_size(l) + l
+        for txout in self.vout:
+            l = len(txout.scriptPubKey)
+            n += 8 + varint_size(l) + l
+        return n
+
+    def _calc_size(self):
+        if not self.has_witness():
+            return self.stripped_size()
+        try:
+            return len(self._raw)
+        except AttributeError:
+            pass
+
+        varint_size = VarIntSerializer.serialized_size
+        n = self.stripped_size() + 2
+        for txinwit in self.wit.vtxinwit:
+            stack = txinwit.scriptWitness.stack
+            n += varint_size(len(stack))
+            for item in stack:
+                n += varint_size(len(item)) + len(item)
+        return n
+
+    def stripped_size(self):
+        """Size of the transaction serialized without witness data"""
+        try:
+            return self._cached_stripped_size
+        except AttributeError:
+            _cached_stripped_size = self._calc_stripped_size()
+            object.__setattr__(self, '_cached_stripped_size', _cached_stripped_size)
+            return _cached_stripped_size
+
+    def size(self):
+        """Size of the serialized transaction, witness data included"""
+        try:
+            return self._cached_size
+        except AttributeError:
+            _cached_size = self._calc_size()
+            object.__setattr__(self, '_cached_size', _cached_size)
+            return _cached_size
+
+    def weight(self):
+        """Transaction weight: (stripped_size * 3) + size"""
+        return self.stripped_size() * 3 + self.size()
+
+    def vsize(self):
+        """Virtual size: weight / 4, rounded up"""
+        return (self.weight() + 3) // 4
+
     def __repr__(self):
         return "CTransaction(%r, %r, %i, %i, %r)" % (self.vin, self.vout,
                 self.nLockTime, self.nVersion, self.wit)
@@ -462,10 +704,10 @@ class CTransaction(ImmutableSerializable):
     def from_tx(cls, tx):
         """Create an immutable copy of a pre-existing transaction
 
-        If tx is already immutable (tx.__class__ is CTransaction) then it will
-        be returned directly.
+        If tx is already immutable (tx.__class__ is CTransaction or
+        CLazyTransaction) then it will be returned directly.
         """
-        if tx.__class__ is CTransaction:
+        if tx.__class__ is CTransaction or tx.__class__ is CLazyTransaction:
             return tx
 
         else:
@@ -475,14 +717,183 @@ class CTransaction(ImmutableSerializable):
         """Get the transaction ID.  This differs from the transactions hash as
             given by GetHash.  GetTxid excludes witness data, while GetHash
             includes it. """
-        if self.wit != CTxWitness():
-            txid = Hash(CTransaction(self.vin, self.vout, self.nLockTime,
-                self.nVersion).serialize())
-        else:
-            txid = Hash(self.serialize())
-        return txid
+        try:
+            return self._cached_GetTxid
+        except AttributeError:
+            _cached_GetTxid = Hash(self._serialized(include_witness=False))
+            object.__setattr__(self, '_cached_GetTxid', _cached_GetTxid)
+            return _cached_GetTxid
+
+    def GetHash(self):
+        """Return the hash of the serialized transaction"""
+        try:
+            return self._cached_GetHash
+        except AttributeError:
+            _cached_GetHash = Hash(self._serialized())
+            object.__setattr__(self, '_cached_GetHash', _cached_GetHash)
+            return _cached_GetHash
+
+
+
+_set_tx_nLockTime, _set_tx_nVersion, _set_tx_vin, _set_tx_vout, _set_tx_wit = \
+        _slot_setters(CTransaction, 'nLockTime', 'nVersion', 'vin', 'vout', 'wit')
+
+_empty_witness = CTxWitness()
+
+
+def _buffer_read_compactsize(buf, pos):
+    """Read a CompactSize, also returning whether it was canonically encoded"""
+    start = pos
+    n, pos = VarIntSerializer.buffer_deserialize(buf, pos)
+    return n, pos, pos - start == VarIntSerializer.serialized_size(n)
+
+def _scan_transaction(buf, offset):
+    """Find the boundaries of the serialized transaction at offset
+
+    Walks the length prefixes without decoding anything. Returns (vin_pos,
+    vout_pos, wit_pos, end, has_witness, canonical); the positions are
+    absolute, wit_pos being where nLockTime starts if there is no witness
+    section. canonical is False if any CompactSize was non-canonically
+    encoded, in which case re-serializing the decoded transaction would not
+    reproduce the original bytes.
+    """
+    (nVersion, markerbyte, flagbyte), pos = ser_unpack_from(_struct_tx_prefix, buf, offset)
+    segwit = markerbyte == 0 and flagbyte == 1
+    if not segwit:
+        pos = offset + 4
+
+    vin_pos = pos
+    n_vin, pos, canonical = _buffer_read_compactsize(buf, pos)
+    for i in range(n_vin):
+        l, pos, ok = _buffer_read_compactsize(buf, pos + 36)
+        pos = ser_read_buffer(buf, pos, l)[1] + 4
+        canonical = canonical and ok
+
+    vout_pos = pos
+    n_vout, pos, ok = _buffer_read_compactsize(buf, pos)
+    canonical = canonical and ok
+    for i in range(n_vout):
+        l, pos, ok = _buffer_read_compactsize(buf, pos + 8)
+        pos = ser_read_buffer(buf, pos, l)[1]
+        canonical = canonical and ok
+
+    wit_pos = pos
+    has_witness = False
+    if segwit:
+        for i in range(n_vin):
+            n_items, pos, ok = _buffer_read_compactsize(buf, pos)
+            canonical = canonical and ok
+            has_witness = has_witness or n_items > 0
+            for j in range(n_items):
+                l, pos, ok = _buffer_read_compactsize(buf, pos)
+                pos = ser_read_buffer(buf, pos, l)[1]
+                canonical = canonical and ok
+
+    end = ser_read_buffer(buf, pos, 4)[1]
+    return vin_pos, vout_pos, wit_pos, end, has_witness, canonical
+
+
+class CLazyTransaction(CTransaction):
+    """A transaction that is decoded on demand
+
+    Only nVersion and nLockTime are decoded up front. The serialized
+    transaction is retained, and vin, vout and wit are decoded from it the
+    first time they are accessed; GetTxid() and GetHash() hash the retained
+    bytes directly. Handy when scanning blocks for a handful of transactions
+    or outputs.
+
+    Instances are created by deserialization, or from an existing transaction
+    with from_tx(). Deserializing a transaction containing non-canonical
+    CompactSize encodings returns a regular CTransaction instead, as the
+    retained bytes would not match what the transaction serializes to.
+    """
+    __slots__ = ['_vout_pos', '_has_witness']
+
+    def __init__(self, *args, **kwargs):
+        raise TypeError('CLazyTransaction instances are created by deserialization; '
+                        'use CLazyTransaction.from_tx() to convert an existing transaction')
+
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        vin_pos, vout_pos, wit_pos, end, has_witness, canonical = _scan_transaction(buf, offset)
+        if not canonical:
+            return CTransaction.buffer_deserialize(buf, offset)
+
+        raw = bytes(buf[offset:end])
+        self = object.__new__(cls)
+        self._retain_raw(raw, vin_pos - offset, wit_pos - offset)
+        object.__setattr__(self, '_vout_pos', vout_pos - offset)
+        object.__setattr__(self, '_has_witness', has_witness)
+        object.__setattr__(self, 'nVersion', _struct_int32.unpack_from(raw, 0)[0])
+        object.__setattr__(self, 'nLockTime', _struct_uint32.unpack_from(raw, len(raw) - 4)[0])
+        return self, end
+
+    @classmethod
+    def stream_deserialize(cls, f):
+        # Only in-memory streams can be scanned in place; anything else is
+        # simply decoded up front.
+        if not hasattr(f, 'getbuffer'):
+            return CTransaction.stream_deserialize(f)
+        return super(CLazyTransaction, cls).stream_deserialize(f)
+
+    @property
+    def vin(self):
+        try:
+            return CTransaction.vin.__get__(self, CTransaction)
+        except AttributeError:
+            vin, pos = VectorSerializer.buffer_deserialize(CTxIn, memoryview(self._raw), self._vin_pos)
+            vin = tuple(vin)
+            CTransaction.vin.__set__(self, vin)
+            return vin
+
+    @property
+    def vout(self):
+        try:
+            return CTransaction.vout.__get__(self, CTransaction)
+        except AttributeError:
+            vout, pos = VectorSerializer.buffer_deserialize(CTxOut, memoryview(self._raw), self._vout_pos)
+            vout = tuple(vout)
+            CTransaction.vout.__set__(self, vout)
+            return vout
 
+    @property
+    def wit(self):
+        try:
+            return CTransaction.wit.__get__(self, CTransaction)
+        except AttributeError:
+            if self._vin_pos == 4:
+                wit = CTxWitness()
+            else:
+                buf = memoryview(self._raw)
+                n_vin, pos = VarIntSerializer.buffer_deserialize(buf, self._vin_pos)
+                pos = self._wit_pos
+                vtxinwit = []
+                for dummy in range(n_vin):
+                    txinwit, pos = CTxInWitness.buffer_deserialize(buf, pos)
+                    vtxinwit.append(txinwit)
+                wit = CTxWitness(tuple(vtxinwit))
+            CTransaction.wit.__set__(self, wit)
+            return wit
 
+    def has_witness(self):
+        """True if witness"""
+        return self._has_witness
+
+    def __reduce__(self):
+        # Pickle as the raw bytes, so the decoded fields stay lazy
+        return (CLazyTransaction.deserialize, (self._raw,))
+
+    @classmethod
+    def from_tx(cls, tx):
+        """Create a lazy copy of a pre-existing transaction
+
+        If tx is already a CLazyTransaction it is returned directly.
+        """
+        if tx.__class__ is CLazyTransaction:
+            return tx
+
+        else:
+            return cls.deserialize(tx.serialize())
 
 
 @__make_mutable
@@ -516,6 +927,29 @@ class CMutableTransaction(CTransaction):
 
         return cls(vin, vout, tx.nLockTime, tx.nVersion, tx.wit)
 
+    @classmethod
+    def _from_fields(cls, vin, vout, nLockTime, nVersion, witness=None):
+        return cls(list(vin), list(vout), nLockTime, nVersion, witness)
+
+    def _retain_raw(self, raw, vin_pos, wit_pos):
+        # A mutable transaction can diverge from the bytes it was
+        # deserialized from at any time, so nothing is retained.
+        pass
+
+    def GetTxid(self):
+        """Get the transaction ID.  This differs from the transactions hash as
+            given by GetHash.  GetTxid excludes witness data, while GetHash
+            includes it. """
+        return Hash(self.serialize(dict(include_witness=False)))
+
+    def stripped_size(self):
+        """Size of the transaction serialized without witness data"""
+        return self._calc_stripped_size()
+
+    def size(self):
+        """Size of the serialized transaction, witness data included"""
+        return self._calc_size()
+
 
 
 
@@ -533,25 +967,53 @@ class CBlockHeader(ImmutableSerializable):
         object.__setattr__(self, 'nBits', nBits)
         object.__setattr__(self, 'nNonce', nNonce)
 
+    @classmethod
+    def _from_fields(cls, nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce):
+        """Create a header from known-good fields, skipping validation"""
+        self = _new(cls)
+        _set_header_nVersion(self, nVersion)
+        _set_header_hashPrevBlock(self, hashPrevBlock)
+        _set_header_hashMerkleRoot(self, hashMerkleRoot)
+        _set_header_nTime(self, nTime)
+        _set_header_nBits(self, nBits)
+        _set_header_nNonce(self, nNonce)
+        return self
+
     @classmethod
     def stream_deserialize(cls, f):
-        nVersion = struct.unpack(b"<i", ser_read(f,4))[0]
-        hashPrevBlock = ser_read(f,32)
-        hashMerkleRoot = ser_read(f,32)
-        nTime = struct.unpack(b"<I", ser_read(f,4))[0]
-        nBits = struct.unpack(b"<I", ser_read(f,4))[0]
-        nNonce = struct.unpack(b"<I", ser_read(f,4))[0]
-        return cls(nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce)
+        (nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce) = \
+                _struct_header.unpack(ser_read(f, 80))
+        return cls._from_fields(nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce)
+
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        (nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce), offset = \
+                ser_unpack_from(_struct_header, buf, offset)
+        return cls._from_fields(nVersion, hashPrevBlock, hashMerkleRoot, nTime, nBits, nNonce), offset
+
+    @classmethod
+    def deserialize_array(cls, buf, offset=0, count=None):
+        """Deserialize count consecutive 80-byte headers from a buffer
+
+        If count is None the rest of the buffer is used, and must hold a whole
+        number of headers. Returns (headers, offset).
+        """
+        values, offset = ser_unpack_array(_struct_header, buf, offset, count)
+        from_fields = cls._from_fields
+        return [from_fields(*v) for v in values], offset
+
+    @staticmethod
+    def serialize_array(headers):
+        """Serialize headers back to back, as read by deserialize_array()"""
+        return ser_pack_array(_struct_header,
+                              [(h.nVersion, h.hashPrevBlock, h.hashMerkleRoot, h.nTime, h.nBits, h.nNonce)
+                               for h in headers])
 
     def stream_serialize(self, f):
-        f.write(struct.pack(b"<i", self.nVersion))
         assert len(self.hashPrevBlock) == 32
-        f.write(self.hashPrevBlock)
         assert len(self.hashMerkleRoot) == 32
-        f.write(self.hashMerkleRoot)
-        f.write(struct.pack(b"<I", self.nTime))
-        f.write(struct.pack(b"<I", self.nBits))
-        f.write(struct.pack(b"<I", self.nNonce))
+        f.write(_struct_header.pack(self.nVersion, self.hashPrevBlock, self.hashMerkleRoot,
+                                    self.nTime, self.nBits, self.nNonce))
 
     @staticmethod
     def calc_difficulty(nBits):
@@ -572,12 +1034,16 @@ class CBlockHeader(ImmutableSerializable):
                 (self.__class__.__name__, self.nVersion, b2lx(self.hashPrevBlock), b2lx(self.hashMerkleRoot),
                  self.nTime, self.nBits, self.nNonce)
 
+(_set_header_nVersion, _set_header_hashPrevBlock, _set_header_hashMerkleRoot,
+ _set_header_nTime, _set_header_nBits, _set_header_nNonce) = \
+        _slot_setters(CBlockHeader, 'nVersion', 'hashPrevBlock', 'hashMerkleRoot', 'nTime', 'nBits', 'nNonce')
+
 class NoWitnessData(Exception):
     """The block does not have witness data"""
 
 class CBlock(CBlockHeader):
     """A block including all transactions in it"""
-    __slots__ = ['vtx', 'vMerkleTree', 'vWitnessMerkleTree']
+    __slots__ = ['vtx', 'vMerkleTree', 'vWitnessMerkleTree', '_cached_size', '_cached_stripped_size']
 
     @staticmethod
     def build_merkle_tree_from_txids(txids):
@@ -596,19 +1062,7 @@ class CBlock(CBlockHeader):
         use something different; don't just copy-and-paste this code without
         understanding the problem first.
         """
-        merkle_tree = list(txids)
-
-        size = len(txids)
-        j = 0
-        while size > 1:
-            for i in range(0, size, 2):
-                i2 = min(i+1, size-1)
-                merkle_tree.append(Hash(merkle_tree[j+i] + merkle_tree[j+i2]))
-
-            j += size
-            size = (size + 1) // 2
-
-        return merkle_tree
+        return MerkleTree(txids).flatten()
 
     @staticmethod
     def build_merkle_tree_from_txs(txs):
@@ -619,12 +1073,12 @@ class CBlock(CBlockHeader):
     def calc_merkle_root(self):
         """Calculate the merkle root
 
-        The calculated merkle root is not cached; every invocation
-        re-calculates it from scratch.
+        This is the root of vMerkleTree, which was built from vtx when the
+        block was created.
         """
         if not len(self.vtx):
             raise ValueError('Block contains no transactions')
-        return self.build_merkle_tree_from_txs(self.vtx)[-1]
+        return self.vMerkleTree[-1]
 
     @staticmethod
     def build_witness_merkle_tree_from_txs(txs):
@@ -642,12 +1096,15 @@ class CBlock(CBlockHeader):
     def calc_witness_merkle_root(self):
         """Calculate the witness merkle root
 
-        The calculated merkle root is not cached; every invocation
-        re-calculates it from scratch.
+        This is the root of vWitnessMerkleTree, which was built from vtx when
+        the block was created. Raises NoWitnessData if no transaction has a
+        witness.
         """
         if not len(self.vtx):
             raise ValueError('Block contains no transactions')
-        return self.build_witness_merkle_tree_from_txs(self.vtx)[-1]
+        if not self.vWitnessMerkleTree:
+            raise NoWitnessData
+        return self.vWitnessMerkleTree[-1]
 
     def get_witness_commitment_index(self):
         """Return None or an index"""
@@ -683,10 +1140,16 @@ class CBlock(CBlockHeader):
         object.__setattr__(self, 'vtx', tuple(CTransaction.from_tx(tx) for tx in vtx))
 
     @classmethod
-    def stream_deserialize(cls, f):
+    def stream_deserialize(cls, f, lazy=False):
+        """Deserialize a block
+
+        lazy - Deserialize the transactions as CLazyTransaction instances,
+               deferring the decoding of their inputs, outputs and witnesses
+               until they're accessed. (default False)
+        """
         self = super(CBlock, cls).stream_deserialize(f)
 
-        vtx = VectorSerializer.stream_deserialize(CTransaction, f)
+        vtx = VectorSerializer.stream_deserialize(CLazyTransaction if lazy else CTransaction, f)
         vMerkleTree = tuple(CBlock.build_merkle_tree_from_txs(vtx))
         object.__setattr__(self, 'vMerkleTree', vMerkleTree)
         try:
@@ -698,6 +1161,23 @@ class CBlock(CBlockHeader):
 
         return self
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0, lazy=False):
+        self, offset = super(CBlock, cls).buffer_deserialize(buf, offset)
+
+        vtx, offset = VectorSerializer.buffer_deserialize(CLazyTransaction if lazy else CTransaction,
+                                                          buf, offset)
+        vMerkleTree = tuple(CBlock.build_merkle_tree_from_txs(vtx))
+        object.__setattr__(self, 'vMerkleTree', vMerkleTree)
+        try:
+            vWitnessMerkleTree = tuple(CBlock.build_witness_merkle_tree_from_txs(vtx))
+        except NoWitnessData:
+            vWitnessMerkleTree = ()
+        object.__setattr__(self, 'vWitnessMerkleTree', vWitnessMerkleTree)
+        object.__setattr__(self, 'vtx', tuple(vtx))
+
+        return self, offset
+
     def stream_serialize(self, f, include_witness=True):
         super(CBlock, self).stream_serialize(f)
         VectorSerializer.stream_serialize(CTransaction, self.vtx, f, dict(include_witness=include_witness))
@@ -727,9 +1207,37 @@ class CBlock(CBlockHeader):
             object.__setattr__(self, '_cached_GetHash', _cached_GetHash)
             return _cached_GetHash
 
+    def stripped_size(self):
+        """Size of the block serialized without witness data"""
+        try:
+            return self._cached_stripped_size
+        except AttributeError:
+            _cached_stripped_size = (80 + VarIntSerializer.serialized_size(len(self.vtx)) +
+                                     sum(tx.stripped_size() for tx in self.vtx))
+            object.__setattr__(self, '_cached_stripped_size', _cached_stripped_size)
+            return _cached_stripped_size
+
+    def size(self):
+        """Size of the serialized block, witness data included"""
+        try:
+            return self._cached_size
+        except AttributeError:
+            _cached_size = (80 + VarIntSerializer.serialized_size(len(self.vtx)) +
+                            sum(tx.size() for tx in self.vtx))
+            object.__setattr__(self, '_cached_size', _cached_size)
+            return _cached_size
+
+    def weight(self):
+        """Block weight: (stripped_size * 3) + size"""
+        return self.stripped_size() * 3 + self.size()
+
+    def vsize(self):
+        """Virtual size: weight / 4, rounded up"""
+        return (self.weight() + 3) // 4
+
     def GetWeight(self):
         """Return the block weight: (stripped_size * 3) + total_size"""
-        return len(self.serialize(dict(include_witness=False))) * 3 + len(self.serialize())
+        return self.weight()
 
 class CoreChainParams(object):
     """Define consensus-critical parameters of a given instance of the Gozer system"""
@@ -789,12 +1297,16 @@ def _SelectCoreParams(name):
 class CheckTransactionError(ValidationError):
     pass
 
-def CheckTransaction(tx):
+def CheckTransaction(tx, params=None):
     """Basic transaction checks that don't depend on any context.
 
+    params - Chain parameters. Defaults to coreparams.
+
     Raises CheckTransactionError
     """
     global coreparams
+    if not params:
+        params = coreparams
 
     if not tx.vin:
         raise CheckTransactionError("CheckTransaction() : vin empty")
@@ -802,8 +1314,7 @@ def CheckTransaction(tx):
         raise CheckTransactionError("CheckTransaction() : vout empty")
 
     # Size limits
-    base_tx = CTransaction(tx.vin, tx.vout, tx.nLockTime, tx.nVersion)
-    if len(base_tx.serialize()) > MAX_BLOCK_SIZE:
+    if tx.stripped_size() > MAX_BLOCK_SIZE:
         raise CheckTransactionError("CheckTransaction() : size limits failed")
 
     # Check for negative or overflow output values
@@ -811,10 +1322,10 @@ def CheckTransaction(tx):
     for txout in tx.vout:
         if txout.nValue < 0:
             raise CheckTransactionError("CheckTransaction() : txout.nValue negative")
-        if txout.nValue > coreparams.MAX_MONEY:
+        if txout.nValue > params.MAX_MONEY:
             raise CheckTransactionError("CheckTransaction() : txout.nValue too high")
         nValueOut += txout.nValue
-        if not MoneyRange(nValueOut):
+        if not MoneyRange(nValueOut, params):
             raise CheckTransactionError("CheckTransaction() : txout total out of range")
 
     # Check for duplicate inputs
@@ -893,7 +1404,42 @@ def GetLegacySigOpCount(tx):
     return nSigOps
 
 
-def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
+def _CheckBlockTransaction(tx, params):
+    """The checks CheckBlock() does on each non-coinbase transaction on its own
+
+    Returns (error, txid, nSigOps); error is the exception the transaction
+    failed with, or None.
+    """
+    if not isinstance(tx, CTransaction):
+        tx = CTransaction.deserialize(tx)
+    try:
+        if tx.is_coinbase():
+            raise CheckBlockError("CheckBlock() : more than one coinbase")
+
+        CheckTransaction(tx, params)
+    except ValidationError as err:
+        return (err, None, 0)
+    return (None, tx.GetTxid(), GetLegacySigOpCount(tx))
+
+def _CheckBlockTransactions(txs, params):
+    """Executor entry point: _CheckBlockTransaction() for a shard of vtx
+
+    Stops at the first transaction that raises anything else, returning the
+    results so far followed by (exception, None, 0), so that CheckBlock() can
+    re-raise it where a serial check would.
+    """
+    results = []
+    for tx in txs:
+        try:
+            results.append(_CheckBlockTransaction(tx, params))
+        except Exception as err:
+            results.append((err, None, 0))
+            break
+    return results
+
+
+def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None, executor=None,
+               workers=None):
     """Context independent CBlock checks.
 
     CheckBlockHeader() is called first, which may raise a CheckBlockHeader
@@ -906,7 +1452,18 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
                      - Check witness commitment in coinbase
 
     cur_time         - Current time. Defaults to time.time()
+
+    executor         - A concurrent.futures executor to spread the
+                       per-transaction checks over. The transactions are split
+                       into contiguous shards and the results merged in order,
+                       so the error raised is the one a serial check would
+                       raise. For a ProcessPoolExecutor transactions are sent
+                       serialized.
+
+    workers          - Number of workers executor has, which the shards are
+                       sized by; defaults to the number of CPUs.
     """
+    global coreparams
 
     # Block header checks
     CheckBlockHeader(block.get_header(), fCheckPoW=fCheckPoW, cur_time=cur_time)
@@ -914,10 +1471,10 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
     # Size limits
     if not block.vtx:
         raise CheckBlockError("CheckBlock() : vtx empty")
-    if len(block.serialize(dict(include_witness=False))) > MAX_BLOCK_SIZE:
+    if block.stripped_size() > MAX_BLOCK_SIZE:
         raise CheckBlockError("CheckBlock() : block larger than MAX_BLOCK_SIZE")
 
-    if block.GetWeight() > MAX_BLOCK_WEIGHT:
+    if block.weight() > MAX_BLOCK_WEIGHT:
         raise CheckBlockError("CheckBlock() : block larger than MAX_BLOCK_WEIGHT")
 
     # First transaction must be coinbase
@@ -927,24 +1484,41 @@ def CheckBlock(block, fCheckPoW = True, fCheckMerkleRoot = True, cur_time=None):
     # Check rest of transactions. Note how we do things "all at once", which
     # could potentially be a consensus failure if there was some obscure bug.
 
+    futures = []
+    if executor is None:
+        results = (_CheckBlockTransaction(tx, coreparams) for tx in block.vtx[1:])
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        txs = block.vtx[1:]
+        if isinstance(executor, ProcessPoolExecutor):
+            txs = [tx.serialize() for tx in txs]
+        if workers is None:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        shard_size = max(1, -(-len(txs) // (4 * workers)))
+        futures = [executor.submit(_CheckBlockTransactions, txs[i:i+shard_size], coreparams)
+                   for i in range(0, len(txs), shard_size)]
+        results = (r for future in futures for r in future.result())
+
     # For unique txid uniqueness testing. If coinbase tx is included twice
     # it'll be caught by the "more than one coinbase" test.
     unique_txids = set()
     nSigOps = 0
-    for tx in block.vtx[1:]:
-        if tx.is_coinbase():
-            raise CheckBlockError("CheckBlock() : more than one coinbase")
-
-        CheckTransaction(tx)
-
-        txid = tx.GetTxid()
-        if txid in unique_txids:
-            raise CheckBlockError("CheckBlock() : duplicate transaction")
-        unique_txids.add(txid)
-
-        nSigOps += GetLegacySigOpCount(tx)
-        if nSigOps > MAX_BLOCK_SIGOPS:
-            raise CheckBlockError("CheckBlock() : out-of-bounds SigOpCount")
+    try:
+        for err, txid, nTxSigOps in results:
+            if err is not None:
+                raise err
+
+            if txid in unique_txids:
+                raise CheckBlockError("CheckBlock() : duplicate transaction")
+            unique_txids.add(txid)
+
+            nSigOps += nTxSigOps
+            if nSigOps > MAX_BLOCK_SIGOPS:
+                raise CheckBlockError("CheckBlock() : out-of-bounds SigOpCount")
+    finally:
+        for future in futures:
+            future.cancel()
 
     # Check merkle root
     if fCheckMerkleRoot:
@@ -991,6 +1565,7 @@ __all__ = (
         'CTxOut',
         'CMutableTxOut',
         'CTransaction',
+        'CLazyTransaction',
         'CMutableTransaction',
         'CTxWitness',
         'CTxInWitness',
@@ -0,0 +1,440 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Pure-Python secp256k1 ECDSA
+
+Reference implementation behind the 'python' backend of gozer.core.key, for
+when neither libsecp256k1 nor OpenSSL are available. Slow, and not hardened
+against side channels; don't use it to sign with valuable keys.
+
+Signatures are made with RFC6979 deterministic nonces and low S, the same as
+libsecp256k1 does, and are parsed as laxly as Satoshi's codebase does.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import binascii
+import hashlib
+import hmac
+import sys
+
+_bord = ord
+if sys.version > '3':
+    long = int
+    _bord = lambda x: x
+
+# Curve parameters
+P = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEFFFFFC2F
+N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+     0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+B = 7
+
+HALF_N = N // 2
+
+
+def bytes_to_int(b):
+    return long(binascii.hexlify(b), 16) if b else 0
+
+def int_to_bytes32(i):
+    return binascii.unhexlify('%064x' % i)
+
+
+def _inverse(a, m):
+    return pow(a, m - 2, m)
+
+try:
+    pow(2, -1, 3)
+except ValueError:
+    pass
+else:
+    # Python 3.8+ does modular inverses itself, much faster than the above
+    def _inverse(a, m):
+        return pow(a, -1, m)
+
+# Points are affine (x, y) tuples, or None for the point at infinity. The
+# arithmetic is done in Jacobian coordinates, (X, Y, Z) standing for
+# (X/Z^2, Y/Z^3), so that only the final conversion needs an inversion.
+
+def _to_jacobian(p):
+    return (p[0], p[1], 1)
+
+def _from_jacobian(p):
+    if p is None:
+        return None
+    (x, y, z) = p
+    zinv = _inverse(z, P)
+    zinv2 = zinv * zinv % P
+    return (x * zinv2 % P, y * zinv2 * zinv % P)
+
+def _jacobian_double(p):
+    if p is None:
+        return None
+    (x, y, z) = p
+    if not y:
+        return None
+    ysq = y * y % P
+    s = 4 * x * ysq % P
+    m = 3 * x * x % P
+    nx = (m * m - 2 * s) % P
+    ny = (m * (s - nx) - 8 * ysq * ysq) % P
+    nz = 2 * y * z % P
+    return (nx, ny, nz)
+
+def _jacobian_add(p, q):
+    if p is None:
+        return q
+    if q is None:
+        return p
+    (x1, y1, z1) = p
+    (x2, y2, z2) = q
+    z1sq = z1 * z1 % P
+    z2sq = z2 * z2 % P
+    u1 = x1 * z2sq % P
+    u2 = x2 * z1sq % P
+    s1 = y1 * z2sq * z2 % P
+    s2 = y2 * z1sq * z1 % P
+    if u1 == u2:
+        if s1 != s2:
+            return None
+        return _jacobian_double(p)
+    h = u2 - u1
+    r = s2 - s1
+    h2 = h * h % P
+    h3 = h * h2 % P
+    u1h2 = u1 * h2 % P
+    nx = (r * r - h3 - 2 * u1h2) % P
+    ny = (r * (u1h2 - nx) - s1 * h3) % P
+    nz = h * z1 * z2 % P
+    return (nx, ny, nz)
+
+def point_mul(k, p):
+    """Return k*p"""
+    r = None
+    q = _to_jacobian(p)
+    while k:
+        if k & 1:
+            r = _jacobian_add(r, q)
+        q = _jacobian_double(q)
+        k >>= 1
+    return _from_jacobian(r)
+
+def _jacobian_add_affine(p, q):
+    """Add affine point q to Jacobian point p, cheaper than a full add"""
+    if p is None:
+        return _to_jacobian(q)
+    (x1, y1, z1) = p
+    (x2, y2) = q
+    z1sq = z1 * z1 % P
+    u2 = x2 * z1sq % P
+    s2 = y2 * z1sq * z1 % P
+    if x1 == u2:
+        if y1 != s2:
+            return None
+        return _jacobian_double(p)
+    h = u2 - x1
+    r = s2 - y1
+    h2 = h * h % P
+    h3 = h * h2 % P
+    u1h2 = x1 * h2 % P
+    nx = (r * r - h3 - 2 * u1h2) % P
+    ny = (r * (u1h2 - nx) - y1 * h3) % P
+    nz = h * z1 % P
+    return (nx, ny, nz)
+
+def _batch_from_jacobian(points):
+    """Convert many points, none at infinity, with a single inversion
+
+    This is Montgomery's trick.
+    """
+    prefix = [1]
+    for (x, y, z) in points:
+        prefix.append(prefix[-1] * z % P)
+    inv = _inverse(prefix[-1], P)
+    affine = [None] * len(points)
+    for i in range(len(points) - 1, -1, -1):
+        (x, y, z) = points[i]
+        zinv = inv * prefix[i] % P
+        inv = inv * z % P
+        zinv2 = zinv * zinv % P
+        affine[i] = (x * zinv2 % P, y * zinv2 * zinv % P)
+    return affine
+
+# Multiplying G is done for every signature and every pubkey derived, so it's
+# done with a table of its multiples, built on first use: row i holds
+# j * 16**i * G for j from 1 to 15, in affine coordinates. k*G is then the sum
+# of one entry per 4-bit window of k, with no doublings at all.
+_g_table = None
+
+def _make_g_table():
+    global _g_table
+    points = []
+    base = _to_jacobian(G)
+    for i in range(64):
+        p = base
+        for j in range(15):
+            points.append(p)
+            p = _jacobian_add(p, base)
+        base = p
+
+    affine = _batch_from_jacobian(points)
+    _g_table = [affine[i:i + 15] for i in range(0, len(affine), 15)]
+    return _g_table
+
+def point_mul_g(k):
+    """Return k*G, using the precomputed table of multiples of G"""
+    table = _g_table or _make_g_table()
+    k %= N
+    r = None
+    for row in table:
+        if not k:
+            break
+        if k & 15:
+            r = _jacobian_add_affine(r, row[(k & 15) - 1])
+        k >>= 4
+    return _from_jacobian(r)
+
+def point_mul_g_add(a, b, q):
+    """Return a*G + b*q
+
+    Faster than point_mul_add(): a*G is summed from the table of multiples of
+    G, and b*q is done four bits at a time, with a table of multiples of q.
+    q must be on the curve.
+    """
+    jq = _to_jacobian(q)
+    multiples = [jq, _jacobian_double(jq)]
+    for i in range(13):
+        multiples.append(_jacobian_add(multiples[-1], jq))
+    multiples = _batch_from_jacobian(multiples)
+
+    r = None
+    for i in range((b.bit_length() + 3) // 4 - 1, -1, -1):
+        r = _jacobian_double(_jacobian_double(_jacobian_double(_jacobian_double(r))))
+        if (b >> (4 * i)) & 15:
+            r = _jacobian_add_affine(r, multiples[((b >> (4 * i)) & 15) - 1])
+
+    table = _g_table or _make_g_table()
+    a %= N
+    for row in table:
+        if not a:
+            break
+        if a & 15:
+            r = _jacobian_add_affine(r, row[(a & 15) - 1])
+        a >>= 4
+    return _from_jacobian(r)
+
+def point_mul_add(a, p, b, q):
+    """Return a*p + b*q, sharing the doublings (Shamir's trick)"""
+    jp = _to_jacobian(p)
+    jq = _to_jacobian(q)
+    jpq = _jacobian_add(jp, jq)
+    r = None
+    for i in range(max(a.bit_length(), b.bit_length()) - 1, -1, -1):
+        r = _jacobian_double(r)
+        bits = ((a >> i) & 1) | (((b >> i) & 1) << 1)
+        if bits == 1:
+            r = _jacobian_add(r, jp)
+        elif bits == 2:
+            r = _jacobian_add(r, jq)
+        elif bits == 3:
+            r = _jacobian_add(r, jpq)
+    return _from_jacobian(r)
+
+
+def _lift_x(x, odd):
+    """Return the point with the given x coordinate and parity of y, if any"""
+    if x >= P:
+        return None
+    ysq = (pow(x, 3, P) + B) % P
+    y = pow(ysq, (P + 1) // 4, P)
+    if y * y % P != ysq:
+        return None
+    if (y & 1) != odd:
+        y = P - y
+    return (x, y)
+
+def parse_pubkey(pubkey):
+    """Parse a serialized pubkey into a point, or return None if invalid
+
+    Accepts compressed, uncompressed and hybrid encodings, as
+    secp256k1_ec_pubkey_parse() does.
+    """
+    if len(pubkey) == 33 and _bord(pubkey[0]) in (2, 3):
+        return _lift_x(bytes_to_int(pubkey[1:33]), _bord(pubkey[0]) & 1)
+
+    elif len(pubkey) == 65 and _bord(pubkey[0]) in (4, 6, 7):
+        x = bytes_to_int(pubkey[1:33])
+        y = bytes_to_int(pubkey[33:65])
+        if x >= P or y >= P or (y * y - pow(x, 3, P) - B) % P:
+            return None
+        if _bord(pubkey[0]) != 4 and (y & 1) != (_bord(pubkey[0]) & 1):
+            return None
+        return (x, y)
+
+    return None
+
+def serialize_pubkey(point, compressed):
+    if compressed:
+        return (b'\x03' if point[1] & 1 else b'\x02') + int_to_bytes32(point[0])
+    return b'\x04' + int_to_bytes32(point[0]) + int_to_bytes32(point[1])
+
+
+def parse_der_lax(sig):
+    """Parse a DER signature, as laxly as Satoshi's codebase does
+
+    Port of ecdsa_signature_parse_der_lax(). Returns (r, s), or None if the
+    signature can't be parsed or its r or s don't fit in 32 bytes.
+    """
+    sig = bytearray(sig)
+    inputlen = len(sig)
+    pos = 0
+
+    # Sequence tag byte
+    if pos == inputlen or sig[pos] != 0x30:
+        return None
+    pos += 1
+
+    # Sequence length bytes
+    if pos == inputlen:
+        return None
+    lenbyte = sig[pos]
+    pos += 1
+    if lenbyte & 0x80:
+        lenbyte -= 0x80
+        if lenbyte > inputlen - pos:
+            return None
+        pos += lenbyte
+
+    ints = []
+    for i in range(2):
+        # Integer tag byte
+        if pos == inputlen or sig[pos] != 0x02:
+            return None
+        pos += 1
+
+        # Integer length bytes
+        if pos == inputlen:
+            return None
+        lenbyte = sig[pos]
+        pos += 1
+        if lenbyte & 0x80:
+            lenbyte -= 0x80
+            if lenbyte > inputlen - pos:
+                return None
+            while lenbyte > 0 and sig[pos] == 0:
+                pos += 1
+                lenbyte -= 1
+            if lenbyte >= 8:
+                return None
+            intlen = 0
+            while lenbyte > 0:
+                intlen = (intlen << 8) + sig[pos]
+                pos += 1
+                lenbyte -= 1
+        else:
+            intlen = lenbyte
+        if intlen > inputlen - pos:
+            return None
+        intpos = pos
+        pos += intlen
+
+        # Ignore leading zeroes
+        while intlen > 0 and sig[intpos] == 0:
+            intlen -= 1
+            intpos += 1
+        if intlen > 32:
+            return None
+        ints.append(bytes_to_int(bytes(sig[intpos:intpos + intlen])))
+
+    return tuple(ints)
+
+def _der_int(i):
+    b = int_to_bytes32(i).lstrip(b'\x00')
+    if not b or _bord(b[0]) & 0x80:
+        b = b'\x00' + b
+    return b'\x02' + bytearray([len(b)]) + b
+
+def serialize_der(r, s):
+    body = _der_int(r) + _der_int(s)
+    return bytes(b'\x30' + bytearray([len(body)]) + body)
+
+
+def _hash_to_int(h):
+    # Leftmost 256 bits, as OpenSSL does for longer digests
+    return bytes_to_int(h[0:32]) >> max(0, 8 * len(h[0:32]) - 256)
+
+def verify(point, h, r, s):
+    """Verify signature (r, s) of hash h by pubkey point
+
+    High S values are accepted, as for consensus they are.
+    """
+    if point is None or not (0 < r < N) or not (0 < s < N):
+        return False
+    sinv = _inverse(s, N)
+    u1 = _hash_to_int(h) * sinv % N
+    u2 = r * sinv % N
+    R = point_mul_g_add(u1, u2, point)
+    return R is not None and R[0] % N == r
+
+
+def rfc6979_nonces(secret, h):
+    """Yield the RFC6979 HMAC-SHA256 nonces for secret and hash h
+
+    The hash is reduced mod N first, as libsecp256k1 does, so signatures are
+    identical to those it makes.
+    """
+    keydata = int_to_bytes32(secret) + int_to_bytes32(bytes_to_int(h) % N)
+    k = b'\x00' * 32
+    v = b'\x01' * 32
+    k = hmac.new(k, v + b'\x00' + keydata, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    k = hmac.new(k, v + b'\x01' + keydata, hashlib.sha256).digest()
+    v = hmac.new(k, v, hashlib.sha256).digest()
+    while True:
+        v = hmac.new(k, v, hashlib.sha256).digest()
+        nonce = bytes_to_int(v)
+        if 0 < nonce < N:
+            yield nonce
+        k = hmac.new(k, v + b'\x00', hashlib.sha256).digest()
+        v = hmac.new(k, v, hashlib.sha256).digest()
+
+def sign(secret, h):
+    """Sign 32-byte hash h with secret
+
+    Returns (r, s, recid), s being low.
+    """
+    e = bytes_to_int(h) % N
+    for nonce in rfc6979_nonces(secret, h):
+        R = point_mul_g(nonce)
+        r = R[0] % N
+        if not r:
+            continue
+        s = _inverse(nonce, N) * (e + r * secret) % N
+        if not s:
+            continue
+        recid = (R[1] & 1) | (2 if R[0] >= N else 0)
+        if s > HALF_N:
+            s = N - s
+            recid ^= 1
+        return (r, s, recid)
+
+def recover(h, r, s, recid):
+    """Recover the pubkey point that made signature (r, s) of hash h
+
+    Returns None if there's no such point.
+    """
+    if not (0 < r < N) or not (0 < s < N):
+        return None
+    R = _lift_x(r + (recid >> 1) * N, recid & 1)
+    if R is None:
+        return None
+    rinv = _inverse(r, N)
+    return point_mul_g_add(-_hash_to_int(h) * rinv % N, s * rinv % N, R)
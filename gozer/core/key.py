@@ -12,15 +12,23 @@
 
 """ECC secp256k1 crypto routines
 
+CPubKey and CKey use one of several ECDSA backends: libsecp256k1, OpenSSL or
+pure Python. The fastest available is used unless another is selected with
+set_ecdsa_backend(). CECKey always uses OpenSSL.
+
 WARNING: This module does not mlock() secrets; your private keys may end up on
 disk in swap! Use with caution!
 """
+import collections
 import ctypes
 import ctypes.util
+import functools
 import hashlib
+import os
 import sys
+import threading
 import gozer
-import gozer.signature
+import gozer.core._ecdsa
 
 _bchr = chr
 _bord = ord
@@ -28,9 +36,6 @@ if sys.version > '3':
     _bchr = lambda x: bytes([x])
     _bord = lambda x: x
 
-import gozer.core.script
-
-_ssl = ctypes.cdll.LoadLibrary(ctypes.util.find_library('ssl') or 'libeay32')
 
 class OpenSSLException(EnvironmentError):
     pass
@@ -46,150 +51,249 @@ def _check_res_void_p(val, func, args): # pylint: disable=unused-argument
 
     return ctypes.c_void_p(val)
 
-_ssl.BN_add.restype = ctypes.c_int
-_ssl.BN_add.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+def _load_openssl():
+    """Load OpenSSL and declare the functions used
+
+    Returns None if it can't be found.
+    """
+    try:
+        _ssl = ctypes.cdll.LoadLibrary(ctypes.util.find_library('ssl') or 'libeay32')
+    except OSError:
+        return None
+
+    _ssl.BN_add.restype = ctypes.c_int
+    _ssl.BN_add.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.BN_bin2bn.restype = ctypes.c_void_p
+    _ssl.BN_bin2bn.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p]
+
+    _ssl.BN_cmp.restype = ctypes.c_int
+    _ssl.BN_cmp.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.BN_copy.restype = ctypes.c_void_p
+    _ssl.BN_copy.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.BN_clear_free.restype = None
+    _ssl.BN_clear_free.argtypes = [ctypes.c_void_p]
+
+    _ssl.BN_free.restype = None
+    _ssl.BN_free.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_bin2bn.restype = ctypes.c_void_p
-_ssl.BN_bin2bn.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p]
+    _ssl.BN_mod_inverse.restype = ctypes.c_void_p
+    _ssl.BN_mod_inverse.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_cmp.restype = ctypes.c_int
-_ssl.BN_cmp.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_mod_mul.restype = ctypes.c_int
+    _ssl.BN_mod_mul.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_copy.restype = ctypes.c_void_p
-_ssl.BN_copy.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_mod_sub.restype = ctypes.c_int
+    _ssl.BN_mod_sub.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_free.restype = None
-_ssl.BN_free.argtypes = [ctypes.c_void_p]
+    _ssl.BN_bn2bin.restype = ctypes.c_int
+    _ssl.BN_bn2bin.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
 
-_ssl.BN_mod_inverse.restype = ctypes.c_void_p
-_ssl.BN_mod_inverse.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_mul_word.restype = ctypes.c_int
+    _ssl.BN_mul_word.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_mod_mul.restype = ctypes.c_int
-_ssl.BN_mod_mul.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_new.errcheck = _check_res_void_p
+    _ssl.BN_new.restype = ctypes.c_void_p
+    _ssl.BN_new.argtypes = []
 
-_ssl.BN_mod_sub.restype = ctypes.c_int
-_ssl.BN_mod_sub.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_num_bits.restype = ctypes.c_int
+    _ssl.BN_num_bits.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_mul_word.restype = ctypes.c_int
-_ssl.BN_mul_word.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_rshift.restype = ctypes.c_int
+    _ssl.BN_rshift.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
 
-_ssl.BN_new.errcheck = _check_res_void_p
-_ssl.BN_new.restype = ctypes.c_void_p
-_ssl.BN_new.argtypes = []
+    _ssl.BN_rshift1.restype = ctypes.c_int
+    _ssl.BN_rshift1.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_rshift.restype = ctypes.c_int
-_ssl.BN_rshift.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int]
+    _ssl.BN_sub.restype = ctypes.c_int
+    _ssl.BN_sub.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.BN_rshift1.restype = ctypes.c_int
-_ssl.BN_rshift1.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    # _ssl.BN_zero.restype = ctypes.c_int
+    # _ssl.BN_zero.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_sub.restype = ctypes.c_int
-_ssl.BN_sub.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.BN_CTX_free.restype = None
+    _ssl.BN_CTX_free.argtypes = [ctypes.c_void_p]
 
-# _ssl.BN_zero.restype = ctypes.c_int
-# _ssl.BN_zero.argtypes = [ctypes.c_void_p]
+    _ssl.BN_CTX_start.restype = None
+    _ssl.BN_CTX_start.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_CTX_free.restype = None
-_ssl.BN_CTX_free.argtypes = [ctypes.c_void_p]
+    _ssl.BN_CTX_end.restype = None
+    _ssl.BN_CTX_end.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_CTX_get.restype = ctypes.c_void_p
-_ssl.BN_CTX_get.argtypes = [ctypes.c_void_p]
+    _ssl.BN_CTX_get.restype = ctypes.c_void_p
+    _ssl.BN_CTX_get.argtypes = [ctypes.c_void_p]
 
-_ssl.BN_CTX_new.errcheck = _check_res_void_p
-_ssl.BN_CTX_new.restype = ctypes.c_void_p
-_ssl.BN_CTX_new.argtypes = []
+    _ssl.BN_CTX_new.errcheck = _check_res_void_p
+    _ssl.BN_CTX_new.restype = ctypes.c_void_p
+    _ssl.BN_CTX_new.argtypes = []
 
-_ssl.EC_GROUP_get_curve_GFp.restype = ctypes.c_int
-_ssl.EC_GROUP_get_curve_GFp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_GROUP_new_by_curve_name.errcheck = _check_res_void_p
+    _ssl.EC_GROUP_new_by_curve_name.restype = ctypes.c_void_p
+    _ssl.EC_GROUP_new_by_curve_name.argtypes = [ctypes.c_int]
 
-_ssl.EC_GROUP_get_degree.restype = ctypes.c_int
-_ssl.EC_GROUP_get_degree.argtypes = [ctypes.c_void_p]
+    _ssl.EC_GROUP_get_curve_GFp.restype = ctypes.c_int
+    _ssl.EC_GROUP_get_curve_GFp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.EC_GROUP_get_order.restype = ctypes.c_int
-_ssl.EC_GROUP_get_order.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_GROUP_get_degree.restype = ctypes.c_int
+    _ssl.EC_GROUP_get_degree.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_KEY_free.restype = None
-_ssl.EC_KEY_free.argtypes = [ctypes.c_void_p]
+    _ssl.EC_GROUP_get_order.restype = ctypes.c_int
+    _ssl.EC_GROUP_get_order.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.EC_KEY_new_by_curve_name.errcheck = _check_res_void_p
-_ssl.EC_KEY_new_by_curve_name.restype = ctypes.c_void_p
-_ssl.EC_KEY_new_by_curve_name.argtypes = [ctypes.c_int]
+    _ssl.EC_KEY_free.restype = None
+    _ssl.EC_KEY_free.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_KEY_get0_group.restype = ctypes.c_void_p
-_ssl.EC_KEY_get0_group.argtypes = [ctypes.c_void_p]
+    _ssl.EC_KEY_new_by_curve_name.errcheck = _check_res_void_p
+    _ssl.EC_KEY_new_by_curve_name.restype = ctypes.c_void_p
+    _ssl.EC_KEY_new_by_curve_name.argtypes = [ctypes.c_int]
 
-_ssl.EC_KEY_get0_public_key.restype = ctypes.c_void_p
-_ssl.EC_KEY_get0_public_key.argtypes = [ctypes.c_void_p]
+    _ssl.EC_KEY_get0_group.restype = ctypes.c_void_p
+    _ssl.EC_KEY_get0_group.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_KEY_set_conv_form.restype = None
-_ssl.EC_KEY_set_conv_form.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    _ssl.EC_KEY_get0_private_key.restype = ctypes.c_void_p
+    _ssl.EC_KEY_get0_private_key.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_KEY_set_private_key.restype = ctypes.c_int
-_ssl.EC_KEY_set_private_key.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_KEY_get0_public_key.restype = ctypes.c_void_p
+    _ssl.EC_KEY_get0_public_key.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_KEY_set_public_key.restype = ctypes.c_int
-_ssl.EC_KEY_set_public_key.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_KEY_set_conv_form.restype = None
+    _ssl.EC_KEY_set_conv_form.argtypes = [ctypes.c_void_p, ctypes.c_int]
 
-_ssl.EC_POINT_free.restype = None
-_ssl.EC_POINT_free.argtypes = [ctypes.c_void_p]
+    _ssl.EC_KEY_set_private_key.restype = ctypes.c_int
+    _ssl.EC_KEY_set_private_key.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.EC_POINT_is_at_infinity.restype = ctypes.c_int
-_ssl.EC_POINT_is_at_infinity.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_KEY_set_public_key.restype = ctypes.c_int
+    _ssl.EC_KEY_set_public_key.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.EC_POINT_new.errcheck = _check_res_void_p
-_ssl.EC_POINT_new.restype = ctypes.c_void_p
-_ssl.EC_POINT_new.argtypes = [ctypes.c_void_p]
+    _ssl.EC_POINT_free.restype = None
+    _ssl.EC_POINT_free.argtypes = [ctypes.c_void_p]
 
-_ssl.EC_POINT_mul.restype = ctypes.c_int
-_ssl.EC_POINT_mul.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_POINT_get_affine_coordinates_GFp.restype = ctypes.c_int
+    _ssl.EC_POINT_get_affine_coordinates_GFp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.EC_POINT_set_compressed_coordinates_GFp.restype = ctypes.c_int
-_ssl.EC_POINT_set_compressed_coordinates_GFp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
+    _ssl.EC_POINT_is_at_infinity.restype = ctypes.c_int
+    _ssl.EC_POINT_is_at_infinity.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.ECDSA_sign.restype = ctypes.c_int
-_ssl.ECDSA_sign.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.EC_POINT_new.errcheck = _check_res_void_p
+    _ssl.EC_POINT_new.restype = ctypes.c_void_p
+    _ssl.EC_POINT_new.argtypes = [ctypes.c_void_p]
 
-_ssl.ECDSA_size.restype = ctypes.c_int
-_ssl.ECDSA_size.argtypes = [ctypes.c_void_p]
+    _ssl.EC_POINT_mul.restype = ctypes.c_int
+    _ssl.EC_POINT_mul.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.ECDSA_verify.restype = ctypes.c_int
-_ssl.ECDSA_verify.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
+    _ssl.EC_POINT_set_compressed_coordinates_GFp.restype = ctypes.c_int
+    _ssl.EC_POINT_set_compressed_coordinates_GFp.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
 
-_ssl.ECDSA_SIG_free.restype = None
-_ssl.ECDSA_SIG_free.argtypes = [ctypes.c_void_p]
+    _ssl.ECDSA_do_sign_ex.restype = ctypes.c_void_p
+    _ssl.ECDSA_do_sign_ex.argtypes = [ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.ECDH_compute_key.restype = ctypes.c_int
-_ssl.ECDH_compute_key.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.ECDSA_sign.restype = ctypes.c_int
+    _ssl.ECDSA_sign.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.ERR_error_string_n.restype = None
-_ssl.ERR_error_string_n.argtypes = [ctypes.c_ulong, ctypes.c_char_p, ctypes.c_size_t]
+    _ssl.ECDSA_size.restype = ctypes.c_int
+    _ssl.ECDSA_size.argtypes = [ctypes.c_void_p]
 
-_ssl.ERR_get_error.restype = ctypes.c_ulong
-_ssl.ERR_get_error.argtypes = []
+    _ssl.ECDSA_verify.restype = ctypes.c_int
+    _ssl.ECDSA_verify.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p]
 
-_ssl.d2i_ECDSA_SIG.restype = ctypes.c_void_p
-_ssl.d2i_ECDSA_SIG.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+    _ssl.ECDSA_SIG_free.restype = None
+    _ssl.ECDSA_SIG_free.argtypes = [ctypes.c_void_p]
 
-_ssl.d2i_ECPrivateKey.restype = ctypes.c_void_p
-_ssl.d2i_ECPrivateKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+    _ssl.ECDH_compute_key.restype = ctypes.c_int
+    _ssl.ECDH_compute_key.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p]
 
-_ssl.i2d_ECDSA_SIG.restype = ctypes.c_int
-_ssl.i2d_ECDSA_SIG.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.ERR_error_string_n.restype = None
+    _ssl.ERR_error_string_n.argtypes = [ctypes.c_ulong, ctypes.c_char_p, ctypes.c_size_t]
 
-_ssl.i2d_ECPrivateKey.restype = ctypes.c_int
-_ssl.i2d_ECPrivateKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.ERR_get_error.restype = ctypes.c_ulong
+    _ssl.ERR_get_error.argtypes = []
 
-_ssl.i2o_ECPublicKey.restype = ctypes.c_void_p
-_ssl.i2o_ECPublicKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    _ssl.d2i_ECDSA_SIG.restype = ctypes.c_void_p
+    _ssl.d2i_ECDSA_SIG.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
 
-_ssl.o2i_ECPublicKey.restype = ctypes.c_void_p
-_ssl.o2i_ECPublicKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+    _ssl.d2i_ECPrivateKey.restype = ctypes.c_void_p
+    _ssl.d2i_ECPrivateKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+
+    _ssl.i2d_ECDSA_SIG.restype = ctypes.c_int
+    _ssl.i2d_ECDSA_SIG.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.i2d_ECPrivateKey.restype = ctypes.c_int
+    _ssl.i2d_ECPrivateKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.i2o_ECPublicKey.restype = ctypes.c_void_p
+    _ssl.i2o_ECPublicKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+
+    _ssl.o2i_ECPublicKey.restype = ctypes.c_void_p
+    _ssl.o2i_ECPublicKey.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_long]
+
+    return _ssl
+
+_ssl = _load_openssl()
 
 # this specifies the curve used with ECDSA.
 _NID_secp256k1 = 714 # from openssl/obj_mac.h
 
 # test that OpenSSL supports secp256k1
-_ssl.EC_KEY_new_by_curve_name(_NID_secp256k1)
+if _ssl is not None:
+    try:
+        _ssl.EC_KEY_free(_ssl.EC_KEY_new_by_curve_name(_NID_secp256k1))
+    except OpenSSLException:
+        _ssl = None
+
+def _bn_to_int(bn):
+    size = (_ssl.BN_num_bits(bn) + 7) // 8
+    mb = ctypes.create_string_buffer(size)
+    _ssl.BN_bn2bin(bn, mb)
+    return gozer.core._ecdsa.bytes_to_int(mb.raw)
+
+def _int_to_bn(i, bn):
+    _ssl.BN_bin2bn(gozer.core._ecdsa.int_to_bytes32(i), 32, bn)
+    return bn
+
+class _OpenSSLScratch(object):
+    """BN_CTX and temporaries for one thread"""
+
+    def __init__(self, group):
+        self.ctx = _ssl.BN_CTX_new()
+        self.bns = [_ssl.BN_new() for i in range(5)]
+        self.points = [_ssl.EC_POINT_new(group) for i in range(3)]
+
+    def __del__(self):
+        if _ssl:
+            for point in self.points:
+                _ssl.EC_POINT_free(point)
+            for bn in self.bns:
+                _ssl.BN_clear_free(bn)
+            _ssl.BN_CTX_free(self.ctx)
+
+class _OpenSSLCurve(object):
+    """The secp256k1 group, its order and field, set up once per process
+
+    These are never freed. Scratch space is kept per thread, as a BN_CTX
+    can't be shared between threads.
+    """
+
+    def __init__(self):
+        self.group = _ssl.EC_GROUP_new_by_curve_name(_NID_secp256k1)
+        self.order = _ssl.BN_new()
+        _ssl.EC_GROUP_get_order(self.group, self.order, None)
+        self.halforder = _ssl.BN_new()
+        _ssl.BN_rshift1(self.halforder, self.order)
+        self.field = _ssl.BN_new()
+        _ssl.EC_GROUP_get_curve_GFp(self.group, self.field, None, None, None)
+        self.degree = _ssl.EC_GROUP_get_degree(self.group)
+        self._local = threading.local()
+
+    def scratch(self):
+        try:
+            return self._local.scratch
+        except AttributeError:
+            scratch = self._local.scratch = _OpenSSLScratch(self.group)
+            return scratch
+
+_ssl_curve = _OpenSSLCurve() if _ssl is not None else None
 
 # From openssl/ecdsa.h
 class ECDSA_SIG_st(ctypes.Structure):
@@ -203,6 +307,8 @@ class CECKey:
     POINT_CONVERSION_UNCOMPRESSED = 4
 
     def __init__(self):
+        if _ssl is None:
+            raise OpenSSLException('OpenSSL with secp256k1 support is not available')
         self.k = _ssl.EC_KEY_new_by_curve_name(_NID_secp256k1)
 
     def __del__(self):
@@ -258,86 +364,84 @@ class CECKey:
         r = self.get_raw_ecdh_key(other_pubkey)
         return kdf(r)
 
-    def sign(self, hash): # pylint: disable=redefined-builtin
-        if not isinstance(hash, bytes):
-            raise TypeError('Hash must be bytes instance; got %r' % hash.__class__)
-        if len(hash) != 32:
-            raise ValueError('Hash must be exactly 32 bytes long')
-
-        sig_size0 = ctypes.c_uint32()
-        sig_size0.value = _ssl.ECDSA_size(self.k)
-        mb_sig = ctypes.create_string_buffer(sig_size0.value)
-        result = _ssl.ECDSA_sign(0, hash, len(hash), mb_sig, ctypes.byref(sig_size0), self.k)
-        assert 1 == result
-        if gozer.core.script.IsLowDERSignature(mb_sig.raw[:sig_size0.value]):
-            return mb_sig.raw[:sig_size0.value]
-        else:
-            return self.signature_to_low_s(mb_sig.raw[:sig_size0.value])
-
-    def sign_compact(self, hash): # pylint: disable=redefined-builtin
-        if not isinstance(hash, bytes):
-            raise TypeError('Hash must be bytes instance; got %r' % hash.__class__)
-        if len(hash) != 32:
-            raise ValueError('Hash must be exactly 32 bytes long')
-
-        sig_size0 = ctypes.c_uint32()
-        sig_size0.value = _ssl.ECDSA_size(self.k)
-        mb_sig = ctypes.create_string_buffer(sig_size0.value)
-        result = _ssl.ECDSA_sign(0, hash, len(hash), mb_sig, ctypes.byref(sig_size0), self.k)
-        assert 1 == result
-
-        if gozer.core.script.IsLowDERSignature(mb_sig.raw[:sig_size0.value]):
-            sig = mb_sig.raw[:sig_size0.value]
-        else:
-            sig = self.signature_to_low_s(mb_sig.raw[:sig_size0.value])
-
-        sig = gozer.signature.DERSignature.deserialize(sig)
-
-        r_val = sig.r
-        s_val = sig.s
-
-        # assert that the r and s are less than 32 long, excluding leading 0s
-        assert len(r_val) <= 32 or r_val[0:-32] == b'\x00'
-        assert len(s_val) <= 32 or s_val[0:-32] == b'\x00'
+    def get_secretbytes(self):
+        """Return the secret as 32 bytes, or None if there's no private key"""
+        priv_key = _ssl.EC_KEY_get0_private_key(self.k)
+        if not priv_key:
+            return None
+        return gozer.core._ecdsa.int_to_bytes32(_bn_to_int(priv_key))
 
-        # ensure r and s are always 32 chars long by 0padding
-        r_val = ((b'\x00' * 32) + r_val)[-32:]
-        s_val = ((b'\x00' * 32) + s_val)[-32:]
+    def _sign_many(self, hashes):
+        """Sign each hash, returning a list of (r, s, recid)
 
-        # tmp pubkey of self, but always compressed
-        pubkey = CECKey()
-        pubkey.set_pubkey(self.get_pubkey())
-        pubkey.set_compressed(True)
+        Nonces are RFC6979 deterministic, and S is always low, so signatures
+        are the same as libsecp256k1 makes.
+        """
+        for hash in hashes:
+            _check_hash(hash)
+        secret = self.get_secretbytes()
+        if secret is None:
+            raise ValueError('Can not sign without a private key')
+        secret = gozer.core._ecdsa.bytes_to_int(secret)
+
+        N = gozer.core._ecdsa.N
+        curve = _ssl_curve
+        scratch = curve.scratch()
+        (k, kinv, x, y, r_bn) = scratch.bns
+        R = scratch.points[0]
+
+        sigs = []
+        for hash in hashes:
+            for nonce in gozer.core._ecdsa.rfc6979_nonces(secret, hash):
+                _int_to_bn(nonce, k)
+                if not _ssl.EC_POINT_mul(curve.group, R, k, None, None, scratch.ctx) or \
+                   not _ssl.EC_POINT_get_affine_coordinates_GFp(curve.group, R, x, y, scratch.ctx):
+                    raise OpenSSLException('Could not compute the nonce point')
+                Rx = _bn_to_int(x)
+                r = Rx % N
+                if not r:
+                    continue
+                recid = (_bn_to_int(y) & 1) | (2 if Rx >= N else 0)
+
+                # OpenSSL takes the nonce as k^-1 and r
+                _int_to_bn(r, r_bn)
+                if not _ssl.BN_mod_inverse(kinv, k, curve.order, scratch.ctx):
+                    raise OpenSSLException('Could not invert the nonce')
+                sig = _ssl.ECDSA_do_sign_ex(hash, len(hash), kinv, r_bn, self.k)
+                if not sig:
+                    # s is zero, vanishingly unlikely
+                    continue
+                try:
+                    s_bn = ctypes.cast(sig, ctypes.POINTER(ECDSA_SIG_st)).contents.s
+                    if _ssl.BN_cmp(s_bn, curve.halforder) > 0:
+                        _ssl.BN_sub(s_bn, curve.order, s_bn)
+                        recid ^= 1
+                    s = _bn_to_int(s_bn)
+                finally:
+                    _ssl.ECDSA_SIG_free(sig)
+                sigs.append((r, s, recid))
+                break
+        return sigs
 
-        # gozer core does <4, but I've seen other places do <2 and I've never seen a i > 1 so far
-        for i in range(0, 4):
-            cec_key = CECKey()
-            cec_key.set_compressed(True)
+    def sign(self, hash): # pylint: disable=redefined-builtin
+        (r, s, recid) = self._sign_many([hash])[0]
+        return gozer.core._ecdsa.serialize_der(r, s)
 
-            result = cec_key.recover(r_val, s_val, hash, len(hash), i, 1)
-            if result == 1:
-                if cec_key.get_pubkey() == pubkey.get_pubkey():
-                    return r_val + s_val, i
+    def sign_many(self, hashes):
+        """Sign many hashes, returning a list of DER signatures"""
+        return [gozer.core._ecdsa.serialize_der(r, s) for (r, s, recid) in self._sign_many(hashes)]
 
-        raise ValueError
+    def sign_compact(self, hash): # pylint: disable=redefined-builtin
+        (r, s, recid) = self._sign_many([hash])[0]
+        return (gozer.core._ecdsa.int_to_bytes32(r) + gozer.core._ecdsa.int_to_bytes32(s), recid)
 
     def signature_to_low_s(self, sig):
         der_sig = ECDSA_SIG_st()
         _ssl.d2i_ECDSA_SIG(ctypes.byref(ctypes.pointer(der_sig)), ctypes.byref(ctypes.c_char_p(sig)), len(sig))
-        group = _ssl.EC_KEY_get0_group(self.k)
-        order = _ssl.BN_new()
-        halforder = _ssl.BN_new()
-        ctx = _ssl.BN_CTX_new()
-        _ssl.EC_GROUP_get_order(group, order, ctx)
-        _ssl.BN_rshift1(halforder, order)
 
         # Verify that s is over half the order of the curve before we actually subtract anything from it
-        if _ssl.BN_cmp(der_sig.s, halforder) > 0:
-          _ssl.BN_sub(der_sig.s, order, der_sig.s)
-
-        _ssl.BN_free(halforder)
-        _ssl.BN_free(order)
-        _ssl.BN_CTX_free(ctx)
+        if _ssl.BN_cmp(der_sig.s, _ssl_curve.halforder) > 0:
+          _ssl.BN_sub(der_sig.s, _ssl_curve.order, der_sig.s)
 
         derlen = _ssl.i2d_ECDSA_SIG(ctypes.pointer(der_sig), 0)
         if derlen == 0:
@@ -351,25 +455,18 @@ class CECKey:
         return new_sig.raw
 
     def verify(self, hash, sig): # pylint: disable=redefined-builtin
-        """Verify a DER signature"""
-        if not sig:
-          return False
-
-        # New versions of OpenSSL will reject non-canonical DER signatures. de/re-serialize first.
-        norm_sig = ctypes.c_void_p(0)
-        _ssl.d2i_ECDSA_SIG(ctypes.byref(norm_sig), ctypes.byref(ctypes.c_char_p(sig)), len(sig))
+        """Verify a DER signature
 
-        derlen = _ssl.i2d_ECDSA_SIG(norm_sig, 0)
-        if derlen == 0:
-            _ssl.ECDSA_SIG_free(norm_sig)
+        The signature is parsed as laxly as Satoshi's codebase does, and
+        re-encoded as strict DER, which is all OpenSSL accepts.
+        """
+        rs = gozer.core._ecdsa.parse_der_lax(sig)
+        if rs is None:
             return False
-
-        norm_der = ctypes.create_string_buffer(derlen)
-        _ssl.i2d_ECDSA_SIG(norm_sig, ctypes.byref(ctypes.pointer(norm_der)))
-        _ssl.ECDSA_SIG_free(norm_sig)
+        norm_der = gozer.core._ecdsa.serialize_der(rs[0], rs[1])
 
         # -1 = error, 0 = bad sig, 1 = good
-        return _ssl.ECDSA_verify(0, hash, len(hash), norm_der, derlen, self.k) == 1
+        return _ssl.ECDSA_verify(0, hash, len(hash), norm_der, len(norm_der), self.k) == 1
 
     def set_compressed(self, compressed):
         if compressed:
@@ -388,83 +485,61 @@ class CECKey:
         """
         i = int(recid / 2)
 
-        r = None
-        s = None
-        ctx = None
-        R = None
-        O = None
-        Q = None
-
         assert len(sigR) == 32, len(sigR)
         assert len(sigS) == 32, len(sigS)
 
-        try:
-            r = _ssl.BN_bin2bn(bytes(sigR), len(sigR), _ssl.BN_new())
-            s = _ssl.BN_bin2bn(bytes(   sigS), len(sigS), _ssl.BN_new())
+        curve = _ssl_curve
+        group = curve.group
+        scratch = curve.scratch()
+        ctx = scratch.ctx
+        (R, O, Q) = scratch.points
 
-            group = _ssl.EC_KEY_get0_group(self.k)
-            ctx = _ssl.BN_CTX_new()
-            order = _ssl.BN_CTX_get(ctx)
-            ctx = _ssl.BN_CTX_new()
-
-            if not _ssl.EC_GROUP_get_order(group, order, ctx):
-                return -2
+        _ssl.BN_CTX_start(ctx)
+        try:
+            r = _ssl.BN_bin2bn(bytes(sigR), len(sigR), _ssl.BN_CTX_get(ctx))
+            s = _ssl.BN_bin2bn(bytes(sigS), len(sigS), _ssl.BN_CTX_get(ctx))
+            if not r or not s:
+                return -1
 
             x = _ssl.BN_CTX_get(ctx)
-            if not _ssl.BN_copy(x, order):
+            if not _ssl.BN_copy(x, curve.order):
                 return -1
             if not _ssl.BN_mul_word(x, i):
                 return -1
             if not _ssl.BN_add(x, x, r):
                 return -1
 
-            field = _ssl.BN_CTX_get(ctx)
-            if not _ssl.EC_GROUP_get_curve_GFp(group, field, None, None, ctx):
-                return -2
-
-            if _ssl.BN_cmp(x, field) >= 0:
+            if _ssl.BN_cmp(x, curve.field) >= 0:
                 return 0
 
-            R = _ssl.EC_POINT_new(group)
-            if R is None:
-                return -2
             if not _ssl.EC_POINT_set_compressed_coordinates_GFp(group, R, x, recid % 2, ctx):
                 return 0
 
             if check:
-                O = _ssl.EC_POINT_new(group)
-                if O is None:
-                    return -2
-                if not _ssl.EC_POINT_mul(group, O, None, R, order, ctx):
+                if not _ssl.EC_POINT_mul(group, O, None, R, curve.order, ctx):
                     return -2
                 if not _ssl.EC_POINT_is_at_infinity(group, O):
                     return 0
 
-            Q = _ssl.EC_POINT_new(group)
-            if Q is None:
-                return -2
-
-            n = _ssl.EC_GROUP_get_degree(group)
             e = _ssl.BN_CTX_get(ctx)
             if not _ssl.BN_bin2bn(msg, msglen, e):
                 return -1
 
-            if 8 * msglen > n:
-                _ssl.BN_rshift(e, e, 8 - (n & 7))
+            if 8 * msglen > curve.degree:
+                _ssl.BN_rshift(e, e, 8 - (curve.degree & 7))
 
+            # BN_CTX_get() zeroes what it returns
             zero = _ssl.BN_CTX_get(ctx)
-            # if not _ssl.BN_zero(zero):
-            #     return -1
-            if not _ssl.BN_mod_sub(e, zero, e, order, ctx):
+            if not _ssl.BN_mod_sub(e, zero, e, curve.order, ctx):
                 return -1
             rr = _ssl.BN_CTX_get(ctx)
-            if not _ssl.BN_mod_inverse(rr, r, order, ctx):
+            if not _ssl.BN_mod_inverse(rr, r, curve.order, ctx):
                 return -1
             sor = _ssl.BN_CTX_get(ctx)
-            if not _ssl.BN_mod_mul(sor, s, rr, order, ctx):
+            if not _ssl.BN_mod_mul(sor, s, rr, curve.order, ctx):
                 return -1
             eor = _ssl.BN_CTX_get(ctx)
-            if not _ssl.BN_mod_mul(eor, e, rr, order, ctx):
+            if not _ssl.BN_mod_mul(eor, e, rr, curve.order, ctx):
                 return -1
             if not _ssl.EC_POINT_mul(group, Q, eor, R, sor, ctx):
                 return -2
@@ -474,12 +549,421 @@ class CECKey:
 
             return 1
         finally:
-            if r: _ssl.BN_free(r)
-            if s: _ssl.BN_free(s)
-            if ctx: _ssl.BN_CTX_free(ctx)
-            if R: _ssl.EC_POINT_free(R)
-            if O: _ssl.EC_POINT_free(O)
-            if Q: _ssl.EC_POINT_free(Q)
+            _ssl.BN_CTX_end(ctx)
+
+def _check_hash(hash): # pylint: disable=redefined-builtin
+    if not isinstance(hash, bytes):
+        raise TypeError('Hash must be bytes instance; got %r' % hash.__class__)
+    if len(hash) != 32:
+        raise ValueError('Hash must be exactly 32 bytes long')
+
+
+class _OpenSSLBackend(object):
+    """ECDSA with OpenSSL, through CECKey
+
+    Pubkey and secret key handles are CECKey instances.
+    """
+    name = 'openssl'
+
+    def parse_pubkey(self, pubkey):
+        key = CECKey()
+        if key.set_pubkey(pubkey) is None:
+            return None
+        return key
+
+    def verify(self, key, hash, sig): # pylint: disable=redefined-builtin
+        return key.verify(hash, sig)
+
+    def secret_key(self, secret):
+        key = CECKey()
+        key.set_secretbytes(secret)
+        return key
+
+    def get_pubkey(self, key, compressed):
+        key.set_compressed(compressed)
+        return key.get_pubkey()
+
+    def sign(self, key, hash): # pylint: disable=redefined-builtin
+        return key.sign(hash)
+
+    def sign_many(self, key, hashes):
+        return key.sign_many(hashes)
+
+    def sign_compact(self, key, hash): # pylint: disable=redefined-builtin
+        return key.sign_compact(hash)
+
+    def recover_compact(self, hash, sig, recid, compressed): # pylint: disable=redefined-builtin
+        return self.recover_compact_many([(hash, sig, recid, compressed)])[0]
+
+    def recover_compact_many(self, items):
+        # One key each for compressed and uncompressed results, reused
+        keys = {}
+        pubkeys = []
+        for (hash, sig, recid, compressed) in items: # pylint: disable=redefined-builtin
+            key = keys.get(compressed)
+            if key is None:
+                key = keys[compressed] = CECKey()
+                key.set_compressed(compressed)
+            if key.recover(sig[0:32], sig[32:64], hash, len(hash), recid, 0) < 1:
+                pubkeys.append(None)
+            else:
+                pubkeys.append(key.get_pubkey())
+        return pubkeys
+
+
+class _PythonBackend(object):
+    """ECDSA in pure Python, see gozer.core._ecdsa
+
+    Pubkey handles are points, and secret key handles are ints.
+    """
+    name = 'python'
+
+    def parse_pubkey(self, pubkey):
+        return gozer.core._ecdsa.parse_pubkey(pubkey)
+
+    def verify(self, point, hash, sig): # pylint: disable=redefined-builtin
+        rs = gozer.core._ecdsa.parse_der_lax(sig)
+        if point is None or rs is None:
+            return False
+        return gozer.core._ecdsa.verify(point, hash, rs[0], rs[1])
+
+    def secret_key(self, secret):
+        secret = gozer.core._ecdsa.bytes_to_int(secret)
+        if not 0 < secret < gozer.core._ecdsa.N:
+            raise ValueError("Could not derive public key from the supplied secret.")
+        return secret
+
+    def get_pubkey(self, secret, compressed):
+        return gozer.core._ecdsa.serialize_pubkey(gozer.core._ecdsa.point_mul_g(secret), compressed)
+
+    def sign(self, secret, hash): # pylint: disable=redefined-builtin
+        _check_hash(hash)
+        (r, s, recid) = gozer.core._ecdsa.sign(secret, hash)
+        return gozer.core._ecdsa.serialize_der(r, s)
+
+    def sign_many(self, secret, hashes):
+        return [self.sign(secret, hash) for hash in hashes]
+
+    def sign_compact(self, secret, hash): # pylint: disable=redefined-builtin
+        _check_hash(hash)
+        (r, s, recid) = gozer.core._ecdsa.sign(secret, hash)
+        return (gozer.core._ecdsa.int_to_bytes32(r) + gozer.core._ecdsa.int_to_bytes32(s), recid)
+
+    def recover_compact(self, hash, sig, recid, compressed): # pylint: disable=redefined-builtin
+        point = gozer.core._ecdsa.recover(hash,
+                                          gozer.core._ecdsa.bytes_to_int(sig[0:32]),
+                                          gozer.core._ecdsa.bytes_to_int(sig[32:64]),
+                                          recid)
+        if point is None:
+            return None
+        return gozer.core._ecdsa.serialize_pubkey(point, compressed)
+
+    def recover_compact_many(self, items):
+        return [self.recover_compact(*item) for item in items]
+
+
+_SECP256K1_CONTEXT_VERIFY = (1 << 0) | (1 << 8)
+_SECP256K1_CONTEXT_SIGN = (1 << 0) | (1 << 9)
+_SECP256K1_EC_COMPRESSED = (1 << 1) | (1 << 8)
+_SECP256K1_EC_UNCOMPRESSED = (1 << 1)
+
+class _Secp256k1Backend(object):
+    """ECDSA with libsecp256k1, loaded with ctypes
+
+    Pubkey handles are secp256k1_pubkey buffers, and secret key handles the
+    secret itself. Compact signatures and recovery need the library to be
+    built with the recovery module; without it they're done in Python.
+    """
+    name = 'secp256k1'
+
+    def __init__(self, path):
+        lib = ctypes.cdll.LoadLibrary(path)
+
+        lib.secp256k1_context_create.restype = ctypes.c_void_p
+        lib.secp256k1_context_create.argtypes = [ctypes.c_uint]
+
+        lib.secp256k1_ec_pubkey_parse.restype = ctypes.c_int
+        lib.secp256k1_ec_pubkey_parse.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_size_t]
+
+        lib.secp256k1_ec_pubkey_serialize.restype = ctypes.c_int
+        lib.secp256k1_ec_pubkey_serialize.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t), ctypes.c_char_p, ctypes.c_uint]
+
+        lib.secp256k1_ec_pubkey_create.restype = ctypes.c_int
+        lib.secp256k1_ec_pubkey_create.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+
+        lib.secp256k1_ec_seckey_verify.restype = ctypes.c_int
+        lib.secp256k1_ec_seckey_verify.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+
+        lib.secp256k1_ecdsa_signature_parse_compact.restype = ctypes.c_int
+        lib.secp256k1_ecdsa_signature_parse_compact.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+
+        lib.secp256k1_ecdsa_signature_normalize.restype = ctypes.c_int
+        lib.secp256k1_ecdsa_signature_normalize.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p]
+
+        lib.secp256k1_ecdsa_signature_serialize_der.restype = ctypes.c_int
+        lib.secp256k1_ecdsa_signature_serialize_der.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_size_t), ctypes.c_char_p]
+
+        lib.secp256k1_ecdsa_verify.restype = ctypes.c_int
+        lib.secp256k1_ecdsa_verify.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+
+        lib.secp256k1_ecdsa_sign.restype = ctypes.c_int
+        lib.secp256k1_ecdsa_sign.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p]
+
+        self.has_recovery = hasattr(lib, 'secp256k1_ecdsa_recover')
+        if self.has_recovery:
+            lib.secp256k1_ecdsa_sign_recoverable.restype = ctypes.c_int
+            lib.secp256k1_ecdsa_sign_recoverable.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p]
+
+            lib.secp256k1_ecdsa_recoverable_signature_serialize_compact.restype = ctypes.c_int
+            lib.secp256k1_ecdsa_recoverable_signature_serialize_compact.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.POINTER(ctypes.c_int), ctypes.c_char_p]
+
+            lib.secp256k1_ecdsa_recoverable_signature_parse_compact.restype = ctypes.c_int
+            lib.secp256k1_ecdsa_recoverable_signature_parse_compact.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_int]
+
+            lib.secp256k1_ecdsa_recover.restype = ctypes.c_int
+            lib.secp256k1_ecdsa_recover.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+
+        self._lib = lib
+        # Never destroyed, as the library is never unloaded. All the
+        # functions used take it as const, so it's safe to share between
+        # threads.
+        self._ctx = lib.secp256k1_context_create(_SECP256K1_CONTEXT_VERIFY | _SECP256K1_CONTEXT_SIGN)
+
+    def parse_pubkey(self, pubkey):
+        key = ctypes.create_string_buffer(64)
+        if not self._lib.secp256k1_ec_pubkey_parse(self._ctx, key, pubkey, len(pubkey)):
+            return None
+        return key
+
+    def _serialize_pubkey(self, key, compressed):
+        pubkey = ctypes.create_string_buffer(65)
+        size = ctypes.c_size_t(65)
+        self._lib.secp256k1_ec_pubkey_serialize(self._ctx, pubkey, ctypes.byref(size), key,
+                _SECP256K1_EC_COMPRESSED if compressed else _SECP256K1_EC_UNCOMPRESSED)
+        return pubkey.raw[:size.value]
+
+    def verify(self, key, hash, sig): # pylint: disable=redefined-builtin
+        if key is None or len(hash) != 32:
+            return False
+        rs = gozer.core._ecdsa.parse_der_lax(sig)
+        if rs is None:
+            return False
+        sig = ctypes.create_string_buffer(64)
+        if not self._lib.secp256k1_ecdsa_signature_parse_compact(self._ctx, sig,
+                gozer.core._ecdsa.int_to_bytes32(rs[0]) + gozer.core._ecdsa.int_to_bytes32(rs[1])):
+            return False
+        # libsecp256k1 only accepts low S, consensus accepts both
+        self._lib.secp256k1_ecdsa_signature_normalize(self._ctx, sig, sig)
+        return self._lib.secp256k1_ecdsa_verify(self._ctx, sig, hash, key) == 1
+
+    def secret_key(self, secret):
+        secret = bytes(secret)
+        if len(secret) != 32 or not self._lib.secp256k1_ec_seckey_verify(self._ctx, secret):
+            raise ValueError("Could not derive public key from the supplied secret.")
+        return secret
+
+    def get_pubkey(self, secret, compressed):
+        key = ctypes.create_string_buffer(64)
+        self._lib.secp256k1_ec_pubkey_create(self._ctx, key, secret)
+        return self._serialize_pubkey(key, compressed)
+
+    def sign(self, secret, hash): # pylint: disable=redefined-builtin
+        return self.sign_many(secret, [hash])[0]
+
+    def sign_many(self, secret, hashes):
+        for hash in hashes:
+            _check_hash(hash)
+        sig = ctypes.create_string_buffer(64)
+        der = ctypes.create_string_buffer(72)
+        size = ctypes.c_size_t()
+        sigs = []
+        for hash in hashes:
+            if not self._lib.secp256k1_ecdsa_sign(self._ctx, sig, hash, secret, None, None):
+                raise ValueError('secp256k1_ecdsa_sign() failed')
+            size.value = 72
+            self._lib.secp256k1_ecdsa_signature_serialize_der(self._ctx, der, ctypes.byref(size), sig)
+            sigs.append(der.raw[:size.value])
+        return sigs
+
+    def sign_compact(self, secret, hash): # pylint: disable=redefined-builtin
+        if not self.has_recovery:
+            return _python_backend.sign_compact(_python_backend.secret_key(secret), hash)
+        _check_hash(hash)
+        sig = ctypes.create_string_buffer(65)
+        if not self._lib.secp256k1_ecdsa_sign_recoverable(self._ctx, sig, hash, secret, None, None):
+            raise ValueError('secp256k1_ecdsa_sign_recoverable() failed')
+        compact = ctypes.create_string_buffer(64)
+        recid = ctypes.c_int()
+        self._lib.secp256k1_ecdsa_recoverable_signature_serialize_compact(self._ctx, compact,
+                                                                          ctypes.byref(recid), sig)
+        return (compact.raw, recid.value)
+
+    def recover_compact(self, hash, sig, recid, compressed): # pylint: disable=redefined-builtin
+        return self.recover_compact_many([(hash, sig, recid, compressed)])[0]
+
+    def recover_compact_many(self, items):
+        if not self.has_recovery:
+            return _python_backend.recover_compact_many(items)
+        rsig = ctypes.create_string_buffer(65)
+        key = ctypes.create_string_buffer(64)
+        pubkeys = []
+        for (hash, sig, recid, compressed) in items: # pylint: disable=redefined-builtin
+            if len(hash) != 32:
+                pubkeys.append(_python_backend.recover_compact(hash, sig, recid, compressed))
+            elif not self._lib.secp256k1_ecdsa_recoverable_signature_parse_compact(self._ctx, rsig,
+                                                                                   bytes(sig), recid) or \
+                 not self._lib.secp256k1_ecdsa_recover(self._ctx, key, rsig, hash):
+                pubkeys.append(None)
+            else:
+                pubkeys.append(self._serialize_pubkey(key, compressed))
+        return pubkeys
+
+
+_python_backend = _PythonBackend()
+
+def _load_secp256k1_backend():
+    path = os.environ.get('GOZER_SECP256K1_LIBRARY') or ctypes.util.find_library('secp256k1')
+    if not path:
+        return None
+    try:
+        return _Secp256k1Backend(path)
+    except (OSError, AttributeError):
+        # Not found, or too old
+        return None
+
+_backends = {}
+_backend = None
+
+def _get_backend(name):
+    try:
+        return _backends[name]
+    except KeyError:
+        pass
+    if name == 'secp256k1':
+        backend = _load_secp256k1_backend()
+    elif name == 'openssl':
+        backend = _OpenSSLBackend() if _ssl is not None else None
+    elif name == 'python':
+        backend = _python_backend
+    else:
+        raise ValueError('Unknown ECDSA backend %r' % name)
+    _backends[name] = backend
+    return backend
+
+ECDSA_BACKENDS = ('secp256k1', 'openssl', 'python')
+
+def available_ecdsa_backends():
+    """Return the names of the ECDSA backends that can be used, fastest first"""
+    return [name for name in ECDSA_BACKENDS if _get_backend(name) is not None]
+
+def set_ecdsa_backend(name=None):
+    """Select the ECDSA backend used by CPubKey and CKey
+
+    name - One of ECDSA_BACKENDS, or None for the fastest available one.
+           libsecp256k1 is looked for with ctypes.util.find_library(), unless
+           the GOZER_SECP256K1_LIBRARY environment variable gives its path.
+
+    The default is taken from the GOZER_ECDSA_BACKEND environment variable
+    if set. Keys already created keep using the backend they were made with.
+    Raises ValueError if the backend isn't available.
+    """
+    global _backend
+    if name is None:
+        name = available_ecdsa_backends()[0]
+    backend = _get_backend(name)
+    if backend is None:
+        raise ValueError('ECDSA backend %r is not available' % name)
+    _backend = backend
+
+def get_ecdsa_backend():
+    """Return the name of the ECDSA backend in use"""
+    return _backend.name
+
+set_ecdsa_backend(os.environ.get('GOZER_ECDSA_BACKEND') or None)
+
+
+DEFAULT_MAX_PUBKEY_CACHE_ENTRIES = 10000
+
+class PubKeyCache(object):
+    """Bounded LRU cache of parsed pubkeys
+
+    Maps serialized pubkeys to their parsed form, so that pubkeys seen over and
+    over again, such as those of busy addresses when validating blocks, are
+    only parsed once. Invalid pubkeys are cached too. Entries are evicted least
+    recently used first once there are more than max_entries.
+
+    hits and misses count the lookups made with parse(), and evictions the
+    entries dropped.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_PUBKEY_CACHE_ENTRIES):
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse(self, backend, pubkey):
+        """Return the parsed form of pubkey for backend, or None if invalid"""
+        entry = (backend, bytes(pubkey))
+        with self._lock:
+            try:
+                # Re-added below as the most recently used;
+                # OrderedDict.move_to_end() is Python 3 only
+                key = self._entries.pop(entry)
+            except KeyError:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries[entry] = key
+                return key
+
+        # Parsed without the lock held; at worst another thread parses the
+        # same pubkey at the same time.
+        key = backend.parse_pubkey(pubkey)
+
+        with self._lock:
+            self._entries[entry] = key
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return key
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '%s(<%i/%i entries, %i hits, %i misses, %i evictions>)' % \
+                (self.__class__.__name__, len(self), self.max_entries, self.hits, self.misses,
+                 self.evictions)
+
+_pubkey_cache = PubKeyCache()
+
+def set_pubkey_cache(cache):
+    """Set the PubKeyCache used by CPubKey, or None to disable caching"""
+    global _pubkey_cache
+    _pubkey_cache = cache
+
+def get_pubkey_cache():
+    """Return the PubKeyCache used by CPubKey, if any"""
+    return _pubkey_cache
+
+
+def _split_compact(sig):
+    """Split a compact signature into (sig, recid, compressed)"""
+    header = _bord(sig[0]) - 27
+    return (sig[1:65], header & 3, header & 4 != 0)
 
 class CPubKey(bytes):
     """An encapsulated public key
@@ -493,37 +977,48 @@ class CPubKey(bytes):
     is_compressed - Corresponds to CPubKey.IsCompressed()
     """
 
-    def __new__(cls, buf, _cec_key=None):
+    def __new__(cls, buf):
         self = super(CPubKey, cls).__new__(cls, buf)
-        if _cec_key is None:
-            _cec_key = CECKey()
-        self._cec_key = _cec_key
-        self.is_fullyvalid = _cec_key.set_pubkey(self) is not None
+        self._backend = _backend
+        if _pubkey_cache is not None:
+            self._key = _pubkey_cache.parse(_backend, self)
+        else:
+            self._key = _backend.parse_pubkey(self)
+        self.is_fullyvalid = self._key is not None
         return self
 
+    def __reduce__(self):
+        # The parsed key is backend-specific, and may not be picklable; it's
+        # likely to be found in the cache anyway
+        return (self.__class__, (bytes(self),))
+
     @classmethod
     def recover_compact(cls, hash, sig): # pylint: disable=redefined-builtin
         """Recover a public key from a compact signature."""
         if len(sig) != 65:
             raise ValueError("Signature should be 65 characters, not [%d]" % (len(sig), ))
 
-        recid = (_bord(sig[0]) - 27) & 3
-        compressed = (_bord(sig[0]) - 27) & 4 != 0
+        pubkey = _backend.recover_compact(hash, *_split_compact(sig))
 
-        cec_key = CECKey()
-        cec_key.set_compressed(compressed)
+        if pubkey is None:
+            return False
 
-        sigR = sig[1:33]
-        sigS = sig[33:65]
+        return CPubKey(pubkey)
 
-        result = cec_key.recover(sigR, sigS, hash, len(hash), recid, 0)
+    @classmethod
+    def recover_compact_many(cls, items, workers=None, executor=None, batch_size=None):
+        """Recover the public keys of many compact signatures
 
-        if result < 1:
-            return False
+        items - Iterable of (hash, sig), as taken by recover_compact()
 
-        pubkey = cec_key.get_pubkey()
+        workers, executor and batch_size are as for verify_batch().
 
-        return CPubKey(pubkey, _cec_key=cec_key)
+        Returns a list of the public keys, in order, with False for the
+        signatures that can't be recovered, including those of the wrong
+        length.
+        """
+        return _run_batches(functools.partial(_recover_chunk, cls), items, False,
+                            workers, executor, batch_size)
 
     @property
     def is_valid(self):
@@ -534,7 +1029,9 @@ class CPubKey(bytes):
         return len(self) == 33
 
     def verify(self, hash, sig): # pylint: disable=redefined-builtin
-        return self._cec_key.verify(hash, sig)
+        if self._key is None:
+            return False
+        return self._backend.verify(self._key, hash, sig)
 
     def __str__(self):
         return repr(self)
@@ -547,7 +1044,112 @@ class CPubKey(bytes):
         else:
             return '%s(b%s)' % (self.__class__.__name__, super(CPubKey, self).__repr__())
 
+
+def _verify_chunk(items, all_valid):
+    results = []
+    for (pubkey, hash, sig) in items: # pylint: disable=redefined-builtin
+        if not isinstance(pubkey, CPubKey):
+            pubkey = CPubKey(pubkey)
+        ok = pubkey.verify(hash, sig)
+        if all_valid and not ok:
+            return False
+        results.append(ok)
+    return True if all_valid else results
+
+def _recover_chunk(cls, items):
+    args = []
+    for (hash, sig) in items: # pylint: disable=redefined-builtin
+        args.append((hash,) + _split_compact(sig) if len(sig) == 65 else None)
+    pubkeys = iter(_backend.recover_compact_many([arg for arg in args if arg is not None]))
+
+    results = []
+    for arg in args:
+        pubkey = next(pubkeys) if arg is not None else None
+        results.append(False if pubkey is None else cls(pubkey))
+    return results
+
+def _run_batches(func, items, all_valid, workers, executor, batch_size):
+    """Apply func to items in batches, on executor if given
+
+    func returns a list of results for a batch, or if all_valid is set a bool
+    for whether all are good, which stops everything on the first False.
+    """
+    items = list(items)
+
+    own_executor = None
+    if executor is None and workers is not None:
+        from concurrent.futures import ThreadPoolExecutor
+        executor = own_executor = ThreadPoolExecutor(max_workers=workers)
+
+    try:
+        if executor is None or not items:
+            return func(items)
+
+        import concurrent.futures
+
+        if batch_size is None:
+            if workers is None:
+                import multiprocessing
+                workers = multiprocessing.cpu_count()
+            batch_size = max(1, -(-len(items) // (4 * workers)))
+
+        futures = [executor.submit(func, items[i:i + batch_size])
+                   for i in range(0, len(items), batch_size)]
+        try:
+            if not all_valid:
+                return [result for future in futures for result in future.result()]
+
+            pending = set(futures)
+            while pending:
+                (done, pending) = concurrent.futures.wait(pending,
+                                                          return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if not future.result():
+                        return False
+            return True
+        finally:
+            for future in futures:
+                future.cancel()
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+def verify_batch(items, all_valid=False, workers=None, executor=None, batch_size=None):
+    """Verify many DER signatures
+
+    items      - Iterable of (pubkey, hash, sig); pubkeys may be bytes or
+                 CPubKey instances
+
+    all_valid  - Return a single bool, True if every signature is valid,
+                 stopping at the first invalid one
+
+    workers    - Verify on a ThreadPoolExecutor of this many threads, created
+                 for the call. With executor, the number of workers it has,
+                 which batches are sized by; defaults to the number of CPUs.
+
+    executor   - A concurrent.futures executor to verify on instead
+
+    batch_size - Number of signatures per batch submitted to the executor;
+                 defaults to spreading them over four batches per worker.
+
+    Returns a list with the result of every item, in order, unless all_valid
+    is set. Threads only help with the libsecp256k1 and OpenSSL backends, whose
+    ctypes calls release the GIL.
+    """
+    return _run_batches(functools.partial(_verify_chunk, all_valid=all_valid), items, all_valid,
+                        workers, executor, batch_size)
+
+
 __all__ = (
         'CECKey',
         'CPubKey',
+        'ECDSA_BACKENDS',
+        'available_ecdsa_backends',
+        'set_ecdsa_backend',
+        'get_ecdsa_backend',
+        'DEFAULT_MAX_PUBKEY_CACHE_ENTRIES',
+        'PubKeyCache',
+        'set_pubkey_cache',
+        'get_pubkey_cache',
+        'verify_batch',
 )
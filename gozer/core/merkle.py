@@ -0,0 +1,163 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Merkle trees, as used for the transactions of a block
+
+WARNING! If you're reading this because you're learning about crypto and/or
+designing a new system that will use merkle trees, keep in mind that the
+following merkle tree algorithm has a serious flaw related to duplicate
+txids, resulting in a vulnerability. (CVE-2012-2459) Gozer has since worked
+around the flaw, but for new applications you should use something
+different; don't just copy-and-paste this code without understanding the
+problem first.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+
+from .serialize import Hash
+
+
+class MerkleTree(object):
+    """A merkle tree that can be grown incrementally
+
+    Every level of the tree is kept, each as a single buffer of concatenated
+    32-byte hashes, so appending a leaf only re-hashes the O(log n) nodes on
+    the right edge of the tree, and inclusion proofs can be produced for any
+    leaf without rebuilding anything.
+
+    As in blocks, a level with an odd number of nodes pairs its last node
+    with itself.
+    """
+    __slots__ = ['_levels']
+
+    def __init__(self, leaves=()):
+        """Create a new merkle tree from an iterable of 32-byte leaf hashes"""
+        self._levels = [bytearray()]
+        self.extend(leaves)
+
+    def __len__(self):
+        """Number of leaves"""
+        return len(self._levels[0]) // 32
+
+    def append(self, leaf):
+        """Append a leaf hash"""
+        self.extend((leaf,))
+
+    def extend(self, leaves):
+        """Append leaf hashes
+
+        The affected part of every level is re-hashed in one pass.
+        """
+        first = len(self)
+        leaves = b''.join(leaves)
+        if len(leaves) % 32:
+            raise ValueError('Merkle tree leaves must be 32 bytes')
+        if not leaves:
+            return
+        self._levels[0] += leaves
+
+        sha256 = hashlib.sha256
+        l = 0
+        while len(self._levels[l]) > 32:
+            if l + 1 == len(self._levels):
+                self._levels.append(bytearray())
+            level = self._levels[l]
+            n = len(level) // 32
+
+            # Only the parents of nodes from first onwards change
+            start = first // 2 * 2
+            parents = bytearray()
+            view = memoryview(level)
+            try:
+                for i in range(start, n - 1, 2):
+                    parents += sha256(sha256(view[i*32:i*32+64]).digest()).digest()
+            finally:
+                view.release()
+            if n % 2:
+                parents += Hash(level[-32:] * 2)
+
+            parent_level = self._levels[l + 1]
+            del parent_level[start // 2 * 32:]
+            parent_level += parents
+
+            first = start // 2
+            l += 1
+
+    @property
+    def root(self):
+        """The merkle root"""
+        if not len(self):
+            raise ValueError('Merkle tree is empty')
+        return bytes(self._levels[-1])
+
+    def leaf(self, index):
+        """Return the leaf hash at index"""
+        if not 0 <= index < len(self):
+            raise IndexError('Merkle tree leaf index out of range')
+        return bytes(self._levels[0][index*32:index*32+32])
+
+    def branch(self, index):
+        """Return the merkle branch proving the inclusion of the leaf at index
+
+        The branch is the list of sibling hashes from the leaves up to, but
+        not including, the root; together with index it is the inclusion
+        proof checked by verify_merkle_branch().
+        """
+        if not 0 <= index < len(self):
+            raise IndexError('Merkle tree leaf index out of range')
+        branch = []
+        for level in self._levels[:-1]:
+            sibling = min(index ^ 1, len(level) // 32 - 1)
+            branch.append(bytes(level[sibling*32:sibling*32+32]))
+            index >>= 1
+        return branch
+
+    def levels(self):
+        """Return the tree as a list of levels, each a list of hashes
+
+        The leaves come first and the root last.
+        """
+        return [[bytes(level[i:i+32]) for i in range(0, len(level), 32)]
+                for level in self._levels]
+
+    def flatten(self):
+        """Return all hashes in deepest first order, as in CBlock.vMerkleTree
+
+        The last element is the merkle root. Empty if there are no leaves.
+        """
+        if not len(self):
+            return []
+        return [h for level in self.levels() for h in level]
+
+
+def merkle_root_from_branch(leaf, branch, index):
+    """Calculate the merkle root implied by a leaf, its branch and index"""
+    h = leaf
+    for sibling in branch:
+        if index & 1:
+            h = Hash(sibling + h)
+        else:
+            h = Hash(h + sibling)
+        index >>= 1
+    return h
+
+def verify_merkle_branch(leaf, branch, index, root):
+    """Check a merkle inclusion proof against a known root"""
+    return merkle_root_from_branch(leaf, branch, index) == root
+
+
+__all__ = (
+        'MerkleTree',
+        'merkle_root_from_branch',
+        'verify_merkle_branch',
+)
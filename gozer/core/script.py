@@ -28,6 +28,7 @@ if sys.version > '3':
 else:
     from cStringIO import StringIO as _BytesIO
 
+import hashlib
 import struct
 
 import gozer.core
@@ -549,7 +550,7 @@ class CScript(bytes):
         raise NotImplementedError
 
     def __new__(cls, value=b''):
-        if isinstance(value, bytes) or isinstance(value, bytearray):
+        if isinstance(value, (bytes, bytearray, memoryview)):
             return super(CScript, cls).__new__(cls, value)
         else:
             def coerce_iterable(iterable):
@@ -559,62 +560,90 @@ class CScript(bytes):
             # returns a bytes instance even when subclassed.
             return super(CScript, cls).__new__(cls, b''.join(coerce_iterable(value)))
 
-    def raw_iter(self):
-        """Raw iteration
+    def __reduce__(self):
+        # Pickle as plain bytes, without the cached parse
+        return (self.__class__, (bytes(self),))
 
-        Yields tuples of (opcode, data, sop_idx) so that the different possible
-        PUSHDATA encodings can be accurately distinguished, as well as
-        determining the exact opcode byte indexes. (sop_idx)
+    def _parse(self):
+        """Parse the script into ops, once
+
+        Returns (ops, err): ops is a tuple of (opcode, data, sop_idx) for every
+        op up to the first invalid one, and err is None if the whole script
+        parsed, or else (exception class, args) for the CScriptInvalidError to
+        raise at that point. The result is cached on the instance, CScript
+        being immutable.
         """
+        try:
+            return self._cached_parse
+        except AttributeError:
+            pass
+
+        ops = []
+        err = None
+        n = len(self)
         i = 0
-        while i < len(self):
+        while i < n:
             sop_idx = i
             opcode = _bord(self[i])
             i += 1
 
             if opcode > OP_PUSHDATA4:
-                yield (opcode, None, sop_idx)
+                ops.append((opcode, None, sop_idx))
+                continue
+
+            if opcode < OP_PUSHDATA1:
+                datasize = opcode
+
+            elif opcode == OP_PUSHDATA1:
+                if i >= n:
+                    err = (CScriptInvalidError, ('PUSHDATA1: missing data length',))
+                    break
+                datasize = _bord(self[i])
+                i += 1
+
+            elif opcode == OP_PUSHDATA2:
+                if i + 1 >= n:
+                    err = (CScriptInvalidError, ('PUSHDATA2: missing data length',))
+                    break
+                datasize = _bord(self[i]) + (_bord(self[i+1]) << 8)
+                i += 2
+
             else:
-                datasize = None
-                pushdata_type = None
+                if i + 3 >= n:
+                    err = (CScriptInvalidError, ('PUSHDATA4: missing data length',))
+                    break
+                datasize = _bord(self[i]) + (_bord(self[i+1]) << 8) + (_bord(self[i+2]) << 16) + (_bord(self[i+3]) << 24)
+                i += 4
+
+            data = bytes(self[i:i+datasize])
+
+            # Check for truncation
+            if len(data) < datasize:
                 if opcode < OP_PUSHDATA1:
                     pushdata_type = 'PUSHDATA(%d)' % opcode
-                    datasize = opcode
-
-                elif opcode == OP_PUSHDATA1:
-                    pushdata_type = 'PUSHDATA1'
-                    if i >= len(self):
-                        raise CScriptInvalidError('PUSHDATA1: missing data length')
-                    datasize = _bord(self[i])
-                    i += 1
-
-                elif opcode == OP_PUSHDATA2:
-                    pushdata_type = 'PUSHDATA2'
-                    if i + 1 >= len(self):
-                        raise CScriptInvalidError('PUSHDATA2: missing data length')
-                    datasize = _bord(self[i]) + (_bord(self[i+1]) << 8)
-                    i += 2
-
-                elif opcode == OP_PUSHDATA4:
-                    pushdata_type = 'PUSHDATA4'
-                    if i + 3 >= len(self):
-                        raise CScriptInvalidError('PUSHDATA4: missing data length')
-                    datasize = _bord(self[i]) + (_bord(self[i+1]) << 8) + (_bord(self[i+2]) << 16) + (_bord(self[i+3]) << 24)
-                    i += 4
-
                 else:
-                    assert False # shouldn't happen
-
+                    pushdata_type = OPCODE_NAMES[opcode][3:]
+                err = (CScriptTruncatedPushDataError, ('%s: truncated data' % pushdata_type, data))
+                break
 
-                data = bytes(self[i:i+datasize])
+            i += datasize
+            ops.append((opcode, data, sop_idx))
 
-                # Check for truncation
-                if len(data) < datasize:
-                    raise CScriptTruncatedPushDataError('%s: truncated data' % pushdata_type, data)
+        self._cached_parse = (tuple(ops), err)
+        return self._cached_parse
 
-                i += datasize
+    def raw_iter(self):
+        """Raw iteration
 
-                yield (opcode, data, sop_idx)
+        Yields tuples of (opcode, data, sop_idx) so that the different possible
+        PUSHDATA encodings can be accurately distinguished, as well as
+        determining the exact opcode byte indexes. (sop_idx)
+        """
+        (ops, err) = self._parse()
+        for op in ops:
+            yield op
+        if err is not None:
+            raise err[0](*err[1])
 
     def __iter__(self):
         """'Cooked' iteration
@@ -625,7 +654,8 @@ class CScript(bytes):
         See raw_iter() if you need to distinguish the different possible
         PUSHDATA encodings.
         """
-        for (opcode, data, sop_idx) in self.raw_iter():
+        (ops, err) = self._parse()
+        for (opcode, data, sop_idx) in ops:
             if opcode == 0:
                 yield 0
             elif data is not None:
@@ -637,6 +667,8 @@ class CScript(bytes):
                     yield opcode.decode_op_n()
                 else:
                     yield CScriptOp(opcode)
+        if err is not None:
+            raise err[0](*err[1])
 
     def __repr__(self):
         # For Python3 compatibility add b before strings so testcases don't
@@ -710,14 +742,13 @@ class CScript(bytes):
         Scripts that contain invalid pushdata ops return False, matching the
         behavior in Gozer Core.
         """
-        try:
-            for (op, op_data, idx) in self.raw_iter():
-                # Note how OP_RESERVED is considered a pushdata op.
-                if op > OP_16:
-                    return False
-
-        except CScriptInvalidError:
+        (ops, err) = self._parse()
+        if err is not None:
             return False
+        for (op, op_data, idx) in ops:
+            # Note how OP_RESERVED is considered a pushdata op.
+            if op > OP_16:
+                return False
         return True
 
     def has_canonical_pushes(self):
@@ -725,29 +756,28 @@ class CScript(bytes):
 
         Not yet consensus critical; may be in the future.
         """
-        try:
-            for (op, data, idx) in self.raw_iter():
-                if op > OP_16:
-                    continue
-
-                elif op < OP_PUSHDATA1 and op > OP_0 and len(data) == 1 and _bord(data[0]) <= 16:
-                    # Could have used an OP_n code, rather than a 1-byte push.
-                    return False
+        (ops, err) = self._parse()
+        if err is not None: # Invalid pushdata
+            return False
+        for (op, data, idx) in ops:
+            if op > OP_16:
+                continue
 
-                elif op == OP_PUSHDATA1 and len(data) < OP_PUSHDATA1:
-                    # Could have used a normal n-byte push, rather than OP_PUSHDATA1.
-                    return False
+            elif op < OP_PUSHDATA1 and op > OP_0 and len(data) == 1 and _bord(data[0]) <= 16:
+                # Could have used an OP_n code, rather than a 1-byte push.
+                return False
 
-                elif op == OP_PUSHDATA2 and len(data) <= 0xFF:
-                    # Could have used a OP_PUSHDATA1.
-                    return False
+            elif op == OP_PUSHDATA1 and len(data) < OP_PUSHDATA1:
+                # Could have used a normal n-byte push, rather than OP_PUSHDATA1.
+                return False
 
-                elif op == OP_PUSHDATA4 and len(data) <= 0xFFFF:
-                    # Could have used a OP_PUSHDATA2.
-                    return False
+            elif op == OP_PUSHDATA2 and len(data) <= 0xFF:
+                # Could have used a OP_PUSHDATA1.
+                return False
 
-        except CScriptInvalidError: # Invalid pushdata
-            return False
+            elif op == OP_PUSHDATA4 and len(data) <= 0xFFFF:
+                # Could have used a OP_PUSHDATA2.
+                return False
         return True
 
     def is_unspendable(self):
@@ -790,19 +820,163 @@ class CScript(bytes):
 
         Note that this is consensus-critical.
         """
+        (ops, err) = self._parse()
         n = 0
         lastOpcode = OP_INVALIDOPCODE
-        for (opcode, data, sop_idx) in self.raw_iter():
-            if opcode in (OP_CHECKSIG, OP_CHECKSIGVERIFY):
+        for (opcode, data, sop_idx) in ops:
+            if opcode == OP_CHECKSIG or opcode == OP_CHECKSIGVERIFY:
                 n += 1
-            elif opcode in (OP_CHECKMULTISIG, OP_CHECKMULTISIGVERIFY):
+            elif opcode == OP_CHECKMULTISIG or opcode == OP_CHECKMULTISIGVERIFY:
                 if fAccurate and (OP_1 <= lastOpcode <= OP_16):
                     n += opcode.decode_op_n()
                 else:
                     n += 20
             lastOpcode = opcode
+        if err is not None:
+            raise err[0](*err[1])
         return n
 
+class ScriptType(object):
+    """Standard script templates, as returned by classify_script()
+
+    The values are the names Satoshi's codebase uses for them.
+    """
+    NONSTANDARD = 'nonstandard'
+    PUBKEY = 'pubkey'
+    PUBKEYHASH = 'pubkeyhash'
+    SCRIPTHASH = 'scripthash'
+    MULTISIG = 'multisig'
+    NULLDATA = 'nulldata'
+    WITNESS_V0_KEYHASH = 'witness_v0_keyhash'
+    WITNESS_V0_SCRIPTHASH = 'witness_v0_scripthash'
+    WITNESS_UNKNOWN = 'witness_unknown'
+
+# Valid pubkey sizes, by the pubkey's first byte
+_PUBKEY_SIZES = {0x02: 33, 0x03: 33, 0x04: 65, 0x06: 65, 0x07: 65}
+
+_NONSTANDARD = (ScriptType.NONSTANDARD, None)
+
+def _is_pubkey_push(script, i, n):
+    # Is there a direct push of a valid-sized pubkey at script[i:]?
+    size = _bord(script[i])
+    return ((size == 33 or size == 65) and i + 1 + size <= n and
+            _PUBKEY_SIZES.get(_bord(script[i+1])) == size)
+
+def _is_push_only(script, i):
+    # Does script[i:] parse, and only push data? Byte-level equivalent of
+    # CScript(script[i:]).is_push_only()
+    n = len(script)
+    while i < n:
+        opcode = _bord(script[i])
+        i += 1
+        if opcode > OP_PUSHDATA4:
+            if opcode > OP_16:
+                return False
+            continue
+        if opcode < OP_PUSHDATA1:
+            size = opcode
+        elif opcode == OP_PUSHDATA1:
+            if i + 1 > n:
+                return False
+            size = _bord(script[i])
+            i += 1
+        elif opcode == OP_PUSHDATA2:
+            if i + 2 > n:
+                return False
+            size = _bord(script[i]) + (_bord(script[i+1]) << 8)
+            i += 2
+        else:
+            if i + 4 > n:
+                return False
+            size = (_bord(script[i]) + (_bord(script[i+1]) << 8) +
+                    (_bord(script[i+2]) << 16) + (_bord(script[i+3]) << 24))
+            i += 4
+        i += size
+        if i > n:
+            return False
+    return True
+
+def classify_script(script):
+    """Classify a scriptPubKey by standard template
+
+    Returns (type, payload), type being a ScriptType value:
+
+        PUBKEY                - the pubkey
+        PUBKEYHASH            - the 20-byte pubkey hash
+        SCRIPTHASH            - the 20-byte script hash
+        MULTISIG              - (required, [pubkeys])
+        NULLDATA              - the script following the OP_RETURN
+        WITNESS_V0_KEYHASH    - the 20-byte witness program
+        WITNESS_V0_SCRIPTHASH - the 32-byte witness program
+        WITNESS_UNKNOWN       - (version, program)
+        NONSTANDARD           - None
+
+    The templates match those of Solver() in Satoshi's codebase, except that
+    pubkeys must be pushed directly, as all standard software does, rather
+    than with a non-canonical PUSHDATA. Matching is done on the raw bytes,
+    without parsing the script.
+    """
+    n = len(script)
+
+    if n == 25:
+        if script[0:3] == b'\x76\xa9\x14' and script[23:25] == b'\x88\xac':
+            return (ScriptType.PUBKEYHASH, script[3:23])
+
+    elif n == 23:
+        if script[0:2] == b'\xa9\x14' and _bord(script[22]) == OP_EQUAL:
+            return (ScriptType.SCRIPTHASH, script[2:22])
+
+    if n == 0:
+        return _NONSTANDARD
+    first = _bord(script[0])
+
+    # Witness programs
+    if 4 <= n <= 42 and _bord(script[1]) + 2 == n:
+        if first == OP_0:
+            if n == 22:
+                return (ScriptType.WITNESS_V0_KEYHASH, script[2:])
+            elif n == 34:
+                return (ScriptType.WITNESS_V0_SCRIPTHASH, script[2:])
+            return _NONSTANDARD
+        elif OP_1 <= first <= OP_16:
+            return (ScriptType.WITNESS_UNKNOWN, (first - (OP_1 - 1), script[2:]))
+
+    if first == OP_RETURN:
+        if _is_push_only(script, 1):
+            return (ScriptType.NULLDATA, script[1:])
+        return _NONSTANDARD
+
+    last = _bord(script[n-1])
+
+    if last == OP_CHECKSIG:
+        if (n == 35 or n == 67) and first + 2 == n and _is_pubkey_push(script, 0, n - 1):
+            return (ScriptType.PUBKEY, script[1:n-1])
+
+    elif last == OP_CHECKMULTISIG:
+        if n < 3 or not OP_1 <= first <= OP_16:
+            return _NONSTANDARD
+        pubkeys = []
+        i = 1
+        while i < n - 2 and _is_pubkey_push(script, i, n - 2):
+            size = _bord(script[i])
+            pubkeys.append(script[i+1:i+1+size])
+            i += 1 + size
+        required = first - (OP_1 - 1)
+        if i == n - 2 and OP_1 <= _bord(script[i]) <= OP_16:
+            keys = _bord(script[i]) - (OP_1 - 1)
+            if len(pubkeys) == keys and required <= keys:
+                return (ScriptType.MULTISIG, (required, pubkeys))
+
+    return _NONSTANDARD
+
+def classify_scripts(scripts):
+    """Classify a sequence of scriptPubKeys
+
+    Returns a list of (type, payload), see classify_script().
+    """
+    return [classify_script(script) for script in scripts]
+
+
 class CScriptWitness(ImmutableSerializable):
     """An encoding of the data elements on the initial stack for (segregated
         witness)
@@ -830,6 +1004,15 @@ class CScriptWitness(ImmutableSerializable):
         stack = tuple(BytesSerializer.stream_deserialize(f) for i in range(n))
         return cls(stack)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        n, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        stack = []
+        for i in range(n):
+            item, offset = BytesSerializer.buffer_deserialize(buf, offset)
+            stack.append(item)
+        return cls(tuple(stack)), offset
+
     def stream_serialize(self, f):
         VarIntSerializer.stream_serialize(len(self.stack), f)
         for s in self.stack:
@@ -843,20 +1026,35 @@ SIGHASH_ANYONECANPAY = 0x80
 
 def FindAndDelete(script, sig):
     """Consensus critical, see FindAndDelete() in Satoshi codebase"""
-    r = b''
-    last_sop_idx = sop_idx = 0
-    skip = True
-    for (opcode, data, sop_idx) in script.raw_iter():
-        if not skip:
-            r += script[last_sop_idx:sop_idx]
-        last_sop_idx = sop_idx
-        if script[sop_idx:sop_idx + len(sig)] == sig:
-            skip = True
-        else:
-            skip = False
-    if not skip:
-        r += script[last_sop_idx:]
-    return CScript(r)
+    return FindAndDeleteMany(script, (sig,))
+
+def FindAndDeleteMany(script, sigs):
+    """Delete every op starting with any of sigs, in a single pass
+
+    For sigs that are single ops, such as CScript([sig]), the result is the
+    same as calling FindAndDelete() once per sig, as deleting whole ops leaves
+    the other op boundaries unchanged.
+    """
+    (ops, err) = script._parse()
+    if err is not None:
+        raise err[0](*err[1])
+
+    # Usually none of them can be found anywhere in the script
+    sigs = [sig for sig in sigs if script.find(sig) != -1]
+    if not sigs:
+        return script
+
+    r = []
+    keep_idx = 0
+    for i in range(len(ops)):
+        sop_idx = ops[i][2]
+        for sig in sigs:
+            if script.startswith(sig, sop_idx):
+                r.append(script[keep_idx:sop_idx])
+                keep_idx = ops[i+1][2] if i + 1 < len(ops) else len(script)
+                break
+    r.append(script[keep_idx:])
+    return CScript(b''.join(r))
 
 def IsLowDERSignature(sig):
     """
@@ -910,12 +1108,111 @@ def CompareBigEndian(c1, c2):
     return 0
 
 
-def RawSignatureHash(script, txTo, inIdx, hashtype):
+SIGVERSION_BASE = 0
+SIGVERSION_WITNESS_V0 = 1
+
+class PrecomputedTransactionData(object):
+    """Signature hash data shared by all inputs of a transaction
+
+    Corresponds to PrecomputedTransactionData in Satoshi's codebase: the
+    BIP143 hashPrevouts, hashSequence and hashOutputs are computed once, rather
+    than for every input signed or verified. The serialized inputs and outputs
+    are kept as well, so legacy signature hashes can be computed without
+    re-serializing the transaction for every input.
+
+    Pass an instance as the txdata argument of SignatureHash() or
+    RawSignatureHash(). Immutable transactions get one computed and cached
+    automatically, see PrecomputedTransactionData.from_tx(). The data is only
+    valid as long as the transaction isn't modified.
+    """
+    __slots__ = ['_version', '_prevouts', '_sequences', '_vin_count', '_blank_vin',
+                 '_outputs', '_vout', '_locktime',
+                 '_cached_blank_vin_no_sequence',
+                 '_cached_hashPrevouts', '_cached_hashSequence', '_cached_hashOutputs']
+
+    def __init__(self, txTo):
+        n = len(txTo.vin)
+        self._version = struct.pack(b"<i", txTo.nVersion)
+        self._prevouts = gozer.core.COutPoint.serialize_array([txin.prevout for txin in txTo.vin])
+        self._sequences = struct.pack("<%dI" % n, *[txin.nSequence for txin in txTo.vin])
+        self._vin_count = VarIntSerializer.serialize(n)
+
+        # Every input with an empty scriptSig, as the legacy signature hash
+        # serializes all inputs other than the one being signed; each takes
+        # exactly _BLANK_TXIN_SIZE bytes.
+        self._blank_vin = b''.join(self._prevouts[i*36:i*36+36] + b'\x00' + self._sequences[i*4:i*4+4]
+                                   for i in range(n))
+
+        self._outputs = [txout.serialize() for txout in txTo.vout]
+        self._vout = VarIntSerializer.serialize(len(self._outputs)) + b''.join(self._outputs)
+        self._locktime = struct.pack(b"<I", txTo.nLockTime)
+
+    @classmethod
+    def from_tx(cls, txTo):
+        """Return the precomputed data for txTo
+
+        Cached on immutable transactions; computed afresh for mutable ones.
+        """
+        try:
+            return txTo._cached_txdata
+        except AttributeError:
+            txdata = cls(txTo)
+            if not isinstance(txTo, gozer.core.CMutableTransaction):
+                object.__setattr__(txTo, '_cached_txdata', txdata)
+            return txdata
+
+    @property
+    def hashPrevouts(self):
+        try:
+            return self._cached_hashPrevouts
+        except AttributeError:
+            self._cached_hashPrevouts = gozer.core.Hash(self._prevouts)
+            return self._cached_hashPrevouts
+
+    @property
+    def hashSequence(self):
+        try:
+            return self._cached_hashSequence
+        except AttributeError:
+            self._cached_hashSequence = gozer.core.Hash(self._sequences)
+            return self._cached_hashSequence
+
+    @property
+    def hashOutputs(self):
+        try:
+            return self._cached_hashOutputs
+        except AttributeError:
+            self._cached_hashOutputs = gozer.core.Hash(b''.join(self._outputs))
+            return self._cached_hashOutputs
+
+    def _get_blank_vin_no_sequence(self):
+        # As _blank_vin, but with every nSequence zeroed, for SIGHASH_NONE and
+        # SIGHASH_SINGLE.
+        try:
+            return self._cached_blank_vin_no_sequence
+        except AttributeError:
+            n = len(self._prevouts) // 36
+            self._cached_blank_vin_no_sequence = \
+                    b''.join(self._prevouts[i*36:i*36+36] + b'\x00\x00\x00\x00\x00' for i in range(n))
+            return self._cached_blank_vin_no_sequence
+
+_BLANK_TXIN_SIZE = 36 + 1 + 4
+
+# Serialized CTxOut(), which SIGHASH_SINGLE puts in place of the outputs
+# before the one signed.
+_NULL_TXOUT = b'\xff\xff\xff\xff\xff\xff\xff\xff\x00'
+
+def RawSignatureHash(script, txTo, inIdx, hashtype, txdata=None):
     """Consensus-correct SignatureHash
 
     Returns (hash, err) to precisely match the consensus-critical behavior of
     the SIGHASH_SINGLE bug. (inIdx is *not* checked for validity)
 
+    The modified transaction is never built; its serialization is fed to the
+    hasher piece by piece, mostly from the fragments kept in txdata, a
+    PrecomputedTransactionData for txTo. See SignatureHash() for when to pass
+    one.
+
     If you're just writing wallet software you probably want SignatureHash()
     instead.
     """
@@ -923,97 +1220,96 @@ def RawSignatureHash(script, txTo, inIdx, hashtype):
 
     if inIdx >= len(txTo.vin):
         return (HASH_ONE, "inIdx %d out of range (%d)" % (inIdx, len(txTo.vin)))
-    txtmp = gozer.core.CMutableTransaction.from_tx(txTo)
-
-    for txin in txtmp.vin:
-        txin.scriptSig = b''
-    txtmp.vin[inIdx].scriptSig = FindAndDelete(script, CScript([OP_CODESEPARATOR]))
-
-    if (hashtype & 0x1f) == SIGHASH_NONE:
-        txtmp.vout = []
 
-        for i in range(len(txtmp.vin)):
-            if i != inIdx:
-                txtmp.vin[i].nSequence = 0
+    scriptCode = BytesSerializer.serialize(FindAndDelete(script, CScript([OP_CODESEPARATOR])))
 
-    elif (hashtype & 0x1f) == SIGHASH_SINGLE:
-        outIdx = inIdx
-        if outIdx >= len(txtmp.vout):
-            return (HASH_ONE, "outIdx %d out of range (%d)" % (outIdx, len(txtmp.vout)))
+    base_type = hashtype & 0x1f
+    if base_type == SIGHASH_SINGLE and inIdx >= len(txTo.vout):
+        return (HASH_ONE, "outIdx %d out of range (%d)" % (inIdx, len(txTo.vout)))
 
-        tmp = txtmp.vout[outIdx]
-        txtmp.vout = []
-        for i in range(outIdx):
-            txtmp.vout.append(gozer.core.CTxOut())
-        txtmp.vout.append(tmp)
+    if txdata is None:
+        txdata = PrecomputedTransactionData.from_tx(txTo)
 
-        for i in range(len(txtmp.vin)):
-            if i != inIdx:
-                txtmp.vin[i].nSequence = 0
+    h = hashlib.sha256(txdata._version)
 
     if hashtype & SIGHASH_ANYONECANPAY:
-        tmp = txtmp.vin[inIdx]
-        txtmp.vin = []
-        txtmp.vin.append(tmp)
-
-    txtmp.wit = gozer.core.CTxWitness()
-    s = txtmp.serialize()
-    s += struct.pack(b"<i", hashtype)
-
-    hash = gozer.core.Hash(s)
-
-    return (hash, None)
-
-SIGVERSION_BASE = 0
-SIGVERSION_WITNESS_V0 = 1
-
-def SignatureHash(script, txTo, inIdx, hashtype, amount=None, sigversion=SIGVERSION_BASE):
+        # Only the input being signed, which keeps its nSequence
+        h.update(b'\x01')
+        h.update(txdata._prevouts[inIdx*36:inIdx*36+36])
+        h.update(scriptCode)
+        h.update(txdata._sequences[inIdx*4:inIdx*4+4])
+
+    else:
+        h.update(txdata._vin_count)
+        if base_type == SIGHASH_NONE or base_type == SIGHASH_SINGLE:
+            blank_vin = txdata._get_blank_vin_no_sequence()
+        else:
+            blank_vin = txdata._blank_vin
+        start = inIdx * _BLANK_TXIN_SIZE
+        end = start + _BLANK_TXIN_SIZE
+        h.update(blank_vin[:start])
+        h.update(txdata._prevouts[inIdx*36:inIdx*36+36])
+        h.update(scriptCode)
+        h.update(txdata._sequences[inIdx*4:inIdx*4+4])
+        h.update(blank_vin[end:])
+
+    if base_type == SIGHASH_NONE:
+        h.update(b'\x00')
+    elif base_type == SIGHASH_SINGLE:
+        h.update(VarIntSerializer.serialize(inIdx + 1))
+        h.update(_NULL_TXOUT * inIdx)
+        h.update(txdata._outputs[inIdx])
+    else:
+        h.update(txdata._vout)
+
+    h.update(txdata._locktime)
+    h.update(struct.pack(b"<i", hashtype))
+
+    return (hashlib.sha256(h.digest()).digest(), None)
+
+def SignatureHash(script, txTo, inIdx, hashtype, amount=None, sigversion=SIGVERSION_BASE, txdata=None):
     """Calculate a signature hash
 
     'Cooked' version that checks if inIdx is out of bounds - this is *not*
     consensus-correct behavior, but is what you probably want for general
     wallet use.
+
+    txdata - PrecomputedTransactionData for txTo. When signing many inputs
+             of a mutable transaction, create one and pass it to every call.
     """
 
     if sigversion == SIGVERSION_WITNESS_V0:
+        if txdata is None:
+            txdata = PrecomputedTransactionData.from_tx(txTo)
+
         hashPrevouts = b'\x00'*32
         hashSequence = b'\x00'*32
         hashOutputs  = b'\x00'*32
 
         if not (hashtype & SIGHASH_ANYONECANPAY):
-            serialize_prevouts = bytes()
-            for i in txTo.vin:
-                serialize_prevouts += i.prevout.serialize()
-            hashPrevouts = gozer.core.Hash(serialize_prevouts)
+            hashPrevouts = txdata.hashPrevouts
 
         if (not (hashtype & SIGHASH_ANYONECANPAY) and (hashtype & 0x1f) != SIGHASH_SINGLE and (hashtype & 0x1f) != SIGHASH_NONE):
-            serialize_sequence = bytes()
-            for i in txTo.vin:
-                serialize_sequence += struct.pack("<I", i.nSequence)
-            hashSequence = gozer.core.Hash(serialize_sequence)
+            hashSequence = txdata.hashSequence
 
         if ((hashtype & 0x1f) != SIGHASH_SINGLE and (hashtype & 0x1f) != SIGHASH_NONE):
-            serialize_outputs = bytes()
-            for o in txTo.vout:
-                serialize_outputs += o.serialize()
-            hashOutputs = gozer.core.Hash(serialize_outputs)
+            hashOutputs = txdata.hashOutputs
         elif ((hashtype & 0x1f) == SIGHASH_SINGLE and inIdx < len(txTo.vout)):
             serialize_outputs = txTo.vout[inIdx].serialize()
             hashOutputs = gozer.core.Hash(serialize_outputs)
 
-        f = _BytesIO()
-        f.write(struct.pack("<i", txTo.nVersion))
-        f.write(hashPrevouts)
-        f.write(hashSequence)
-        txTo.vin[inIdx].prevout.stream_serialize(f)
-        BytesSerializer.stream_serialize(script, f)
-        f.write(struct.pack("<q", amount))
-        f.write(struct.pack("<I", txTo.vin[inIdx].nSequence))
-        f.write(hashOutputs)
-        f.write(struct.pack("<i", txTo.nLockTime))
-        f.write(struct.pack("<i", hashtype))
-
-        return gozer.core.Hash(f.getvalue())
+        txin = txTo.vin[inIdx]
+        return gozer.core.Hash(b''.join((
+                struct.pack(b"<i", txTo.nVersion),
+                hashPrevouts,
+                hashSequence,
+                txin.prevout.serialize(),
+                BytesSerializer.serialize(script),
+                struct.pack(b"<q", amount),
+                struct.pack(b"<I", txin.nSequence),
+                hashOutputs,
+                struct.pack(b"<I", txTo.nLockTime),
+                struct.pack(b"<i", hashtype))))
 
     if script.is_witness_scriptpubkey():
         print("WARNING: You seem to be attempting to sign a scriptPubKey from an")
@@ -1021,7 +1317,7 @@ def SignatureHash(script, txTo, inIdx, hashtype, amount=None, sigversion=SIGVERS
         print("WARNING: thing to sign. You should pass SignatureHash the corresponding")
         print("WARNING: P2WPKH or P2WSH script instead.")
 
-    (h, err) = RawSignatureHash(script, txTo, inIdx, hashtype)
+    (h, err) = RawSignatureHash(script, txTo, inIdx, hashtype, txdata)
     if err is not None:
         raise ValueError(err)
     return h
@@ -1158,6 +1454,9 @@ __all__ = (
         'OPCODES_BY_NAME',
         'DISABLED_OPCODES',
         'CScriptInvalidError',
+        'ScriptType',
+        'classify_script',
+        'classify_scripts',
         'CScriptTruncatedPushDataError',
         'CScript',
         'CScriptWitness',
@@ -1166,10 +1465,12 @@ __all__ = (
         'SIGHASH_SINGLE',
         'SIGHASH_ANYONECANPAY',
         'FindAndDelete',
+        'FindAndDeleteMany',
         'RawSignatureHash',
         'SignatureHash',
         'IsLowDERSignature',
 
         'SIGVERSION_BASE',
         'SIGVERSION_WITNESS_V0',
+        'PrecomputedTransactionData',
 )
@@ -25,6 +25,7 @@ if sys.version > '3':
     _bord = lambda x: x
 
 import hashlib
+import time
 
 import gozer.core
 import gozer.core._bignum
@@ -35,6 +36,12 @@ import gozer.core.serialize
 # we're not exporting the whole contents of the script module.
 from gozer.core.script import *
 
+from gozer.core.sigcache import SignatureCache, _BoundedCache
+from gozer.core.scripttrace import ScriptTracer, ScriptProfiler
+
+# Timer for tracing; time.perf_counter() is Python 3.3+
+_timer = getattr(time, 'perf_counter', time.time)
+
 MAX_NUM_SIZE = 4
 MAX_STACK_ITEMS = 1000
 
@@ -62,6 +69,8 @@ SCRIPT_VERIFY_FLAGS_BY_NAME = {
     'CHECKLOCKTIMEVERIFY': SCRIPT_VERIFY_CHECKLOCKTIMEVERIFY,
 }
 
+_SCRIPT_VERIFY_NAMES_BY_FLAG = dict((flag, name) for name, flag in SCRIPT_VERIFY_FLAGS_BY_NAME.items())
+
 class EvalScriptError(gozer.core.ValidationError):
     """Base class for exceptions raised when a script fails during EvalScript()
 
@@ -131,10 +140,7 @@ def _CastToBool(s):
     return False
 
 
-def _CheckSig(sig, pubkey, script, txTo, inIdx, err_raiser):
-    key = gozer.core.key.CECKey()
-    key.set_pubkey(pubkey)
-
+def _CheckSig(sig, pubkey, script, txTo, inIdx, err_raiser, txdata=None, sigcache=None):
     if len(sig) == 0:
         return False
     hashtype = _bord(sig[-1])
@@ -148,11 +154,23 @@ def _CheckSig(sig, pubkey, script, txTo, inIdx, err_raiser):
     # imply the scriptSig being checked doesn't correspond to a valid txout -
     # that should cause other validation machinery to fail long before we ever
     # got here.
-    (h, err) = RawSignatureHash(script, txTo, inIdx, hashtype)
-    return key.verify(h, sig)
+    (h, err) = RawSignatureHash(script, txTo, inIdx, hashtype, txdata)
+
+    if sigcache is not None and sigcache.contains(h, pubkey, sig):
+        return True
+
+    # Parsed pubkeys come from the pubkey cache of gozer.core.key
+    ok = gozer.core.key.CPubKey(pubkey).verify(h, sig)
+
+    if ok and sigcache is not None:
+        sigcache.add(h, pubkey, sig)
+    return ok
 
 
-def _CheckMultiSig(opcode, script, stack, txTo, inIdx, flags, err_raiser, nOpCount):
+def _CheckMultiSig(state, opcode, script):
+    stack = state.stack
+    err_raiser = state.err_raiser
+
     i = 1
     if len(stack) < i:
         err_raiser(MissingOpArgumentsError, opcode, stack, i)
@@ -163,8 +181,8 @@ def _CheckMultiSig(opcode, script, stack, txTo, inIdx, flags, err_raiser, nOpCou
     i += 1
     ikey = i
     i += keys_count
-    nOpCount[0] += keys_count
-    if nOpCount[0] > MAX_SCRIPT_OPCODES:
+    state.nOpCount += keys_count
+    if state.nOpCount > MAX_SCRIPT_OPCODES:
         err_raiser(MaxOpCountError)
     if len(stack) < i:
         err_raiser(ArgumentsInvalidError, opcode, "not enough keys on stack")
@@ -185,9 +203,7 @@ def _CheckMultiSig(opcode, script, stack, txTo, inIdx, flags, err_raiser, nOpCou
     #
     # Of course, this can only come up in very contrived cases now that
     # scriptSig and scriptPubKey are processed separately.
-    for k in range(sigs_count):
-        sig = stack[-isig - k]
-        script = FindAndDelete(script, CScript([sig]))
+    script = FindAndDeleteMany(script, [CScript([stack[-isig - k]]) for k in range(sigs_count)])
 
     success = True
 
@@ -195,7 +211,8 @@ def _CheckMultiSig(opcode, script, stack, txTo, inIdx, flags, err_raiser, nOpCou
         sig = stack[-isig]
         pubkey = stack[-ikey]
 
-        if _CheckSig(sig, pubkey, script, txTo, inIdx, err_raiser):
+        if _CheckSig(sig, pubkey, script, state.txTo, state.inIdx, err_raiser, state.txdata,
+                     state.sigcache):
             isig += 1
             sigs_count -= 1
 
@@ -215,7 +232,7 @@ def _CheckMultiSig(opcode, script, stack, txTo, inIdx, flags, err_raiser, nOpCou
 
     # Note how Gozer Core duplicates the len(stack) check, rather than
     # letting pop() handle it; maybe that's wrong?
-    if len(stack) and SCRIPT_VERIFY_NULLDUMMY in flags:
+    if len(stack) and SCRIPT_VERIFY_NULLDUMMY in state.flags:
         if stack[-1] != b'':
             raise err_raiser(ArgumentsInvalidError, opcode, "dummy value not OP_0")
 
@@ -365,7 +382,426 @@ def _CheckExec(vfExec):
     return True
 
 
-def _EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
+class _EvalState(object):
+    """State of execution of _EvalScript()
+
+    Passed to the opcode handlers, so they don't have to be closures over the
+    interpreter loop's variables.
+    """
+    __slots__ = ['stack', 'altstack', 'vfExec', 'pbegincodehash', 'nOpCount',
+                 'scriptIn', 'txTo', 'inIdx', 'flags', 'txdata', 'sigcache',
+                 'sop', 'sop_data', 'sop_pc']
+
+    def __init__(self, stack, scriptIn, txTo, inIdx, flags, txdata, sigcache):
+        self.stack = stack
+        self.altstack = []
+        self.vfExec = []
+        self.pbegincodehash = 0
+        self.nOpCount = 0
+        self.scriptIn = scriptIn
+        self.txTo = txTo
+        self.inIdx = inIdx
+        self.flags = flags
+        self.txdata = txdata
+        self.sigcache = sigcache
+        self.sop = None
+        self.sop_data = None
+        self.sop_pc = None
+
+    def err_raiser(self, cls, *args):
+        """Raise an EvalScriptError subclass
+
+        cls   - subclass you want to raise
+
+        *args - arguments
+
+        Fills in the state of execution for you.
+        """
+        raise cls(*args,
+                sop=self.sop,
+                sop_data=self.sop_data,
+                sop_pc=self.sop_pc,
+                stack=self.stack, scriptIn=self.scriptIn, txTo=self.txTo, inIdx=self.inIdx,
+                flags=self.flags, altstack=self.altstack, vfExec=self.vfExec,
+                pbegincodehash=self.pbegincodehash, nOpCount=self.nOpCount)
+
+    def script_code(self):
+        """The script from the last OP_CODESEPARATOR onwards"""
+        if not self.pbegincodehash:
+            # Keeps the ops parsed by _EvalScript()
+            return self.scriptIn
+        return CScript(self.scriptIn[self.pbegincodehash:])
+
+    def check_args(self, n):
+        if len(self.stack) < n:
+            self.err_raiser(MissingOpArgumentsError, self.sop, self.stack, n)
+
+
+# Opcode handlers
+#
+# Each is called as handler(state, sop) for an opcode that is being executed,
+# or that is one of OP_IF to OP_ENDIF, which are always processed. The stack
+# must be modified in place.
+
+def _op_unsupported(state, sop):
+    state.err_raiser(EvalScriptError, 'unsupported opcode 0x%x' % sop)
+
+_SMALL_INTEGERS = dict((op, gozer.core._bignum.bn2vch(op - (OP_1 - 1)))
+                       for op in [OP_1NEGATE] + list(range(OP_1, OP_16 + 1)))
+
+def _op_small_integer(state, sop):
+    state.stack.append(_SMALL_INTEGERS[sop])
+
+def _op_unary(state, sop):
+    _UnaryOp(sop, state.stack, state.err_raiser)
+
+def _op_binary(state, sop):
+    _BinOp(sop, state.stack, state.err_raiser)
+
+def _op_2drop(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    stack.pop()
+    stack.pop()
+
+def _op_2dup(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    v1 = stack[-2]
+    v2 = stack[-1]
+    stack.append(v1)
+    stack.append(v2)
+
+def _op_2over(state, sop):
+    state.check_args(4)
+    stack = state.stack
+    v1 = stack[-4]
+    v2 = stack[-3]
+    stack.append(v1)
+    stack.append(v2)
+
+def _op_2rot(state, sop):
+    state.check_args(6)
+    stack = state.stack
+    v1 = stack[-6]
+    v2 = stack[-5]
+    del stack[-6]
+    del stack[-5]
+    stack.append(v1)
+    stack.append(v2)
+
+def _op_2swap(state, sop):
+    state.check_args(4)
+    stack = state.stack
+    tmp = stack[-4]
+    stack[-4] = stack[-2]
+    stack[-2] = tmp
+
+    tmp = stack[-3]
+    stack[-3] = stack[-1]
+    stack[-1] = tmp
+
+def _op_3dup(state, sop):
+    state.check_args(3)
+    stack = state.stack
+    v1 = stack[-3]
+    v2 = stack[-2]
+    v3 = stack[-1]
+    stack.append(v1)
+    stack.append(v2)
+    stack.append(v3)
+
+def _op_checkmultisig(state, sop):
+    tmpScript = state.script_code()
+    _CheckMultiSig(state, sop, tmpScript)
+
+def _op_checksig(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    vchPubKey = stack[-1]
+    vchSig = stack[-2]
+    tmpScript = state.script_code()
+
+    # Drop the signature, since there's no way for a signature to sign itself
+    #
+    # Of course, this can only come up in very contrived cases now that
+    # scriptSig and scriptPubKey are processed separately.
+    tmpScript = FindAndDelete(tmpScript, CScript([vchSig]))
+
+    ok = _CheckSig(vchSig, vchPubKey, tmpScript, state.txTo, state.inIdx,
+                   state.err_raiser, state.txdata, state.sigcache)
+    if not ok and sop == OP_CHECKSIGVERIFY:
+        state.err_raiser(VerifyOpFailedError, sop)
+
+    else:
+        stack.pop()
+        stack.pop()
+
+        if ok:
+            if sop != OP_CHECKSIGVERIFY:
+                stack.append(b"\x01")
+        else:
+            # FIXME: this is incorrect, but not caught by existing
+            # test cases
+            stack.append(b"\x00")
+
+def _op_codeseparator(state, sop):
+    state.pbegincodehash = state.sop_pc
+
+def _op_depth(state, sop):
+    stack = state.stack
+    stack.append(gozer.core._bignum.bn2vch(len(stack)))
+
+def _op_drop(state, sop):
+    state.check_args(1)
+    state.stack.pop()
+
+def _op_dup(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(stack[-1])
+
+def _op_else(state, sop):
+    vfExec = state.vfExec
+    if len(vfExec) == 0:
+        state.err_raiser(EvalScriptError, 'ELSE found without prior IF')
+    vfExec[-1] = not vfExec[-1]
+
+def _op_endif(state, sop):
+    vfExec = state.vfExec
+    if len(vfExec) == 0:
+        state.err_raiser(EvalScriptError, 'ENDIF found without prior IF')
+    vfExec.pop()
+
+def _op_equal(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    v1 = stack.pop()
+    v2 = stack.pop()
+
+    if v1 == v2:
+        stack.append(b"\x01")
+    else:
+        stack.append(b"")
+
+def _op_equalverify(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    v1 = stack[-1]
+    v2 = stack[-2]
+
+    if v1 == v2:
+        stack.pop()
+        stack.pop()
+    else:
+        state.err_raiser(VerifyOpFailedError, sop)
+
+def _op_fromaltstack(state, sop):
+    altstack = state.altstack
+    if len(altstack) < 1:
+        state.err_raiser(MissingOpArgumentsError, sop, altstack, 1)
+    state.stack.append(altstack.pop())
+
+def _op_hash160(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(gozer.core.serialize.Hash160(stack.pop()))
+
+def _op_hash256(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(gozer.core.serialize.Hash(stack.pop()))
+
+def _op_if(state, sop):
+    val = False
+
+    if _CheckExec(state.vfExec):
+        state.check_args(1)
+        vch = state.stack.pop()
+        val = _CastToBool(vch)
+        if sop == OP_NOTIF:
+            val = not val
+
+    state.vfExec.append(val)
+
+def _op_ifdup(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    vch = stack[-1]
+    if _CastToBool(vch):
+        stack.append(vch)
+
+def _op_nip(state, sop):
+    state.check_args(2)
+    del state.stack[-2]
+
+def _op_nop(state, sop):
+    pass
+
+def _op_upgradable_nop(state, sop):
+    if SCRIPT_VERIFY_DISCOURAGE_UPGRADABLE_NOPS in state.flags:
+        state.err_raiser(EvalScriptError, "%s reserved for soft-fork upgrades" % OPCODE_NAMES[sop])
+
+def _op_over(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    stack.append(stack[-2])
+
+def _op_pick(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    n = _CastToBigNum(stack.pop(), state.err_raiser)
+    if n < 0 or n >= len(stack):
+        state.err_raiser(EvalScriptError, "Argument for %s out of bounds" % OPCODE_NAMES[sop])
+    vch = stack[-n-1]
+    if sop == OP_ROLL:
+        del stack[-n-1]
+    stack.append(vch)
+
+def _op_return(state, sop):
+    state.err_raiser(EvalScriptError, "OP_RETURN called")
+
+def _op_ripemd160(state, sop):
+    state.check_args(1)
+    stack = state.stack
+
+    h = hashlib.new('ripemd160')
+    h.update(stack.pop())
+    stack.append(h.digest())
+
+def _op_rot(state, sop):
+    state.check_args(3)
+    stack = state.stack
+    tmp = stack[-3]
+    stack[-3] = stack[-2]
+    stack[-2] = tmp
+
+    tmp = stack[-2]
+    stack[-2] = stack[-1]
+    stack[-1] = tmp
+
+def _op_size(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(gozer.core._bignum.bn2vch(len(stack[-1])))
+
+def _op_sha1(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(hashlib.sha1(stack.pop()).digest())
+
+def _op_sha256(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    stack.append(hashlib.sha256(stack.pop()).digest())
+
+def _op_swap(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    tmp = stack[-2]
+    stack[-2] = stack[-1]
+    stack[-1] = tmp
+
+def _op_toaltstack(state, sop):
+    state.check_args(1)
+    state.altstack.append(state.stack.pop())
+
+def _op_tuck(state, sop):
+    state.check_args(2)
+    stack = state.stack
+    vch = stack[-1]
+    stack.insert(len(stack) - 2, vch)
+
+def _op_verify(state, sop):
+    state.check_args(1)
+    stack = state.stack
+    v = _CastToBool(stack[-1])
+    if v:
+        stack.pop()
+    else:
+        state.err_raiser(VerifyOpFailedError, sop)
+
+def _op_within(state, sop):
+    state.check_args(3)
+    stack = state.stack
+    bn3 = _CastToBigNum(stack[-1], state.err_raiser)
+    bn2 = _CastToBigNum(stack[-2], state.err_raiser)
+    bn1 = _CastToBigNum(stack[-3], state.err_raiser)
+    stack.pop()
+    stack.pop()
+    stack.pop()
+    v = (bn2 <= bn1) and (bn1 < bn3)
+    if v:
+        stack.append(b"\x01")
+    else:
+        # FIXME: this is incorrect, but not caught by existing
+        # test cases
+        stack.append(b"\x00")
+
+# Handlers for the non-push opcodes, indexed by opcode
+_OPCODE_HANDLERS = [_op_unsupported] * 256
+
+def _set_handler(handler, *opcodes):
+    for opcode in opcodes:
+        _OPCODE_HANDLERS[opcode] = handler
+
+_set_handler(_op_small_integer, *_SMALL_INTEGERS)
+_set_handler(_op_unary, *_ISA_UNOP)
+_set_handler(_op_binary, *_ISA_BINOP)
+_set_handler(_op_2drop, OP_2DROP)
+_set_handler(_op_2dup, OP_2DUP)
+_set_handler(_op_2over, OP_2OVER)
+_set_handler(_op_2rot, OP_2ROT)
+_set_handler(_op_2swap, OP_2SWAP)
+_set_handler(_op_3dup, OP_3DUP)
+_set_handler(_op_checkmultisig, OP_CHECKMULTISIG, OP_CHECKMULTISIGVERIFY)
+_set_handler(_op_checksig, OP_CHECKSIG, OP_CHECKSIGVERIFY)
+_set_handler(_op_codeseparator, OP_CODESEPARATOR)
+_set_handler(_op_depth, OP_DEPTH)
+_set_handler(_op_drop, OP_DROP)
+_set_handler(_op_dup, OP_DUP)
+_set_handler(_op_else, OP_ELSE)
+_set_handler(_op_endif, OP_ENDIF)
+_set_handler(_op_equal, OP_EQUAL)
+_set_handler(_op_equalverify, OP_EQUALVERIFY)
+_set_handler(_op_fromaltstack, OP_FROMALTSTACK)
+_set_handler(_op_hash160, OP_HASH160)
+_set_handler(_op_hash256, OP_HASH256)
+_set_handler(_op_if, OP_IF, OP_NOTIF)
+_set_handler(_op_ifdup, OP_IFDUP)
+_set_handler(_op_nip, OP_NIP)
+_set_handler(_op_nop, OP_NOP)
+_set_handler(_op_upgradable_nop, *range(OP_NOP1, OP_NOP10 + 1))
+_set_handler(_op_over, OP_OVER)
+_set_handler(_op_pick, OP_PICK, OP_ROLL)
+_set_handler(_op_return, OP_RETURN)
+_set_handler(_op_ripemd160, OP_RIPEMD160)
+_set_handler(_op_rot, OP_ROT)
+_set_handler(_op_size, OP_SIZE)
+_set_handler(_op_sha1, OP_SHA1)
+_set_handler(_op_sha256, OP_SHA256)
+_set_handler(_op_swap, OP_SWAP)
+_set_handler(_op_toaltstack, OP_TOALTSTACK)
+_set_handler(_op_tuck, OP_TUCK)
+_set_handler(_op_verify, OP_VERIFY)
+_set_handler(_op_within, OP_WITHIN)
+
+
+def _trace_ops(ops, state, tracer):
+    """Yield ops, reporting each to tracer once it has been evaluated"""
+    timer = _timer
+    tracer.begin(state.scriptIn, state.stack)
+    try:
+        for op in ops:
+            start = timer()
+            try:
+                yield op
+            finally:
+                tracer.step(op[2], op[0], state.stack, timer() - start)
+    finally:
+        tracer.end(state.scriptIn, state.stack)
+
+def _EvalScript(stack, scriptIn, txTo, inIdx, flags=(), txdata=None, sigcache=None, tracer=None):
     """Evaluate a script
 
     """
@@ -378,332 +814,53 @@ def _EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
                               inIdx=inIdx,
                               flags=flags)
 
-    altstack = []
-    vfExec = []
-    pbegincodehash = 0
-    nOpCount = [0]
-    for (sop, sop_data, sop_pc) in scriptIn.raw_iter():
-        fExec = _CheckExec(vfExec)
-
-        def err_raiser(cls, *args):
-            """Helper function for raising EvalScriptError exceptions
-
-            cls   - subclass you want to raise
-
-            *args - arguments
-
-            Fills in the state of execution for you.
-            """
-            raise cls(*args,
-                    sop=sop,
-                    sop_data=sop_data,
-                    sop_pc=sop_pc,
-                    stack=stack, scriptIn=scriptIn, txTo=txTo, inIdx=inIdx, flags=flags,
-                    altstack=altstack, vfExec=vfExec, pbegincodehash=pbegincodehash, nOpCount=nOpCount[0])
-
-
-        if sop in DISABLED_OPCODES:
-            err_raiser(EvalScriptError, 'opcode %s is disabled' % OPCODE_NAMES[sop])
-
-        if sop > OP_16:
-            nOpCount[0] += 1
-            if nOpCount[0] > MAX_SCRIPT_OPCODES:
-                err_raiser(MaxOpCountError)
-
-        def check_args(n):
-            if len(stack) < n:
-                err_raiser(MissingOpArgumentsError, sop, stack, n)
-
-
-        if sop <= OP_PUSHDATA4:
-            if len(sop_data) > MAX_SCRIPT_ELEMENT_SIZE:
-                err_raiser(EvalScriptError,
-                           'PUSHDATA of length %d; maximum allowed is %d' %
-                                (len(sop_data), MAX_SCRIPT_ELEMENT_SIZE))
-
-            elif fExec:
-                stack.append(sop_data)
-                continue
-
-        elif fExec or (OP_IF <= sop <= OP_ENDIF):
-
-            if sop == OP_1NEGATE or ((sop >= OP_1) and (sop <= OP_16)):
-                v = sop - (OP_1 - 1)
-                stack.append(gozer.core._bignum.bn2vch(v))
-
-            elif sop in _ISA_BINOP:
-                _BinOp(sop, stack, err_raiser)
-
-            elif sop in _ISA_UNOP:
-                _UnaryOp(sop, stack, err_raiser)
-
-            elif sop == OP_2DROP:
-                check_args(2)
-                stack.pop()
-                stack.pop()
-
-            elif sop == OP_2DUP:
-                check_args(2)
-                v1 = stack[-2]
-                v2 = stack[-1]
-                stack.append(v1)
-                stack.append(v2)
-
-            elif sop == OP_2OVER:
-                check_args(4)
-                v1 = stack[-4]
-                v2 = stack[-3]
-                stack.append(v1)
-                stack.append(v2)
-
-            elif sop == OP_2ROT:
-                check_args(6)
-                v1 = stack[-6]
-                v2 = stack[-5]
-                del stack[-6]
-                del stack[-5]
-                stack.append(v1)
-                stack.append(v2)
-
-            elif sop == OP_2SWAP:
-                check_args(4)
-                tmp = stack[-4]
-                stack[-4] = stack[-2]
-                stack[-2] = tmp
-
-                tmp = stack[-3]
-                stack[-3] = stack[-1]
-                stack[-1] = tmp
-
-            elif sop == OP_3DUP:
-                check_args(3)
-                v1 = stack[-3]
-                v2 = stack[-2]
-                v3 = stack[-1]
-                stack.append(v1)
-                stack.append(v2)
-                stack.append(v3)
-
-            elif sop == OP_CHECKMULTISIG or sop == OP_CHECKMULTISIGVERIFY:
-                tmpScript = CScript(scriptIn[pbegincodehash:])
-                _CheckMultiSig(sop, tmpScript, stack, txTo, inIdx, flags, err_raiser, nOpCount)
-
-            elif sop == OP_CHECKSIG or sop == OP_CHECKSIGVERIFY:
-                check_args(2)
-                vchPubKey = stack[-1]
-                vchSig = stack[-2]
-                tmpScript = CScript(scriptIn[pbegincodehash:])
-
-                # Drop the signature, since there's no way for a signature to sign itself
-                #
-                # Of course, this can only come up in very contrived cases now that
-                # scriptSig and scriptPubKey are processed separately.
-                tmpScript = FindAndDelete(tmpScript, CScript([vchSig]))
-
-                ok = _CheckSig(vchSig, vchPubKey, tmpScript, txTo, inIdx,
-                               err_raiser)
-                if not ok and sop == OP_CHECKSIGVERIFY:
-                    err_raiser(VerifyOpFailedError, sop)
-
-                else:
-                    stack.pop()
-                    stack.pop()
-
-                    if ok:
-                        if sop != OP_CHECKSIGVERIFY:
-                            stack.append(b"\x01")
-                    else:
-                        # FIXME: this is incorrect, but not caught by existing
-                        # test cases
-                        stack.append(b"\x00")
-
-            elif sop == OP_CODESEPARATOR:
-                pbegincodehash = sop_pc
-
-            elif sop == OP_DEPTH:
-                bn = len(stack)
-                stack.append(gozer.core._bignum.bn2vch(bn))
-
-            elif sop == OP_DROP:
-                check_args(1)
-                stack.pop()
-
-            elif sop == OP_DUP:
-                check_args(1)
-                v = stack[-1]
-                stack.append(v)
-
-            elif sop == OP_ELSE:
-                if len(vfExec) == 0:
-                    err_raiser(EvalScriptError, 'ELSE found without prior IF')
-                vfExec[-1] = not vfExec[-1]
-
-            elif sop == OP_ENDIF:
-                if len(vfExec) == 0:
-                    err_raiser(EvalScriptError, 'ENDIF found without prior IF')
-                vfExec.pop()
-
-            elif sop == OP_EQUAL:
-                check_args(2)
-                v1 = stack.pop()
-                v2 = stack.pop()
-
-                if v1 == v2:
-                    stack.append(b"\x01")
-                else:
-                    stack.append(b"")
-
-            elif sop == OP_EQUALVERIFY:
-                check_args(2)
-                v1 = stack[-1]
-                v2 = stack[-2]
-
-                if v1 == v2:
-                    stack.pop()
-                    stack.pop()
-                else:
-                    err_raiser(VerifyOpFailedError, sop)
-
-            elif sop == OP_FROMALTSTACK:
-                if len(altstack) < 1:
-                    err_raiser(MissingOpArgumentsError, sop, altstack, 1)
-                v = altstack.pop()
-                stack.append(v)
-
-            elif sop == OP_HASH160:
-                check_args(1)
-                stack.append(gozer.core.serialize.Hash160(stack.pop()))
-
-            elif sop == OP_HASH256:
-                check_args(1)
-                stack.append(gozer.core.serialize.Hash(stack.pop()))
-
-            elif sop == OP_IF or sop == OP_NOTIF:
-                val = False
-
-                if fExec:
-                    check_args(1)
-                    vch = stack.pop()
-                    val = _CastToBool(vch)
-                    if sop == OP_NOTIF:
-                        val = not val
-
-                vfExec.append(val)
-
-
-            elif sop == OP_IFDUP:
-                check_args(1)
-                vch = stack[-1]
-                if _CastToBool(vch):
-                    stack.append(vch)
-
-            elif sop == OP_NIP:
-                check_args(2)
-                del stack[-2]
-
-            elif sop == OP_NOP:
-                pass
-
-            elif sop >= OP_NOP1 and sop <= OP_NOP10:
-                if SCRIPT_VERIFY_DISCOURAGE_UPGRADABLE_NOPS in flags:
-                    err_raiser(EvalScriptError, "%s reserved for soft-fork upgrades" % OPCODE_NAMES[sop])
-                else:
-                    pass
-
-            elif sop == OP_OVER:
-                check_args(2)
-                vch = stack[-2]
-                stack.append(vch)
-
-            elif sop == OP_PICK or sop == OP_ROLL:
-                check_args(2)
-                n = _CastToBigNum(stack.pop(), err_raiser)
-                if n < 0 or n >= len(stack):
-                    err_raiser(EvalScriptError, "Argument for %s out of bounds" % OPCODE_NAMES[sop])
-                vch = stack[-n-1]
-                if sop == OP_ROLL:
-                    del stack[-n-1]
-                stack.append(vch)
-
-            elif sop == OP_RETURN:
-                err_raiser(EvalScriptError, "OP_RETURN called")
-
-            elif sop == OP_RIPEMD160:
-                check_args(1)
-
-                h = hashlib.new('ripemd160')
-                h.update(stack.pop())
-                stack.append(h.digest())
-
-            elif sop == OP_ROT:
-                check_args(3)
-                tmp = stack[-3]
-                stack[-3] = stack[-2]
-                stack[-2] = tmp
-
-                tmp = stack[-2]
-                stack[-2] = stack[-1]
-                stack[-1] = tmp
-
-            elif sop == OP_SIZE:
-                check_args(1)
-                bn = len(stack[-1])
-                stack.append(gozer.core._bignum.bn2vch(bn))
-
-            elif sop == OP_SHA1:
-                check_args(1)
-                stack.append(hashlib.sha1(stack.pop()).digest())
-
-            elif sop == OP_SHA256:
-                check_args(1)
-                stack.append(hashlib.sha256(stack.pop()).digest())
-
-            elif sop == OP_SWAP:
-                check_args(2)
-                tmp = stack[-2]
-                stack[-2] = stack[-1]
-                stack[-1] = tmp
-
-            elif sop == OP_TOALTSTACK:
-                check_args(1)
-                v = stack.pop()
-                altstack.append(v)
-
-            elif sop == OP_TUCK:
-                check_args(2)
-                vch = stack[-1]
-                stack.insert(len(stack) - 2, vch)
-
-            elif sop == OP_VERIFY:
-                check_args(1)
-                v = _CastToBool(stack[-1])
-                if v:
-                    stack.pop()
-                else:
-                    raise err_raiser(VerifyOpFailedError, sop)
-
-            elif sop == OP_WITHIN:
-                check_args(3)
-                bn3 = _CastToBigNum(stack[-1], err_raiser)
-                bn2 = _CastToBigNum(stack[-2], err_raiser)
-                bn1 = _CastToBigNum(stack[-3], err_raiser)
-                stack.pop()
-                stack.pop()
-                stack.pop()
-                v = (bn2 <= bn1) and (bn1 < bn3)
-                if v:
-                    stack.append(b"\x01")
-                else:
-                    # FIXME: this is incorrect, but not caught by existing
-                    # test cases
-                    stack.append(b"\x00")
-
-            else:
-                err_raiser(EvalScriptError, 'unsupported opcode 0x%x' % sop)
-
-        # size limits
-        if len(stack) + len(altstack) > MAX_STACK_ITEMS:
-            err_raiser(EvalScriptError, 'max stack items limit reached')
+    state = _EvalState(stack, scriptIn, txTo, inIdx, flags, txdata, sigcache)
+    altstack = state.altstack
+    vfExec = state.vfExec
+    handlers = _OPCODE_HANDLERS
+    (ops, parse_err) = scriptIn._parse()
+    if tracer is not None:
+        ops = _trace_ops(ops, state, tracer)
+    try:
+        for (sop, sop_data, sop_pc) in ops:
+            state.sop = sop
+            state.sop_data = sop_data
+            state.sop_pc = sop_pc
+            fExec = not vfExec or _CheckExec(vfExec)
+
+            if sop in DISABLED_OPCODES:
+                state.err_raiser(EvalScriptError, 'opcode %s is disabled' % OPCODE_NAMES[sop])
+
+            if sop > OP_16:
+                state.nOpCount += 1
+                if state.nOpCount > MAX_SCRIPT_OPCODES:
+                    state.err_raiser(MaxOpCountError)
+
+            if sop <= OP_PUSHDATA4:
+                if len(sop_data) > MAX_SCRIPT_ELEMENT_SIZE:
+                    state.err_raiser(EvalScriptError,
+                                     'PUSHDATA of length %d; maximum allowed is %d' %
+                                         (len(sop_data), MAX_SCRIPT_ELEMENT_SIZE))
+
+                elif fExec:
+                    stack.append(sop_data)
+                    continue
+
+            elif fExec or (OP_IF <= sop <= OP_ENDIF):
+                handlers[sop](state, sop)
+
+            # size limits
+            if len(stack) + len(altstack) > MAX_STACK_ITEMS:
+                state.err_raiser(EvalScriptError, 'max stack items limit reached')
+    finally:
+        if tracer is not None:
+            # Reports the op that failed, if any
+            ops.close()
+
+    # Ops are only parsed up to the first invalid one, which is an error
+    # once everything before it has been executed.
+    if parse_err is not None:
+        raise parse_err[0](*parse_err[1])
 
     # Unterminated IF/NOTIF/ELSE block
     if len(vfExec):
@@ -715,7 +872,7 @@ def _EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
                               flags=flags)
 
 
-def EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
+def EvalScript(stack, scriptIn, txTo, inIdx, flags=(), txdata=None, sigcache=None, tracer=None):
     """Evaluate a script
 
     stack    - Initial stack
@@ -727,10 +884,18 @@ def EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
     inIdx    - txin index of the scriptSig
 
     flags    - SCRIPT_VERIFY_* flags to apply
+
+    txdata   - PrecomputedTransactionData for txTo; computed as needed if not
+               given
+
+    sigcache - SignatureCache to consult and update; no caching if None
+
+    tracer   - ScriptTracer to report every op to; no tracing if None
     """
 
     try:
-        _EvalScript(stack, scriptIn, txTo, inIdx, flags=flags)
+        _EvalScript(stack, scriptIn, txTo, inIdx, flags=flags, txdata=txdata, sigcache=sigcache,
+                    tracer=tracer)
     except CScriptInvalidError as err:
         raise EvalScriptError(repr(err),
                               stack=stack,
@@ -742,7 +907,8 @@ def EvalScript(stack, scriptIn, txTo, inIdx, flags=()):
 class VerifyScriptError(gozer.core.ValidationError):
     pass
 
-def VerifyScript(scriptSig, scriptPubKey, txTo, inIdx, flags=()):
+def VerifyScript(scriptSig, scriptPubKey, txTo, inIdx, flags=(), txdata=None, sigcache=None,
+                 tracer=None):
     """Verify a scriptSig satisfies a scriptPubKey
 
     scriptSig    - Signature
@@ -753,13 +919,29 @@ def VerifyScript(scriptSig, scriptPubKey, txTo, inIdx, flags=()):
 
     inIdx        - Index of the transaction input containing scriptSig
 
+    flags        - SCRIPT_VERIFY_* flags to apply
+
+    txdata       - PrecomputedTransactionData for txTo; when verifying every
+                   input of a mutable transaction, create one and pass it to
+                   every call
+
+    sigcache     - SignatureCache to consult and update; no caching if None
+
+    tracer       - ScriptTracer to report every op of every script evaluated
+                   to; no tracing if None
+
     Raises a ValidationError subclass if the validation fails.
     """
+    if txdata is None:
+        txdata = PrecomputedTransactionData.from_tx(txTo)
+
     stack = []
-    EvalScript(stack, scriptSig, txTo, inIdx, flags=flags)
+    EvalScript(stack, scriptSig, txTo, inIdx, flags=flags, txdata=txdata, sigcache=sigcache,
+               tracer=tracer)
     if SCRIPT_VERIFY_P2SH in flags:
         stackCopy = list(stack)
-    EvalScript(stack, scriptPubKey, txTo, inIdx, flags=flags)
+    EvalScript(stack, scriptPubKey, txTo, inIdx, flags=flags, txdata=txdata, sigcache=sigcache,
+               tracer=tracer)
     if len(stack) == 0:
         raise VerifyScriptError("scriptPubKey left an empty stack")
     if not _CastToBool(stack[-1]):
@@ -780,7 +962,8 @@ def VerifyScript(scriptSig, scriptPubKey, txTo, inIdx, flags=()):
 
         pubKey2 = CScript(stack.pop())
 
-        EvalScript(stack, pubKey2, txTo, inIdx, flags=flags)
+        EvalScript(stack, pubKey2, txTo, inIdx, flags=flags, txdata=txdata, sigcache=sigcache,
+                   tracer=tracer)
 
         if not len(stack):
             raise VerifyScriptError("P2SH inner scriptPubKey left an empty stack")
@@ -822,6 +1005,258 @@ def VerifySignature(txFrom, txTo, inIdx):
     VerifyScript(txin.scriptSig, txout.scriptPubKey, txTo, inIdx)
 
 
+
+DEFAULT_MAX_SCRIPT_CACHE_SIZE = 32 * 1024 * 1024
+
+class ScriptExecutionCache(_BoundedCache):
+    """Bounded cache of transactions whose scripts all passed validation
+
+    Corresponds to the script execution cache in Satoshi's codebase. Entries
+    are keyed by wtxid and the set of SCRIPT_VERIFY_* flags the scripts were
+    verified with, so a transaction validated under some flags, e.g. when it
+    entered the mempool, can be skipped by VerifyTransaction() when the same
+    flags are used again, e.g. when connecting the block that contains it.
+
+    As with Satoshi's codebase it's assumed the outpoints being spent always
+    refer to the same scriptPubKeys. Safe to share between threads.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SCRIPT_CACHE_SIZE):
+        super(ScriptExecutionCache, self).__init__(max_size)
+
+    def _tx_entry(self, tx, flags):
+        try:
+            names = sorted(_SCRIPT_VERIFY_NAMES_BY_FLAG[flag] for flag in flags)
+        except KeyError as err:
+            raise ValueError('Unknown script verify flag %r' % err.args[0])
+        return self._entry(tx.GetHash(), ','.join(names).encode('ascii'))
+
+    def contains(self, tx, flags, erase=False):
+        """Return True if tx is known to pass script validation under flags"""
+        return self._contains(self._tx_entry(tx, flags), erase)
+
+    def add(self, tx, flags):
+        """Record that tx passed script validation under flags"""
+        self._add(self._tx_entry(tx, flags))
+
+
+def VerifyTransaction(tx, prevouts, flags=(), sigcache=None, script_cache=None):
+    """Verify the scripts of every input of a transaction
+
+    tx           - Transaction
+
+    prevouts     - Mapping of the COutPoint spent by each input to the
+                   scriptPubKey of that txout
+
+    flags        - SCRIPT_VERIFY_* flags to apply
+
+    sigcache     - SignatureCache to consult and update; no caching if None
+
+    script_cache - ScriptExecutionCache to consult and update; no caching if
+                   None. If tx is found no scripts are evaluated at all.
+
+    Coinbase transactions have no scripts to verify. Raises a ValidationError
+    subclass if the validation of an input fails.
+    """
+    if tx.is_coinbase():
+        return
+
+    if script_cache is not None and script_cache.contains(tx, flags):
+        return
+
+    txdata = PrecomputedTransactionData.from_tx(tx)
+    for (inIdx, txin) in enumerate(tx.vin):
+        VerifyScript(txin.scriptSig, prevouts[txin.prevout], tx, inIdx, flags=flags,
+                     txdata=txdata, sigcache=sigcache)
+
+    if script_cache is not None:
+        script_cache.add(tx, flags)
+
+
+class VerifyBlockScriptsError(VerifyScriptError):
+    """An input of a block failed script verification
+
+    tx is the transaction, txIdx its position in the block and inIdx the
+    position of the input that failed.
+    """
+    def __init__(self, msg, tx, txIdx, inIdx):
+        super(VerifyBlockScriptsError, self).__init__(
+                'VerifyBlockScripts() : tx %s input %d: %s' % (gozer.core.b2lx(tx.GetTxid()), inIdx, msg))
+        self.tx = tx
+        self.txIdx = txIdx
+        self.inIdx = inIdx
+
+def _VerifyBlockScriptsBatch(batch, flag_names, sigcache=None):
+    """Executor entry point: verify a batch of inputs of a block
+
+    batch is a list of (txIdx, tx, [(inIdx, scriptPubKey), ...]), in block
+    order; tx may be serialized. Returns (txIdx, inIdx, message) for the first
+    input that fails, or None.
+    """
+    flags = set(SCRIPT_VERIFY_FLAGS_BY_NAME[name] for name in flag_names)
+    for (txIdx, tx, inputs) in batch:
+        if not isinstance(tx, gozer.core.CTransaction):
+            tx = gozer.core.CTransaction.deserialize(tx)
+        txdata = PrecomputedTransactionData.from_tx(tx)
+        for (inIdx, scriptPubKey) in inputs:
+            try:
+                VerifyScript(tx.vin[inIdx].scriptSig, CScript(scriptPubKey), tx, inIdx, flags=flags,
+                             txdata=txdata, sigcache=sigcache)
+            except gozer.core.ValidationError as err:
+                # Sent back as a message, as the exception and the state it
+                # carries don't necessarily survive pickling.
+                return (txIdx, inIdx, str(err))
+    return None
+
+def VerifyBlockScripts(block, prevouts, flags=(), workers=None, executor=None,
+                       batch_size=None, sigcache=None, script_cache=None):
+    """Verify the scripts of every input of a block
+
+    block        - CBlock
+
+    prevouts     - Mapping of COutPoint to the scriptPubKey of that txout, for
+                   the outputs spent by the block. Outputs created by the
+                   block itself are looked up in the block.
+
+    flags        - SCRIPT_VERIFY_* flags to apply
+
+    workers      - Verify on a ProcessPoolExecutor of this many processes,
+                   created for the call. With executor, the number of workers
+                   it has, which batches are sized by; defaults to the number
+                   of CPUs.
+
+    executor     - A concurrent.futures executor to verify on instead. For a
+                   ProcessPoolExecutor transactions are sent serialized.
+
+    batch_size   - Number of inputs per batch submitted to the executor;
+                   defaults to spreading the inputs over four batches per
+                   worker.
+
+    sigcache     - SignatureCache to consult and update. Can't be shared with
+                   other processes, so not used with a ProcessPoolExecutor.
+
+    script_cache - ScriptExecutionCache to consult and update; transactions
+                   found in it aren't verified again.
+
+    Inputs are checked in batches of consecutive inputs, each transaction's
+    signature hash data computed once per batch. If any input fails
+    VerifyBlockScriptsError is raised for the first failing input in block
+    order, the same one a serial check would report, and batches after it are
+    cancelled.
+    """
+    try:
+        flag_names = sorted(_SCRIPT_VERIFY_NAMES_BY_FLAG[flag] for flag in flags)
+    except KeyError as err:
+        raise ValueError('Unknown script verify flag %r' % err.args[0])
+
+    own_executor = None
+    if executor is None and workers is not None:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = own_executor = ProcessPoolExecutor(max_workers=workers)
+
+    try:
+        return _VerifyBlockScripts(block, prevouts, flags, flag_names, executor, workers,
+                                   batch_size, sigcache, script_cache)
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+def _VerifyBlockScripts(block, prevouts, flags, flag_names, executor, workers,
+                        batch_size, sigcache, script_cache):
+    # Transactions to verify, with the scriptPubKey spent by each input
+    txs = []
+    created = {}
+    for (txIdx, tx) in enumerate(block.vtx):
+        if not tx.is_coinbase() and not (script_cache is not None and script_cache.contains(tx, flags)):
+            spent = []
+            for txin in tx.vin:
+                try:
+                    spent.append(created[txin.prevout])
+                except KeyError:
+                    spent.append(prevouts[txin.prevout])
+            txs.append((txIdx, tx, spent))
+
+        # Later transactions may spend the outputs of this one
+        txid = tx.GetTxid()
+        for (n, txout) in enumerate(tx.vout):
+            created[gozer.core.COutPoint(txid, n)] = txout.scriptPubKey
+
+    if executor is None:
+        failure = _VerifyBlockScriptsBatch(
+                [(txIdx, tx, list(enumerate(spent))) for (txIdx, tx, spent) in txs],
+                flag_names, sigcache)
+
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        in_process = not isinstance(executor, ProcessPoolExecutor)
+
+        if batch_size is None:
+            n_inputs = sum(len(spent) for (txIdx, tx, spent) in txs)
+            if workers is None:
+                import multiprocessing
+                workers = multiprocessing.cpu_count()
+            batch_size = max(1, -(-n_inputs // (4 * workers)))
+
+        # Split into batches of consecutive inputs; a transaction whose inputs
+        # end up in more than one batch is sent with each of them.
+        batches = []
+        batch = []
+        n = 0
+        for (txIdx, tx, spent) in txs:
+            payload = tx if in_process else tx.serialize()
+            inIdx = 0
+            while inIdx < len(spent):
+                take = min(batch_size - n, len(spent) - inIdx)
+                batch.append((txIdx, payload, [(i, spent[i]) for i in range(inIdx, inIdx + take)]))
+                inIdx += take
+                n += take
+                if n == batch_size:
+                    batches.append(batch)
+                    batch = []
+                    n = 0
+        if batch:
+            batches.append(batch)
+
+        failure = _first_failure(executor, batches, flag_names, sigcache if in_process else None)
+
+    if failure is not None:
+        (txIdx, inIdx, msg) = failure
+        raise VerifyBlockScriptsError(msg, block.vtx[txIdx], txIdx, inIdx)
+
+    if script_cache is not None:
+        for (txIdx, tx, spent) in txs:
+            script_cache.add(tx, flags)
+
+def _first_failure(executor, batches, flag_names, sigcache):
+    """Run batches on executor; return the failure of the earliest failing batch"""
+    import concurrent.futures
+
+    futures = [executor.submit(_VerifyBlockScriptsBatch, batch, flag_names, sigcache)
+               for batch in batches]
+    index = dict((future, i) for (i, future) in enumerate(futures))
+    first_failed = len(futures)
+    failure = None
+    try:
+        pending = set(futures)
+        while pending:
+            (done, pending) = concurrent.futures.wait(pending,
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                r = future.result()
+                if r is not None and index[future] < first_failed:
+                    (first_failed, failure) = (index[future], r)
+
+            # Only batches before the earliest failure so far can change the
+            # outcome; the rest needn't run.
+            for future in pending:
+                if index[future] > first_failed:
+                    future.cancel()
+            pending = set(future for future in pending if index[future] < first_failed)
+    finally:
+        for future in futures:
+            future.cancel()
+    return failure
+
 __all__ = (
         'MAX_STACK_ITEMS',
         'SCRIPT_VERIFY_P2SH',
@@ -843,6 +1278,14 @@ __all__ = (
         'EvalScript',
         'VerifyScriptError',
         'VerifyScript',
+        'SignatureCache',
+        'ScriptTracer',
+        'ScriptProfiler',
         'VerifySignatureError',
         'VerifySignature',
+        'DEFAULT_MAX_SCRIPT_CACHE_SIZE',
+        'ScriptExecutionCache',
+        'VerifyTransaction',
+        'VerifyBlockScriptsError',
+        'VerifyBlockScripts',
 )
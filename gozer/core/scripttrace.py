@@ -0,0 +1,156 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Tracing and profiling of script evaluation
+
+Tracing is opt-in: pass a ScriptTracer as the tracer argument of EvalScript()
+or VerifyScript(). Without one the interpreter runs exactly as before, the
+only cost being a single check per script.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import json
+import threading
+
+from gozer.core.script import OP_PUSHDATA1, CScriptOp, classify_script
+
+
+class ScriptTracer(object):
+    """Receives the steps of script evaluation
+
+    Subclass and override the methods you need; they all do nothing here.
+    """
+
+    def begin(self, scriptIn, stack):
+        """Called before the first op of scriptIn is evaluated"""
+        pass
+
+    def step(self, pc, opcode, stack, elapsed):
+        """Called after each op
+
+        pc      - Byte offset of the op in the script
+
+        opcode  - Opcode of the op, as an int
+
+        stack   - The stack after the op; this is the interpreter's own list,
+                  so copy it if you want to keep it, and don't modify it
+
+        elapsed - Time taken by the op, in seconds
+
+        Ops that are skipped, being in an unexecuted IF branch, are reported
+        too. If an op fails it is reported before the error is raised.
+        """
+        pass
+
+    def end(self, scriptIn, stack):
+        """Called once evaluation of scriptIn stops, whether or not it failed"""
+        pass
+
+
+def _opcode_name(opcode):
+    if 0 < opcode < OP_PUSHDATA1:
+        return 'PUSHDATA(%d)' % opcode
+    return str(CScriptOp(opcode))
+
+
+class ScriptProfiler(ScriptTracer):
+    """Per-opcode counts and times, aggregated over many evaluations
+
+    Stats are grouped by the type of the script evaluated, as returned by
+    classify_script(), so it's possible to tell e.g. the cost of OP_CHECKSIG
+    in pubkeyhash scripts from that in multisig ones.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.clear()
+
+    def clear(self):
+        """Forget all stats"""
+        with self._lock:
+            # script type -> number of evaluations
+            self._evaluations = {}
+            # (script type, opcode) -> [count, seconds]
+            self._ops = {}
+
+    def begin(self, scriptIn, stack):
+        (script_type, payload) = classify_script(scriptIn)
+        self._local.script_type = script_type
+        with self._lock:
+            self._evaluations[script_type] = self._evaluations.get(script_type, 0) + 1
+
+    def step(self, pc, opcode, stack, elapsed):
+        key = (self._local.script_type, opcode)
+        with self._lock:
+            try:
+                stats = self._ops[key]
+            except KeyError:
+                stats = self._ops[key] = [0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def to_dict(self):
+        """Return the stats as a dict
+
+        opcodes has the count and total seconds of each opcode over all
+        scripts, and scripts the same for each script type along with the
+        number of evaluations.
+        """
+        with self._lock:
+            evaluations = dict(self._evaluations)
+            ops = [(key, list(stats)) for key, stats in self._ops.items()]
+
+        r = {'evaluations': sum(evaluations.values()),
+             'opcodes': {},
+             'scripts': dict((script_type, {'evaluations': n, 'opcodes': {}})
+                             for script_type, n in evaluations.items())}
+        for (script_type, opcode), (count, seconds) in ops:
+            name = _opcode_name(opcode)
+            for totals in (r['opcodes'], r['scripts'][script_type]['opcodes']):
+                total = totals.setdefault(name, {'count': 0, 'seconds': 0.0})
+                total['count'] += count
+                total['seconds'] += seconds
+        return r
+
+    def to_json(self, **kwargs):
+        """Return the stats of to_dict() as JSON
+
+        Keyword arguments are passed to json.dumps()
+        """
+        return json.dumps(self.to_dict(), sort_keys=True, **kwargs)
+
+    def to_folded(self):
+        """Return the stats in folded-stack format, as read by flamegraph.pl
+
+        One line per script type and opcode, in the form
+        'EvalScript;<script type>;<opcode> <microseconds>'.
+        """
+        with self._lock:
+            ops = [(script_type, _opcode_name(opcode), stats[1])
+                   for (script_type, opcode), stats in self._ops.items()]
+        return ''.join('EvalScript;%s;%s %d\n' % (script_type, name, round(seconds * 1e6))
+                       for script_type, name, seconds in sorted(ops))
+
+    def __repr__(self):
+        with self._lock:
+            return '%s(<%i evaluations, %i ops>)' % \
+                    (self.__class__.__name__, sum(self._evaluations.values()),
+                     sum(stats[0] for stats in self._ops.values()))
+
+
+__all__ = (
+        'ScriptTracer',
+        'ScriptProfiler',
+)
@@ -81,6 +81,66 @@ def ser_read(f, n):
         raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (n, len(r)))
     return r
 
+def ser_read_buffer(buf, offset, n):
+    """Read from a buffer safely, without copying
+
+    Buffer counterpart to ser_read(). buf should be a memoryview; a view of the
+    n bytes at offset is returned along with the new offset as (view,
+    offset). Raises SerializationError and SerializationTruncationError
+    appropriately.
+    """
+    if n > MAX_SIZE:
+        raise SerializationError('Asked to read 0x%x bytes; MAX_SIZE exceeded' % n)
+    end = offset + n
+    if end > len(buf):
+        raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (n, max(len(buf) - offset, 0)))
+    return buf[offset:end], end
+
+def ser_unpack_from(fmt, buf, offset):
+    """Unpack a fixed-size struct from a buffer safely
+
+    Buffer counterpart to struct.unpack(fmt, ser_read(f, n)). fmt is either a
+    format string or a precompiled struct.Struct. Returns (values, offset),
+    where offset is the position just past the struct.
+    """
+    if not isinstance(fmt, struct.Struct):
+        fmt = struct.Struct(fmt)
+    n = fmt.size
+    if offset + n > len(buf):
+        raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (n, max(len(buf) - offset, 0)))
+    return fmt.unpack_from(buf, offset), offset + n
+
+def ser_unpack_array(fmt, buf, offset=0, count=None):
+    """Unpack an array of fixed-size structs from a buffer
+
+    fmt is a precompiled struct.Struct. If count is None the whole rest of the
+    buffer is unpacked, and must be a whole number of structs. Returns
+    (list_of_values, offset).
+    """
+    n = fmt.size
+    avail = len(buf) - offset
+    if count is None:
+        if avail % n:
+            raise SerializationTruncationError('Buffer of %i bytes is not a whole number of %i byte records' % (avail, n))
+        count = avail // n
+    end = offset + count * n
+    if end > len(buf):
+        raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (count * n, max(avail, 0)))
+    if hasattr(fmt, 'iter_unpack'):
+        return list(fmt.iter_unpack(memoryview(buf)[offset:end])), end
+    return [fmt.unpack_from(buf, i) for i in range(offset, end, n)], end
+
+def ser_pack_array(fmt, values):
+    """Pack a sequence of value tuples into a contiguous array of structs
+
+    Inverse of ser_unpack_array(); fmt is a precompiled struct.Struct.
+    """
+    n = fmt.size
+    buf = bytearray(len(values) * n)
+    for i, v in enumerate(values):
+        fmt.pack_into(buf, i * n, *v)
+    return bytes(buf)
+
 
 class Serializable(object):
     """Base class for serializable objects"""
@@ -96,6 +156,19 @@ class Serializable(object):
         """Deserialize from a stream"""
         raise NotImplementedError
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0, **kwargs):
+        """Deserialize from a buffer, starting at offset
+
+        Returns (obj, offset), where offset is the position just past the
+        deserialized object. Subclasses on hot paths override this to read
+        fields directly out of the buffer; the default falls back to
+        stream_deserialize().
+        """
+        f = _BytesIO(buf[offset:])
+        r = cls.stream_deserialize(f, **kwargs)
+        return r, offset + f.tell()
+
     def serialize(self, params={}):
         """Serialize, returning bytes"""
         f = _BytesIO()
@@ -103,14 +176,27 @@ class Serializable(object):
         return f.getvalue()
 
     @classmethod
-    def deserialize(cls, buf, allow_padding=False, params={}):
+    def deserialize(cls, buf, allow_padding=False, params={}, zerocopy=False):
         """Deserialize bytes, returning an instance
 
         allow_padding - Allow buf to include extra padding. (default False)
 
+        zerocopy      - Deserialize with buffer_deserialize() from a
+                        memoryview of buf, rather than with
+                        stream_deserialize() from a copy of it. The result is
+                        the same either way. (default False)
+
         If allow_padding is False and not all bytes are consumed during
         deserialization DeserializationExtraDataError will be raised.
         """
+        if zerocopy:
+            buf = memoryview(buf)
+            r, offset = cls.buffer_deserialize(buf, 0, **params)
+            if not allow_padding and offset != len(buf):
+                raise DeserializationExtraDataError('Not all bytes consumed during deserialization',
+                                                    r, bytes(buf[offset:]))
+            return r
+
         fd = _BytesIO(buf)
         r = cls.stream_deserialize(fd, **params)
         if not allow_padding:
@@ -147,6 +233,17 @@ class ImmutableSerializable(Serializable):
     def __delattr__(self, name):
         raise AttributeError('Object is immutable')
 
+    def __setstate__(self, state):
+        # Unpickling has to bypass __setattr__. Values of hash() differ
+        # between processes, so a cached one is not restored.
+        if isinstance(state, tuple):
+            state, slotstate = state
+            if slotstate:
+                state = dict(state or {}, **slotstate)
+        for name, value in (state or {}).items():
+            if name != '_cached__hash__':
+                object.__setattr__(self, name, value)
+
     def GetHash(self):
         """Return the hash of the serialized object"""
         try:
@@ -177,6 +274,12 @@ class Serializer(object):
     def stream_deserialize(cls, f):
         raise NotImplementedError
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        f = _BytesIO(buf[offset:])
+        r = cls.stream_deserialize(f)
+        return r, offset + f.tell()
+
     @classmethod
     def serialize(cls, obj):
         f = _BytesIO()
@@ -192,6 +295,18 @@ class Serializer(object):
 
 class VarIntSerializer(Serializer):
     """Serialization of variable length ints"""
+    @classmethod
+    def serialized_size(cls, i):
+        """Return the number of bytes the canonical encoding of i takes"""
+        if i < 0xfd:
+            return 1
+        elif i <= 0xffff:
+            return 3
+        elif i <= 0xffffffff:
+            return 5
+        else:
+            return 9
+
     @classmethod
     def stream_serialize(cls, i, f):
         if i < 0:
@@ -220,6 +335,19 @@ class VarIntSerializer(Serializer):
         else:
             return struct.unpack(b'<Q', ser_read(f, 8))[0]
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        (r,), offset = ser_unpack_from(b'B', buf, offset)
+        if r < 0xfd:
+            return r, offset
+        elif r == 0xfd:
+            (r,), offset = ser_unpack_from(b'<H', buf, offset)
+        elif r == 0xfe:
+            (r,), offset = ser_unpack_from(b'<I', buf, offset)
+        else:
+            (r,), offset = ser_unpack_from(b'<Q', buf, offset)
+        return r, offset
+
 
 class BytesSerializer(Serializer):
     """Serialization of bytes instances"""
@@ -233,6 +361,12 @@ class BytesSerializer(Serializer):
         l = VarIntSerializer.stream_deserialize(f)
         return ser_read(f, l)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        l, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        r, offset = ser_read_buffer(buf, offset, l)
+        return bytes(r), offset
+
 
 class VectorSerializer(Serializer):
     """Base class for serializers of object vectors"""
@@ -255,6 +389,15 @@ class VectorSerializer(Serializer):
             r.append(inner_cls.stream_deserialize(f, **inner_params))
         return r
 
+    @classmethod
+    def buffer_deserialize(cls, inner_cls, buf, offset=0, inner_params={}):
+        n, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        r = []
+        for i in range(n):
+            obj, offset = inner_cls.buffer_deserialize(buf, offset, **inner_params)
+            r.append(obj)
+        return r, offset
+
 
 class uint256VectorSerializer(Serializer):
     """Serialize vectors of uint256"""
@@ -273,6 +416,15 @@ class uint256VectorSerializer(Serializer):
             r.append(ser_read(f, 32))
         return r
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        n, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        r = []
+        for i in range(n):
+            uint, offset = ser_read_buffer(buf, offset, 32)
+            r.append(bytes(uint))
+        return r, offset
+
 
 class intVectorSerializer(Serializer):
 
@@ -291,6 +443,16 @@ class intVectorSerializer(Serializer):
             ints.append(struct.unpack(b"<i", ser_read(f, 4))[0])
         return ints
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        l, offset = VarIntSerializer.buffer_deserialize(buf, offset)
+        # Checked before the format string is built, as l comes straight from
+        # the buffer and could be anything up to 2**64-1
+        if offset + l * 4 > len(buf):
+            raise SerializationTruncationError('Asked to read %i bytes, but only got %i' % (l * 4, max(len(buf) - offset, 0)))
+        ints, offset = ser_unpack_from(str('<%di' % l), buf, offset)
+        return list(ints), offset
+
 
 class VarStringSerializer(Serializer):
     """Serialize variable length strings"""
@@ -305,6 +467,10 @@ class VarStringSerializer(Serializer):
         l = VarIntSerializer.stream_deserialize(f)
         return ser_read(f, l)
 
+    @classmethod
+    def buffer_deserialize(cls, buf, offset=0):
+        return BytesSerializer.buffer_deserialize(buf, offset)
+
 
 def uint256_from_str(s):
     """Convert bytes to uint256"""
@@ -364,6 +530,10 @@ __all__ = (
         'SerializationTruncationError',
         'DeserializationExtraDataError',
         'ser_read',
+        'ser_read_buffer',
+        'ser_unpack_from',
+        'ser_unpack_array',
+        'ser_pack_array',
         'Serializable',
         'ImmutableSerializable',
         'Serializer',
@@ -0,0 +1,128 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Caching of signature verification results
+
+Corresponds to CSignatureCache in Satoshi's codebase. Only signatures that
+were found to be valid are cached, so a cache can only ever skip work, never
+change the outcome of a check.
+
+Caching is opt-in: pass a SignatureCache as the sigcache argument of
+VerifyScript() or EvalScript(). The whole-transaction ScriptExecutionCache is
+found in gozer.core.scripteval, as it depends on the script verify flags.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import collections
+import hashlib
+import os
+import struct
+import threading
+
+# Approximate memory taken by one cache entry: a 32-byte bytes key plus its
+# slot in the OrderedDict.
+_ENTRY_SIZE = 170
+
+DEFAULT_MAX_SIG_CACHE_SIZE = 32 * 1024 * 1024
+
+
+class _BoundedCache(object):
+    """Bounded, thread-safe set of salted hashes
+
+    Base class for the caches of validation results. Entries are evicted least
+    recently used first once max_size bytes, an estimate of the memory used,
+    would be exceeded.
+
+    Entries are salted hashes of what they stand for, so they're of fixed size
+    and can't be chosen by anyone else.
+
+    hits and misses count the lookups made with contains().
+    """
+
+    def __init__(self, max_size):
+        self.max_entries = max(1, max_size // _ENTRY_SIZE)
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._salt = hashlib.sha256(os.urandom(32))
+
+    def _entry(self, *parts):
+        # Parts are length-prefixed, so e.g. a pubkey and signature can't be
+        # split differently to match the entry of another pair.
+        h = self._salt.copy()
+        for part in parts:
+            h.update(struct.pack(b"<I", len(part)))
+            h.update(part)
+        return h.digest()
+
+    def _contains(self, entry, erase):
+        with self._lock:
+            if entry in self._entries:
+                self.hits += 1
+                # Removed, and unless erasing re-added as the most recently
+                # used; OrderedDict.move_to_end() is Python 3 only
+                del self._entries[entry]
+                if not erase:
+                    self._entries[entry] = None
+                return True
+            self.misses += 1
+            return False
+
+    def _add(self, entry):
+        with self._lock:
+            self._entries.pop(entry, None)
+            self._entries[entry] = None
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return '%s(<%i/%i entries, %i hits, %i misses>)' % \
+                (self.__class__.__name__, len(self), self.max_entries, self.hits, self.misses)
+
+
+class SignatureCache(_BoundedCache):
+    """Bounded cache of valid (sighash, pubkey, signature) triples
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIG_CACHE_SIZE):
+        super(SignatureCache, self).__init__(max_size)
+
+    def contains(self, sighash, pubkey, sig, erase=False):
+        """Return True if the signature is known to be valid
+
+        With erase the entry is removed if found, as done when validating a
+        block, whose signatures are unlikely to be seen again.
+        """
+        return self._contains(self._entry(sighash, pubkey, sig), erase)
+
+    def add(self, sighash, pubkey, sig):
+        """Record a valid signature"""
+        self._add(self._entry(sighash, pubkey, sig))
+
+
+__all__ = (
+        'DEFAULT_MAX_SIG_CACHE_SIZE',
+        'SignatureCache',
+)
@@ -0,0 +1,224 @@
+# Copyright (C) 2012-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+"""Compact storage for long chains of block headers
+
+A HeaderArray keeps headers in their 80-byte serialized form, back to back,
+rather than as one CBlockHeader object each. If NumPy is installed the
+per-field operations are vectorized and return NumPy arrays; otherwise they
+fall back to plain Python and return lists.
+"""
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+
+try:
+    import numpy as _np
+except ImportError:
+    _np = None
+
+from gozer.core import CBlockHeader, _struct_header
+from gozer.core.serialize import (SerializationTruncationError, uint256_from_compact,
+                                  uint256_to_str, ser_unpack_array)
+
+HEADER_SIZE = 80
+
+if _np is not None:
+    HEADER_DTYPE = _np.dtype([('nVersion', '<i4'),
+                              ('hashPrevBlock', 'u1', (32,)),
+                              ('hashMerkleRoot', 'u1', (32,)),
+                              ('nTime', '<u4'),
+                              ('nBits', '<u4'),
+                              ('nNonce', '<u4')])
+    assert HEADER_DTYPE.itemsize == HEADER_SIZE
+else:
+    HEADER_DTYPE = None
+
+_FIELDS = ('nVersion', 'hashPrevBlock', 'hashMerkleRoot', 'nTime', 'nBits', 'nNonce')
+
+
+class HeaderArray(object):
+    """An array of block headers stored in serialized form
+
+    Indexing returns a CBlockHeader, which is only materialized at that point;
+    slicing returns a new HeaderArray. Block hashes are computed in batches by
+    hashes() and kept for later calls.
+    """
+    __slots__ = ['_data', '_hashes']
+
+    def __init__(self, headers=()):
+        """Create a new header array from an iterable of CBlockHeaders"""
+        self._data = bytearray()
+        self._hashes = bytearray()
+        self.extend(headers)
+
+    @classmethod
+    def from_buffer(cls, buf):
+        """Load headers from a buffer of concatenated 80-byte headers"""
+        if len(buf) % HEADER_SIZE:
+            raise SerializationTruncationError('Buffer of %i bytes is not a whole number of headers' % len(buf))
+        self = cls()
+        self._data = bytearray(buf)
+        return self
+
+    def __len__(self):
+        return len(self._data) // HEADER_SIZE
+
+    def _index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('HeaderArray index out of range')
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise ValueError('HeaderArray slices must be contiguous')
+            r = HeaderArray.from_buffer(self._data[start*HEADER_SIZE:max(start, stop)*HEADER_SIZE])
+            r._hashes = self._hashes[start*32:max(start, stop)*32]
+            return r
+        i = self._index(i)
+        return CBlockHeader.buffer_deserialize(self._data, i * HEADER_SIZE)[0]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def append(self, header):
+        """Append a CBlockHeader"""
+        self._data += header.serialize()
+
+    def extend(self, headers):
+        """Append CBlockHeaders from an iterable"""
+        for header in headers:
+            self.append(header)
+
+    def extend_from_buffer(self, buf):
+        """Append headers from a buffer of concatenated 80-byte headers"""
+        if len(buf) % HEADER_SIZE:
+            raise SerializationTruncationError('Buffer of %i bytes is not a whole number of headers' % len(buf))
+        self._data += buf
+
+    def truncate(self, n):
+        """Drop all but the first n headers, e.g. to unwind a reorg"""
+        del self._data[n*HEADER_SIZE:]
+        del self._hashes[n*32:]
+
+    def tobytes(self):
+        """Return the headers as concatenated 80-byte serializations"""
+        return bytes(self._data)
+
+    def GetHash(self, i):
+        """Return the hash of the i'th header"""
+        i = self._index(i)
+        if i * 32 < len(self._hashes):
+            return bytes(self._hashes[i*32:i*32+32])
+        start = i * HEADER_SIZE
+        return hashlib.sha256(hashlib.sha256(self._data[start:start+HEADER_SIZE]).digest()).digest()
+
+    def hashes(self):
+        """Return the hashes of all headers
+
+        Hashes not already known are computed in one pass over the buffer.
+        Returns an (N, 32) uint8 array if NumPy is available, otherwise a list
+        of bytes.
+        """
+        sha256 = hashlib.sha256
+        data = memoryview(self._data)
+        try:
+            hashes = [sha256(sha256(data[i:i+HEADER_SIZE]).digest()).digest()
+                      for i in range(len(self._hashes) // 32 * HEADER_SIZE, len(data), HEADER_SIZE)]
+        finally:
+            data.release()
+        self._hashes += b''.join(hashes)
+
+        if _np is not None:
+            return _np.frombuffer(self._hashes, dtype=_np.uint8).reshape(-1, 32).copy()
+        return [bytes(self._hashes[i:i+32]) for i in range(0, len(self._hashes), 32)]
+
+    def to_numpy(self):
+        """Return a copy of the headers as a NumPy array of HEADER_DTYPE"""
+        if _np is None:
+            raise ImportError('NumPy is not available')
+        return _np.frombuffer(self._data, dtype=HEADER_DTYPE).copy()
+
+    def column(self, name):
+        """Return one header field for all headers
+
+        name is a CBlockHeader attribute name. Returns a NumPy array if NumPy
+        is available, the hash fields as (N, 32) uint8 arrays; otherwise a
+        list.
+        """
+        if name not in _FIELDS:
+            raise KeyError(name)
+        if _np is not None:
+            return _np.frombuffer(self._data, dtype=HEADER_DTYPE)[name].copy()
+        i = _FIELDS.index(name)
+        return [v[i] for v in ser_unpack_array(_struct_header, self._data)[0]]
+
+    def difficulties(self):
+        """Return the difficulty of every header
+
+        Vectorized equivalent of CBlockHeader.calc_difficulty(). A zero
+        mantissa gives inf rather than raising.
+        """
+        nBits = self.column('nBits')
+        if _np is None:
+            return [_calc_difficulty(b) for b in nBits]
+
+        nShift = (nBits >> 24).astype(_np.int64)
+        nMantissa = (nBits & 0x00ffffff).astype(_np.float64)
+        with _np.errstate(divide='ignore'):
+            return 65535.0 / nMantissa * _np.power(256.0, 29 - nShift)
+
+    def targets(self):
+        """Return the target of every header, expanded from nBits
+
+        Targets are 256-bit little-endian, in the same byte order as hashes,
+        and truncated to 256 bits. Returns an (N, 32) uint8 array if NumPy is
+        available, otherwise a list of bytes.
+        """
+        nBits = self.column('nBits')
+        if _np is None:
+            return [uint256_to_str(uint256_from_compact(b)) for b in nBits]
+
+        nSize = (nBits >> 24).astype(_np.int64)
+        nMantissa = nBits & 0x00ffffff
+        targets = _np.zeros((len(nBits), 32), dtype=_np.uint8)
+        rows = _np.arange(len(nBits))
+        # Byte k of the mantissa lands at byte nSize-3+k of the target; bytes
+        # that would land below zero are shifted out.
+        for k in range(3):
+            pos = nSize - 3 + k
+            ok = (pos >= 0) & (pos < 32)
+            targets[rows[ok], pos[ok]] = (nMantissa[ok] >> (8 * k)) & 0xff
+        return targets
+
+    def __repr__(self):
+        return 'HeaderArray(<%i headers>)' % len(self)
+
+
+def _calc_difficulty(nBits):
+    try:
+        return CBlockHeader.calc_difficulty(nBits)
+    except ZeroDivisionError:
+        return float('inf')
+
+
+__all__ = (
+        'HEADER_SIZE',
+        'HEADER_DTYPE',
+        'HeaderArray',
+)
@@ -445,7 +445,7 @@ class Proxy(BaseProxy):
         except InvalidAddressOrKeyError as ex:
             raise IndexError('%s.getblock(): %s (%d)' %
                     (self.__class__.__name__, ex.error['message'], ex.error['code']))
-        return CBlock.deserialize(unhexlify(r))
+        return CBlock.deserialize(unhexlify(r), zerocopy=True)
 
     def getblockcount(self):
         """Return the number of blocks in the longest block chain"""
@@ -35,6 +35,34 @@ def VerifyMessage(address, message, sig):
     return str(P2PKHGozerAddress.from_pubkey(pubkey)) == str(address)
 
 
+def VerifyMessages(items, workers=None, executor=None, batch_size=None):
+    """Verify many signed messages
+
+    items - Iterable of (address, message, sig), as taken by VerifyMessage()
+
+    workers, executor and batch_size are as for CPubKey.recover_compact_many(),
+    which does the bulk of the work.
+
+    Returns a list with the result of every item, in order. Signatures that
+    can't be decoded are invalid, rather than raising an exception.
+    """
+    items = list(items)
+
+    sigs = []
+    for (address, message, sig) in items:
+        try:
+            sig = base64.b64decode(sig)
+        except (TypeError, ValueError):
+            sig = b''
+        sigs.append((message.GetHash(), sig))
+
+    pubkeys = CPubKey.recover_compact_many(sigs, workers=workers, executor=executor,
+                                           batch_size=batch_size)
+
+    return [pubkey is not False and str(P2PKHGozerAddress.from_pubkey(pubkey)) == str(address)
+            for ((address, message, sig), pubkey) in zip(items, pubkeys)]
+
+
 def SignMessage(key, message):
     sig, i = key.sign_compact(message.GetHash())
 
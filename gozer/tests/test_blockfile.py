@@ -0,0 +1,116 @@
+# Copyright (C) 2013-2014 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import gozer
+from gozer.blockfile import *
+from gozer.core import *
+from gozer.core.script import CScript
+
+def make_blocks(n):
+    blocks = []
+    prev = b'\x00'*32
+    for i in range(n):
+        coinbase = CTransaction([CTxIn(COutPoint(), CScript([i, b'coinbase']))],
+                                [CTxOut(50*COIN, CScript([b'\x02'*33, 0xac]))])
+        spend = CTransaction([CTxIn(COutPoint(coinbase.GetTxid(), 0), CScript([b'\x01'*71]))],
+                             [CTxOut(i, CScript([i]))], nLockTime=i)
+        blk = CBlock(hashPrevBlock=prev, nTime=i, vtx=[coinbase, spend])
+        blk = CBlock(hashPrevBlock=prev, hashMerkleRoot=blk.calc_merkle_root(), nTime=i, vtx=blk.vtx)
+        prev = blk.GetHash()
+        blocks.append(blk)
+    return blocks
+
+class Test_blockfile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.blocks = make_blocks(25)
+
+        # Two files, the first with preallocation padding and some garbage
+        # that happens to contain the magic.
+        with open(os.path.join(self.dir, 'blk00000.dat'), 'wb') as f:
+            write_block_file(f, self.blocks[:10])
+            f.write(gozer.params.MESSAGE_START + b'\xff\xff\xff\xff')
+            write_block_file(f, self.blocks[10:20])
+            f.write(b'\x00' * 1000)
+        with open(os.path.join(self.dir, 'blk00001.dat'), 'wb') as f:
+            write_block_file(f, self.blocks[20:])
+        open(os.path.join(self.dir, 'blk00002.dat'), 'wb').close()
+        open(os.path.join(self.dir, 'rev00000.dat'), 'wb').close()
+        self.paths = block_files(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_block_files(self):
+        self.assertEqual([os.path.basename(p) for p in self.paths],
+                         ['blk00000.dat', 'blk00001.dat', 'blk00002.dat'])
+
+    def test_scan(self):
+        spans = list(scan_block_file(self.paths[0]))
+        self.assertEqual(len(spans), 20)
+        self.assertEqual(spans[0], (8, len(self.blocks[0].serialize())))
+        self.assertEqual(list(scan_block_file(self.paths[0], magic=b'\xde\xad\xbe\xef')), [])
+        self.assertEqual(list(scan_block_file(self.paths[2])), [])
+
+    def test_read(self):
+        self.assertEqual(list(read_block_files(self.paths)), self.blocks)
+        self.assertEqual(list(read_block_files(self.paths, mode='raw')),
+                         [blk.serialize() for blk in self.blocks])
+
+        lazy_blocks = list(read_block_file(self.paths[1], mode='lazy'))
+        self.assertEqual(lazy_blocks, self.blocks[20:])
+        self.assertTrue(isinstance(lazy_blocks[0].vtx[0], CLazyTransaction))
+
+        with self.assertRaises(ValueError):
+            list(read_block_file(self.paths[0], mode='foo'))
+
+    def test_read_threads(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            self.skipTest('concurrent.futures not available')
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual(list(read_block_files(self.paths, executor=executor, batch_size=3)),
+                             self.blocks)
+            unordered = list(read_block_files(self.paths, mode='lazy', executor=executor,
+                                              ordered=False, batch_size=3))
+            self.assertEqual(sorted(blk.nTime for blk in unordered), list(range(25)))
+            self.assertEqual(list(read_block_files(self.paths, executor=executor, batch_size=2,
+                                                   workers=1)),
+                             self.blocks)
+
+    def test_read_processes(self):
+        try:
+            import concurrent.futures
+        except ImportError:
+            self.skipTest('concurrent.futures not available')
+
+        with concurrent.futures.ProcessPoolExecutor(2) as executor:
+            for mode in ('block', 'lazy'):
+                blocks = list(read_block_files(self.paths, mode=mode, executor=executor, batch_size=4))
+                self.assertEqual(blocks, self.blocks)
+                self.assertEqual([hash(blk) for blk in blocks], [hash(blk) for blk in self.blocks])
+
+    def test_pickle(self):
+        for blk in list(read_block_files(self.paths[1:], mode='lazy')) + self.blocks[:2]:
+            blk2 = pickle.loads(pickle.dumps(blk))
+            self.assertEqual(blk2, blk)
+            self.assertEqual(blk2.vtx[1].GetTxid(), blk.vtx[1].GetTxid())
+            self.assertIs(blk2.vtx[1].__class__, blk.vtx[1].__class__)
@@ -16,6 +16,7 @@ import unittest
 import os
 
 from gozer.core import *
+from gozer.core.script import CScript
 
 def load_test_vectors(name):
     with open(os.path.dirname(__file__) + '/data/' + name, 'r') as fd:
@@ -58,3 +59,110 @@ class Test_CheckBlock(unittest.TestCase):
                 continue
 
             self.fail('Invalid block "%s" passed checks' % comment)
+
+    def test_executor(self):
+        """Checking with an executor raises the same errors as serially"""
+        try:
+            import concurrent.futures
+        except ImportError:
+            self.skipTest('concurrent.futures not available')
+
+        def check(blk, fCheckPoW, cur_time, executor=None, workers=None):
+            try:
+                CheckBlock(blk, fCheckPoW=fCheckPoW, cur_time=cur_time, executor=executor,
+                           workers=workers)
+            except Exception as err:
+                return (err.__class__, str(err))
+
+        vectors = [v for name in ('checkblock_valid.json', 'checkblock_invalid.json')
+                     for v in load_test_vectors(name) if not v[1]]
+
+        # Errors spread over several shards
+        comment, fHeader, fCheckPoW, cur_time, blk = vectors[3]
+        vtx = list(blk.vtx)
+        self.assertEqual(len(vtx), 4)
+        vectors.append(('dup', False, False, cur_time, CBlock(vtx=vtx + vtx[1:] * 4)))
+        vectors.append(('coinbase', False, False, cur_time, CBlock(vtx=vtx * 4)))
+
+        # A later transaction in the same shard failing with something other
+        # than a validation error
+        negative = CMutableTransaction.from_tx(vtx[1])
+        negative.vout[0].nValue = -1
+        truncated = CMutableTransaction.from_tx(vtx[1])
+        truncated.vout[0].scriptPubKey = CScript(b'\x4c')
+        padding = []
+        for i in range(6):
+            tx = CMutableTransaction.from_tx(vtx[1])
+            tx.nLockTime = i + 1
+            padding.append(CTransaction.from_tx(tx))
+        vectors.append(('truncated push', False, False, cur_time,
+                        CBlock(vtx=[vtx[0], CTransaction.from_tx(negative),
+                                    CTransaction.from_tx(truncated)] + padding)))
+
+        with concurrent.futures.ThreadPoolExecutor(2) as threads, \
+             concurrent.futures.ProcessPoolExecutor(2) as processes:
+            for comment, fHeader, fCheckPoW, cur_time, blk in vectors:
+                expected = check(blk, fCheckPoW, cur_time)
+                self.assertEqual(check(blk, fCheckPoW, cur_time, threads), expected)
+                self.assertEqual(check(blk, fCheckPoW, cur_time, processes), expected)
+                for workers in (1, 3):
+                    self.assertEqual(check(blk, fCheckPoW, cur_time, threads, workers), expected)
+
+    def test_unexpected_error(self):
+        """Errors that aren't validation failures aren't reported as such"""
+        try:
+            import concurrent.futures
+        except ImportError:
+            self.skipTest('concurrent.futures not available')
+        import gozer.core
+
+        comment, fHeader, fCheckPoW, cur_time, blk = \
+                [v for v in load_test_vectors('checkblock_valid.json') if not v[1] and len(v[4].vtx) > 1][0]
+
+        def CheckTransaction(tx, params=None):
+            raise TypeError('bug')
+
+        orig_CheckTransaction = gozer.core.CheckTransaction
+        gozer.core.CheckTransaction = CheckTransaction
+        try:
+            with concurrent.futures.ThreadPoolExecutor(2) as threads:
+                for executor in (None, threads):
+                    with self.assertRaises(TypeError):
+                        CheckBlock(blk, fCheckPoW=fCheckPoW, cur_time=cur_time, executor=executor)
+        finally:
+            gozer.core.CheckTransaction = orig_CheckTransaction
+
+    def test_size(self):
+        for comment, fHeader, fCheckPoW, cur_time, blk in load_test_vectors('checkblock_valid.json'):
+            if fHeader:
+                continue
+            serialized = blk.serialize()
+            stripped = blk.serialize(dict(include_witness=False))
+            self.assertEqual(blk.size(), len(serialized))
+            self.assertEqual(blk.stripped_size(), len(stripped))
+            self.assertEqual(blk.weight(), len(stripped) * 3 + len(serialized))
+            self.assertEqual(blk.GetWeight(), blk.weight())
+            self.assertEqual(blk.vsize(), (blk.weight() + 3) // 4)
+
+    def test_zerocopy_deserialize(self):
+        for comment, fHeader, fCheckPoW, cur_time, blk in load_test_vectors('checkblock_valid.json'):
+            serialized = blk.serialize()
+            blk2 = blk.__class__.deserialize(serialized, zerocopy=True)
+            self.assertEqual(blk2, blk)
+            self.assertEqual(blk2.GetHash(), blk.GetHash())
+            self.assertEqual(blk2.serialize(), serialized)
+            if not fHeader:
+                self.assertEqual(blk2.vMerkleTree, blk.vMerkleTree)
+                self.assertEqual(blk2.vWitnessMerkleTree, blk.vWitnessMerkleTree)
+
+    def test_lazy_deserialize(self):
+        for comment, fHeader, fCheckPoW, cur_time, blk in load_test_vectors('checkblock_valid.json'):
+            if fHeader:
+                continue
+            serialized = blk.serialize()
+            for zerocopy in (False, True):
+                blk2 = CBlock.deserialize(serialized, params=dict(lazy=True), zerocopy=zerocopy)
+                self.assertTrue(all(isinstance(tx, CLazyTransaction) for tx in blk2.vtx))
+                self.assertEqual(blk2.vMerkleTree, blk.vMerkleTree)
+                self.assertEqual(blk2.serialize(), serialized)
+                CheckBlock(blk2, fCheckPoW=fCheckPoW, cur_time=cur_time)
@@ -14,6 +14,7 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 import unittest
 
 from gozer.core import *
+from gozer.core.serialize import SerializationTruncationError
 
 class Test_str_value(unittest.TestCase):
     def test(self):
@@ -71,6 +72,25 @@ class Test_CBlockHeader(unittest.TestCase):
                 nNonce=2083236893)
         self.assertEqual(genesis.GetHash(), lx('000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f'))
 
+    def test_array(self):
+        headers = [CBlockHeader(nVersion=i, hashPrevBlock=Hash(b'\x00'*i), nTime=i, nNonce=2*i)
+                   for i in range(10)]
+        serialized = CBlockHeader.serialize_array(headers)
+        self.assertEqual(serialized, b''.join(h.serialize() for h in headers))
+
+        headers2, offset = CBlockHeader.deserialize_array(serialized)
+        self.assertEqual(headers2, headers)
+        self.assertEqual(offset, 800)
+
+        headers2, offset = CBlockHeader.deserialize_array(serialized, 160, 3)
+        self.assertEqual(headers2, headers[2:5])
+        self.assertEqual(offset, 400)
+
+        with self.assertRaises(SerializationTruncationError):
+            CBlockHeader.deserialize_array(serialized[:-1])
+        with self.assertRaises(SerializationTruncationError):
+            CBlockHeader.deserialize_array(serialized, 160, 9)
+
     def test_calc_difficulty(self):
         def T(nbits, expected):
             actual = CBlockHeader.calc_difficulty(nbits)
@@ -0,0 +1,90 @@
+# Copyright (C) 2013-2014 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+import gozer.headers
+from gozer.core import CBlockHeader, lx
+from gozer.core.serialize import Hash, SerializationTruncationError, uint256_from_compact, uint256_to_str
+from gozer.headers import HeaderArray
+
+genesis = CBlockHeader(nVersion=1,
+        hashPrevBlock=lx('0000000000000000000000000000000000000000000000000000000000000000'),
+        hashMerkleRoot=lx('4a5e1e4baab89f3a32518a88c31bc87f618f76673e2cc77ab2127b7afdeda33b'),
+        nTime=1231006505,
+        nBits=486604799,
+        nNonce=2083236893)
+
+NBITS = (486604799, 486594666, 469809688, 453179945, 436527338, 426957810,
+         0x03123456, 0x02123456, 0x01123456, 0x207fffff, 0x21010000)
+
+def make_headers():
+    headers = [genesis]
+    for i, nBits in enumerate(NBITS):
+        headers.append(CBlockHeader(nVersion=i, hashPrevBlock=headers[-1].GetHash(),
+                                    hashMerkleRoot=Hash(b'\x00'*i), nTime=i, nBits=nBits, nNonce=i))
+    return headers
+
+class Test_HeaderArray(unittest.TestCase):
+    def check(self):
+        headers = make_headers()
+        serialized = b''.join(h.serialize() for h in headers)
+
+        a = HeaderArray.from_buffer(serialized)
+        self.assertEqual(len(a), len(headers))
+        self.assertEqual(list(a), headers)
+        self.assertEqual(a[-1], headers[-1])
+        self.assertEqual(a.tobytes(), serialized)
+        self.assertEqual(HeaderArray(headers).tobytes(), serialized)
+        with self.assertRaises(IndexError):
+            a[len(headers)]
+
+        self.assertEqual([bytes(bytearray(h)) for h in a.hashes()], [h.GetHash() for h in headers])
+        self.assertEqual(a.GetHash(0), lx('000000000019d6689c085ae165831e934ff763ae46a2a6c172b3f1b60a8ce26f'))
+        self.assertEqual(list(a.column('nNonce')), [h.nNonce for h in headers])
+
+        a.truncate(3)
+        self.assertEqual(list(a), headers[:3])
+        a.extend_from_buffer(serialized[240:])
+        a.append(genesis)
+        self.assertEqual(list(a), headers + [genesis])
+        self.assertEqual(len(a.hashes()), len(headers) + 1)
+        self.assertEqual(list(a[2:5]), headers[2:5])
+        self.assertEqual(a[2:5].GetHash(0), headers[2].GetHash())
+
+        with self.assertRaises(SerializationTruncationError):
+            HeaderArray.from_buffer(serialized[:-1])
+
+        a = HeaderArray(headers)
+        for h, d in zip(headers, a.difficulties()):
+            self.assertEqual(d, CBlockHeader.calc_difficulty(h.nBits))
+        for h, target in zip(headers, a.targets()):
+            self.assertEqual(bytes(bytearray(target)), uint256_to_str(uint256_from_compact(h.nBits)))
+
+    def test_fallback(self):
+        np = gozer.headers._np
+        gozer.headers._np = None
+        try:
+            self.check()
+        finally:
+            gozer.headers._np = np
+
+    @unittest.skipIf(gozer.headers._np is None, 'NumPy not available')
+    def test_numpy(self):
+        self.check()
+
+        a = HeaderArray(make_headers())
+        records = a.to_numpy()
+        self.assertEqual(records.dtype, gozer.headers.HEADER_DTYPE)
+        self.assertEqual(records.tobytes(), a.tobytes())
+        self.assertEqual(len(HeaderArray().hashes()), 0)
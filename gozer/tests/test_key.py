@@ -11,10 +11,14 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
 import unittest
 
+import gozer.core._ecdsa
 from gozer.core.key import *
 from gozer.core import x
+from gozer.core.script import IsLowDERSignature
+from gozer.wallet import CKey
 
 class Test_CPubKey(unittest.TestCase):
     def test(self):
@@ -25,7 +29,9 @@ class Test_CPubKey(unittest.TestCase):
             self.assertEqual(key.is_compressed, is_compressed)
 
         T('', False, False, False)
-        T('00', True, True, False) # why is this valid?
+        # OpenSSL accepts the point at infinity; libsecp256k1, like Satoshi's
+        # codebase, doesn't.
+        T('00', True, get_ecdsa_backend() == 'openssl', False)
         T('01', True, False, False)
         T('02', True, False, False)
 
@@ -39,3 +45,255 @@ class Test_CPubKey(unittest.TestCase):
 
         T('0478d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71a1518063243acd4dfe96b66e3f2ec8013c8e072cd09b3834a19f81f659cc3455',
           True, True, False)
+
+class Test_PubKeyCache(unittest.TestCase):
+    pubkeys = [x('0378d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71'),
+               x('0279be667ef9dcbbac55a06295ce870b07029bfcdb2dce28d959f2815b16f81798'),
+               x('02c6047f9441ed7d6d3045406e95c07cd85c778e4b8cef3ca7abac09b95c709ee5')]
+
+    def setUp(self):
+        self.default_cache = get_pubkey_cache()
+
+    def tearDown(self):
+        set_pubkey_cache(self.default_cache)
+
+    def test_lru(self):
+        cache = PubKeyCache(max_entries=2)
+        set_pubkey_cache(cache)
+
+        a = CPubKey(self.pubkeys[0])
+        b = CPubKey(self.pubkeys[1])
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 2, 2))
+
+        # Same parsed key
+        a2 = CPubKey(self.pubkeys[0])
+        self.assertIs(a2._key, a._key)
+        self.assertEqual(cache.hits, 1)
+
+        # pubkeys[1] is the least recently used
+        CPubKey(self.pubkeys[2])
+        self.assertEqual((len(cache), cache.evictions), (2, 1))
+        CPubKey(self.pubkeys[0])
+        self.assertEqual(cache.hits, 2)
+        CPubKey(self.pubkeys[1])
+        self.assertEqual(cache.misses, 4)
+
+        # Invalid pubkeys are cached too
+        self.assertFalse(CPubKey(b'\x02' + b'\xff'*32).is_fullyvalid)
+        self.assertFalse(CPubKey(b'\x02' + b'\xff'*32).is_fullyvalid)
+        self.assertEqual(cache.hits, 3)
+
+        cache.clear()
+        self.assertEqual((cache.hits, cache.misses, cache.evictions, len(cache)), (0, 0, 0, 0))
+
+    def test_disabled(self):
+        set_pubkey_cache(None)
+        a = CPubKey(self.pubkeys[0])
+        b = CPubKey(self.pubkeys[0])
+        self.assertTrue(a.is_fullyvalid)
+        self.assertIsNot(a._key, b._key)
+
+    def test_backends(self):
+        # Parsed keys of different backends are kept apart
+        cache = PubKeyCache()
+        set_pubkey_cache(cache)
+        default_backend = get_ecdsa_backend()
+        try:
+            keys = []
+            for backend in available_ecdsa_backends():
+                set_ecdsa_backend(backend)
+                keys.append(CPubKey(self.pubkeys[0])._key)
+        finally:
+            set_ecdsa_backend(default_backend)
+        self.assertEqual(len(cache), len(keys))
+
+class Test_verify_batch(unittest.TestCase):
+    def setUp(self):
+        key = CKey(hashlib.sha256(b'verify_batch').digest())
+        hashes = [hashlib.sha256(bytes(bytearray([i]))).digest() for i in range(20)]
+        self.items = [(key.pub, h, key.sign(h)) for h in hashes]
+        self.items[3] = (bytes(key.pub), self.items[3][1], self.items[3][2])
+        self.items[5] = (key.pub, self.items[5][1], self.items[6][2])
+        self.items[11] = (b'', self.items[11][1], self.items[11][2])
+        self.expected = [i not in (5, 11) for i in range(20)]
+
+    def test_serial(self):
+        self.assertEqual(verify_batch(self.items), self.expected)
+        self.assertFalse(verify_batch(self.items, all_valid=True))
+        self.assertTrue(verify_batch(self.items[0:5], all_valid=True))
+        self.assertEqual(verify_batch([]), [])
+        self.assertTrue(verify_batch([], all_valid=True))
+
+    def test_workers(self):
+        self.assertEqual(verify_batch(iter(self.items), workers=2), self.expected)
+        self.assertEqual(verify_batch(self.items, workers=3, batch_size=1), self.expected)
+        self.assertFalse(verify_batch(self.items, all_valid=True, workers=2))
+        self.assertTrue(verify_batch(self.items[6:11], all_valid=True, workers=2))
+
+    def test_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(verify_batch(self.items, executor=executor), self.expected)
+            self.assertFalse(verify_batch(self.items, all_valid=True, executor=executor))
+            self.assertEqual(verify_batch(self.items, executor=executor, workers=2), self.expected)
+
+    def test_executor_batches(self):
+        """Batches are sized by workers, not by the executor's internals"""
+        from concurrent.futures import Executor, Future
+
+        class SerialExecutor(Executor):
+            def __init__(self):
+                self.submitted = 0
+            def submit(self, fn, *args, **kwargs):
+                self.submitted += 1
+                future = Future()
+                future.set_result(fn(*args, **kwargs))
+                return future
+
+        # Four batches per worker
+        for (workers, batches) in ((1, 4), (5, 20), (10, 20)):
+            executor = SerialExecutor()
+            self.assertEqual(verify_batch(self.items, executor=executor, workers=workers), self.expected)
+            self.assertEqual(executor.submitted, batches)
+
+class Test_recover_compact_many(unittest.TestCase):
+    def setUp(self):
+        self.default_backend = get_ecdsa_backend()
+
+    def tearDown(self):
+        set_ecdsa_backend(self.default_backend)
+
+    def test(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        for backend in available_ecdsa_backends():
+            set_ecdsa_backend(backend)
+            keys = [CKey(hashlib.sha256(b'recover_compact_many').digest(), compressed=compressed)
+                    for compressed in (True, False)]
+
+            items = []
+            expected = []
+            for i in range(10):
+                key = keys[i % 2]
+                h = hashlib.sha256(bytes(bytearray([i]))).digest()
+                (sig, recid) = key.sign_compact(h)
+                items.append((h, bytes(bytearray([27 + recid + (4 if key.is_compressed else 0)])) + sig))
+                expected.append(key.pub)
+
+            # Wrong length, and a zero r
+            items[3] = (items[3][0], items[3][1][0:64])
+            expected[3] = False
+            items[6] = (items[6][0], items[6][1][0:1] + b'\x00'*32 + items[6][1][33:65])
+            expected[6] = False
+
+            self.assertEqual(CPubKey.recover_compact_many(items), expected)
+            for ((h, sig), pub) in zip(items, expected):
+                if len(sig) == 65:
+                    self.assertEqual(CPubKey.recover_compact(h, sig), pub)
+            self.assertEqual(CPubKey.recover_compact_many(iter(items), workers=2, batch_size=3), expected)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                self.assertEqual(CPubKey.recover_compact_many(items, executor=executor), expected)
+            self.assertEqual(CPubKey.recover_compact_many([]), [])
+
+class Test_ECDSABackends(unittest.TestCase):
+    def setUp(self):
+        self.default_backend = get_ecdsa_backend()
+
+    def tearDown(self):
+        set_ecdsa_backend(self.default_backend)
+
+    def test_set_ecdsa_backend(self):
+        self.assertIn(get_ecdsa_backend(), available_ecdsa_backends())
+        self.assertIn('python', available_ecdsa_backends())
+        with self.assertRaises(ValueError):
+            set_ecdsa_backend('foo')
+
+        set_ecdsa_backend('python')
+        self.assertEqual(get_ecdsa_backend(), 'python')
+        set_ecdsa_backend()
+        self.assertEqual(get_ecdsa_backend(), available_ecdsa_backends()[0])
+
+    def test_sign_verify_recover(self):
+        h = hashlib.sha256(b'Satoshi Nakamoto').digest()
+        secret = b'\x00'*31 + b'\x01'
+
+        # RFC6979 test vector
+        deterministic_sig = x('3045022100934b1ea10a4b3c1757e2b0c017d0b6143ce3c9a7e6a4a49860d7a6ab210ee3d802202442ce9d2b916064108014783e923ec36b49743e2ffa1c4496f01a512aafd9e5')
+
+        for signer in available_ecdsa_backends():
+            set_ecdsa_backend(signer)
+            key = CKey(secret)
+            sig = key.sign(h)
+            self.assertEqual(sig, deterministic_sig)
+            (compact_sig, recid) = key.sign_compact(h)
+            self.assertEqual((compact_sig, recid), (deterministic_sig[5:37] + deterministic_sig[39:71], 1))
+
+            (r, s) = gozer.core._ecdsa.parse_der_lax(sig)
+            self.assertTrue(s <= gozer.core._ecdsa.HALF_N)
+            high_s_sig = gozer.core._ecdsa.serialize_der(r, gozer.core._ecdsa.N - s)
+
+            for verifier in available_ecdsa_backends():
+                set_ecdsa_backend(verifier)
+                pub = CPubKey(key.pub)
+                self.assertTrue(pub.verify(h, sig))
+                self.assertTrue(pub.verify(h, high_s_sig))
+                self.assertFalse(pub.verify(b'\xff'*32, sig))
+                self.assertFalse(pub.verify(h, sig[0:-1]))
+                self.assertFalse(pub.verify(h, b''))
+                self.assertFalse(pub.verify(h, b'\x00'*70))
+
+                self.assertEqual(CPubKey.recover_compact(h, bytes(bytearray([31 + recid])) + compact_sig),
+                                 key.pub)
+
+    def test_sign_many(self):
+        hashes = [hashlib.sha256(str(i).encode()).digest() for i in range(20)]
+        secret = hashlib.sha256(b'sign_many').digest()
+
+        sigs = None
+        for backend in available_ecdsa_backends():
+            set_ecdsa_backend(backend)
+            key = CKey(secret)
+            self.assertEqual(key.sign_many([]), [])
+            self.assertEqual(key.sign_many(hashes), [key.sign(h) for h in hashes])
+
+            # Deterministic, and low S, so the same whatever the backend
+            if sigs is None:
+                sigs = key.sign_many(hashes)
+            self.assertEqual(key.sign_many(hashes), sigs)
+            self.assertTrue(all(IsLowDERSignature(sig) for sig in sigs))
+
+            with self.assertRaises(ValueError):
+                key.sign_many(hashes + [b'\x00'*31])
+            with self.assertRaises(TypeError):
+                key.sign_many(hashes + [None])
+
+    def test_point_mul_g(self):
+        N = gozer.core._ecdsa.N
+        for k in (0, 1, 15, 16, 17, 0xfedcba9876543210 << 190, N - 1, N, N + 1):
+            self.assertEqual(gozer.core._ecdsa.point_mul_g(k),
+                             gozer.core._ecdsa.point_mul(k % N, gozer.core._ecdsa.G))
+
+    def test_invalid_secret(self):
+        for backend in available_ecdsa_backends():
+            if backend == 'openssl':
+                continue
+            set_ecdsa_backend(backend)
+            with self.assertRaises(ValueError):
+                CKey(b'\x00'*32)
+            with self.assertRaises(ValueError):
+                CKey(b'\xff'*32)
+
+    def test_parse_der_lax(self):
+        def T(hex_sig, expected):
+            self.assertEqual(gozer.core._ecdsa.parse_der_lax(x(hex_sig)), expected)
+
+        T('3006020101020102', (1, 2))
+        T('300602010102010200', (1, 2)) # trailing garbage
+        T('3000020101020102', (1, 2)) # wrong length
+        T('30060281020001020102', (1, 2)) # long-form length of r
+        T('3006020400000001020102', (1, 2)) # padded r
+        T('30ff020101020102', None) # length of length too large
+        T('3006020101', None)
+        T('3106020101020102', None)
+        T('', None)
+        T('30250221' + '01'*33 + '020102', None) # r too large
@@ -0,0 +1,80 @@
+# Copyright (C) 2013-2014 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import unittest
+
+from gozer.core import lx
+from gozer.core.merkle import *
+from gozer.core.serialize import Hash
+
+def reference_merkle_tree(txids):
+    # The original CBlock.build_merkle_tree_from_txids()
+    merkle_tree = list(txids)
+    size = len(txids)
+    j = 0
+    while size > 1:
+        for i in range(0, size, 2):
+            i2 = min(i+1, size-1)
+            merkle_tree.append(Hash(merkle_tree[j+i] + merkle_tree[j+i2]))
+        j += size
+        size = (size + 1) // 2
+    return merkle_tree
+
+class Test_MerkleTree(unittest.TestCase):
+    def test_empty(self):
+        tree = MerkleTree()
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(tree.flatten(), [])
+        with self.assertRaises(ValueError):
+            tree.root
+        with self.assertRaises(IndexError):
+            tree.branch(0)
+
+    def test_incremental(self):
+        txids = [Hash(b'\x00'*i) for i in range(40)]
+        tree = MerkleTree()
+        for n in range(1, len(txids) + 1):
+            tree.append(txids[n-1])
+            expected = reference_merkle_tree(txids[:n])
+            self.assertEqual(tree.flatten(), expected)
+            self.assertEqual(tree.root, expected[-1])
+            self.assertEqual(MerkleTree(txids[:n]).flatten(), expected)
+
+        tree = MerkleTree(txids[:7])
+        tree.extend(txids[7:23])
+        tree.extend(txids[23:])
+        self.assertEqual(tree.flatten(), reference_merkle_tree(txids))
+
+        with self.assertRaises(ValueError):
+            tree.append(b'\x00'*31)
+
+    def test_branch(self):
+        for n in (1, 2, 3, 7, 8, 9, 33):
+            txids = [Hash(b'\x01'*i) for i in range(n)]
+            tree = MerkleTree(txids)
+            for i in range(n):
+                branch = tree.branch(i)
+                self.assertEqual(len(branch), len(tree.levels()) - 1)
+                self.assertEqual(tree.leaf(i), txids[i])
+                self.assertTrue(verify_merkle_branch(txids[i], branch, i, tree.root))
+                self.assertFalse(verify_merkle_branch(Hash(b'foo'), branch, i, tree.root))
+
+    def test_block(self):
+        # Block 100000
+        txids = [lx('8c14f0db3df150123e6f3dbbf30f8b955a8249b62ac1d1ff16284aefa3d06d87'),
+                 lx('fff2525b8931402dd09222c50775608f75787bd2b87e56995a7bdd30f79702c4'),
+                 lx('6359f0868171b1d194cbee1af2f16ea598ae8fad666d9b012c8ed2b79a236ec4'),
+                 lx('e9a66845e05d5abc0ad04ec80f774a7e585c6e8db975962d069a522137b80c1d')]
+        tree = MerkleTree(txids)
+        self.assertEqual(tree.root, lx('f3e94742aca4b5ef85488dc37c06c3282295ffec960994b2c0d5ac2a25a95766'))
+        self.assertEqual(merkle_root_from_branch(txids[2], tree.branch(2), 2), tree.root)
@@ -159,6 +159,29 @@ class Test_CScript(unittest.TestCase):
         T('4effffff')
         T('4effffffff' + 'ff'*0xfffe) # not going to test with 4GiB-1...
 
+    def test_raw_iter_cached_parse(self):
+        script = CScript(x('0102' + '76' + '4c03ab'))
+
+        # The ops before the truncated push are still yielded, and the error
+        # is raised again, with its data, every time the script is iterated.
+        for i in range(2):
+            ops = []
+            with self.assertRaises(CScriptTruncatedPushDataError) as cm:
+                for op in script.raw_iter():
+                    ops.append(op)
+            self.assertEqual(ops, [(1, b'\x02', 0), (OP_DUP, None, 2)])
+            self.assertEqual(str(cm.exception), 'PUSHDATA1: truncated data')
+            self.assertEqual(cm.exception.data, b'\xab')
+
+        # The cached parse isn't pickled
+        import pickle
+        script = CScript([1, OP_DUP])
+        list(script)
+        script2 = pickle.loads(pickle.dumps(script))
+        self.assertIs(type(script2), CScript)
+        self.assertEqual(script2, script)
+        self.assertFalse(hasattr(script2, '_cached_parse'))
+
     def test_equality(self):
         # Equality is on the serialized script, not the logical meaning.
         # This is important for P2SH.
@@ -428,6 +451,90 @@ class Test_CScript(unittest.TestCase):
         with self.assertRaises(ValueError):
             CScript([b'a' * 518]).to_p2sh_scriptPubKey()
 
+class Test_classify_script(unittest.TestCase):
+    def test_templates(self):
+        pubkey = x('0378d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71')
+        pubkey_uncompressed = x('0478d430274f8c5ec1321338151e9f27f4c676a008bdf8638d07c0b6be9ab35c71a1518063243acd4dfe96b66e3f2ec8013c8e072cd09b3834a19f81f659cc3455')
+        h20 = b'\x11'*20
+        h32 = b'\x22'*32
+
+        def T(script, expected_type, expected_payload=None):
+            script = CScript(script)
+            self.assertEqual(classify_script(script), (expected_type, expected_payload))
+
+        T([OP_DUP, OP_HASH160, h20, OP_EQUALVERIFY, OP_CHECKSIG], ScriptType.PUBKEYHASH, h20)
+        T([OP_HASH160, h20, OP_EQUAL], ScriptType.SCRIPTHASH, h20)
+        T([OP_0, h20], ScriptType.WITNESS_V0_KEYHASH, h20)
+        T([OP_0, h32], ScriptType.WITNESS_V0_SCRIPTHASH, h32)
+        T([OP_1, h32], ScriptType.WITNESS_UNKNOWN, (1, h32))
+        T([OP_16, b'\x33'*2], ScriptType.WITNESS_UNKNOWN, (16, b'\x33'*2))
+        T([pubkey, OP_CHECKSIG], ScriptType.PUBKEY, pubkey)
+        T([pubkey_uncompressed, OP_CHECKSIG], ScriptType.PUBKEY, pubkey_uncompressed)
+        T([OP_1, pubkey, pubkey_uncompressed, OP_2, OP_CHECKMULTISIG],
+          ScriptType.MULTISIG, (1, [pubkey, pubkey_uncompressed]))
+        T([OP_3] + [pubkey] * 3 + [OP_3, OP_CHECKMULTISIG], ScriptType.MULTISIG, (3, [pubkey] * 3))
+        T([OP_RETURN], ScriptType.NULLDATA, b'')
+        T([OP_RETURN, b'hello', 1], ScriptType.NULLDATA, CScript([b'hello', 1]))
+        T([OP_RETURN, b'\xac'], ScriptType.NULLDATA, CScript([b'\xac']))
+        T(x('6a4d0100114e0000000050'), ScriptType.NULLDATA, x('4d0100114e0000000050'))
+
+        # Not quite standard
+        T([], ScriptType.NONSTANDARD)
+        T([OP_DUP, OP_HASH160, h20, OP_EQUALVERIFY, OP_CHECKSIGVERIFY], ScriptType.NONSTANDARD)
+        T(x('a94c14') + h20 + x('87'), ScriptType.NONSTANDARD) # non-canonical push
+        T([OP_HASH160, h32, OP_EQUAL], ScriptType.NONSTANDARD)
+        T([OP_0, b'\x11'*21], ScriptType.NONSTANDARD) # v0 with invalid program size
+        T([OP_1, b'\x33'*41], ScriptType.NONSTANDARD) # program too long
+        T([OP_1, b'\x33'], ScriptType.NONSTANDARD) # program too short
+        T([b'\x05' + pubkey[1:], OP_CHECKSIG], ScriptType.NONSTANDARD) # invalid pubkey prefix
+        T([pubkey[:-1], OP_CHECKSIG], ScriptType.NONSTANDARD)
+        T([OP_2, pubkey, OP_1, OP_CHECKMULTISIG], ScriptType.NONSTANDARD) # m > n
+        T([OP_1, pubkey, OP_2, OP_CHECKMULTISIG], ScriptType.NONSTANDARD) # wrong n
+        T([OP_1, pubkey, OP_1, OP_1, OP_CHECKMULTISIG], ScriptType.NONSTANDARD)
+        T([OP_0, pubkey, OP_1, OP_CHECKMULTISIG], ScriptType.NONSTANDARD)
+        T([OP_1, OP_CHECKMULTISIG], ScriptType.NONSTANDARD)
+        T([OP_RETURN, OP_RETURN], ScriptType.NONSTANDARD)
+        T(x('6a4c'), ScriptType.NONSTANDARD) # truncated
+        T(x('6a4d0100'), ScriptType.NONSTANDARD)
+        T(x('6a4e01000000'), ScriptType.NONSTANDARD)
+        T(x('6a0211'), ScriptType.NONSTANDARD)
+
+    def test_classify_scripts(self):
+        scripts = [CScript([OP_0, b'\x11'*20]), CScript([OP_RETURN]), CScript([OP_NOP])]
+        self.assertEqual(classify_scripts(scripts),
+                         [classify_script(script) for script in scripts])
+        self.assertEqual(classify_scripts([]), [])
+
+class Test_FindAndDelete(unittest.TestCase):
+    def test_FindAndDelete(self):
+        def T(script, sig, expected):
+            self.assertEqual(FindAndDelete(CScript(script), CScript(sig)), CScript(expected))
+
+        T([], [b'ab'], [])
+        T([OP_1, b'ab', OP_2], [b'ab'], [OP_1, OP_2])
+        T([b'ab', b'ab', OP_2, b'ab'], [b'ab'], [OP_2])
+        T([b'abc', OP_2], [b'ab'], [b'abc', OP_2])
+        T([OP_1, OP_CODESEPARATOR, OP_2], [OP_CODESEPARATOR], [OP_1, OP_2])
+
+        # Only matches on op boundaries
+        T([b'\x02ab'], [b'ab'], [b'\x02ab'])
+
+        # Truncated scripts raise even if there's nothing to delete
+        with self.assertRaises(CScriptInvalidError):
+            FindAndDelete(CScript(x('0102' + '4c')), CScript([b'ab']))
+
+    def test_FindAndDeleteMany(self):
+        script = CScript([b'a', OP_1, b'b', b'c', OP_2, b'a', OP_CHECKMULTISIG])
+        sigs = [CScript([b'a']), CScript([b'c']), CScript([b'x'])]
+
+        expected = script
+        for sig in sigs:
+            expected = FindAndDelete(expected, sig)
+        self.assertEqual(FindAndDeleteMany(script, sigs), expected)
+        self.assertEqual(expected, CScript([OP_1, b'b', OP_2, OP_CHECKMULTISIG]))
+
+        self.assertEqual(FindAndDeleteMany(script, []), script)
+
 class Test_IsLowDERSignature(unittest.TestCase):
     def test_high_s_value(self):
         sig = x('3046022100820121109528efda8bb20ca28788639e5ba5b365e0a84f8bd85744321e7312c6022100a7c86a21446daa405306fe10d0a9906e37d1a2c6b6fdfaaf6700053058029bbe')
@@ -11,6 +11,7 @@
 
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import hashlib
 import json
 import os
 import unittest
@@ -22,6 +23,7 @@ if sys.version > '3':
 from binascii import unhexlify
 
 from gozer.core import *
+from gozer.core.key import available_ecdsa_backends, get_ecdsa_backend, set_ecdsa_backend
 from gozer.core.script import *
 from gozer.core.scripteval import *
 
@@ -113,3 +115,178 @@ class Test_EvalScript(unittest.TestCase):
                 continue
 
             self.fail('Expected %r to fail' % test_case)
+
+    def test_lax_der_backends(self):
+        """Lax DER signatures are judged the same by every ECDSA backend"""
+        default_backend = get_ecdsa_backend()
+        try:
+            for backend in available_ecdsa_backends():
+                set_ecdsa_backend(backend)
+                for name, valid in (('script_valid.json', True), ('script_invalid.json', False)):
+                    for scriptSig, scriptPubKey, flags, comment, test_case in load_test_vectors(name):
+                        if 'DER' not in comment:
+                            continue
+                        (txCredit, txSpend) = self.create_test_txs(scriptSig, scriptPubKey)
+                        try:
+                            VerifyScript(scriptSig, scriptPubKey, txSpend, 0, flags)
+                        except ValidationError:
+                            self.assertFalse(valid, '%s: %r failed' % (backend, test_case))
+                        else:
+                            self.assertTrue(valid, '%s: %r passed' % (backend, test_case))
+        finally:
+            set_ecdsa_backend(default_backend)
+
+    def test_error_state(self):
+        """Errors carry the state of execution at the failing opcode"""
+        scriptPubKey = CScript([OP_1, OP_TOALTSTACK, OP_2, OP_CODESEPARATOR, OP_3, OP_DUP, OP_EQUALVERIFY, OP_4, OP_EQUALVERIFY])
+        (txCredit, txSpend) = self.create_test_txs(CScript(), scriptPubKey)
+
+        stack = []
+        with self.assertRaises(VerifyOpFailedError) as cm:
+            EvalScript(stack, scriptPubKey, txSpend, 0)
+        err = cm.exception
+        self.assertEqual(err.sop, OP_EQUALVERIFY)
+        self.assertEqual(err.sop_pc, 8)
+        self.assertEqual(err.stack, [b'\x02', b'\x04'])
+        self.assertIs(err.stack, stack)
+        self.assertEqual(err.altstack, [b'\x01'])
+        self.assertEqual(err.vfExec, [])
+        self.assertEqual(err.pbegincodehash, 3)
+        self.assertEqual(err.nOpCount, 5)
+        self.assertIs(err.txTo, txSpend)
+        self.assertEqual(err.inIdx, 0)
+
+        with self.assertRaises(MissingOpArgumentsError) as cm:
+            EvalScript([], CScript([OP_1, OP_IF, OP_DROP, OP_DROP, OP_ENDIF]), txSpend, 0)
+        self.assertEqual(cm.exception.sop, OP_DROP)
+        self.assertEqual(cm.exception.vfExec, [True])
+
+    def test_tracer(self):
+        class Tracer(ScriptTracer):
+            def __init__(self):
+                self.calls = []
+            def begin(self, scriptIn, stack):
+                self.calls.append(('begin', scriptIn, list(stack)))
+            def step(self, pc, opcode, stack, elapsed):
+                self.calls.append(('step', pc, opcode, list(stack)))
+            def end(self, scriptIn, stack):
+                self.calls.append(('end', scriptIn, list(stack)))
+
+        scriptPubKey = CScript([OP_2, OP_EQUAL])
+        (txCredit, txSpend) = self.create_test_txs(CScript([b'\x02']), scriptPubKey)
+
+        tracer = Tracer()
+        VerifyScript(CScript([b'\x02']), scriptPubKey, txSpend, 0, tracer=tracer)
+        self.assertEqual(tracer.calls,
+                         [('begin', CScript([b'\x02']), []),
+                          ('step', 0, 1, [b'\x02']),
+                          ('end', CScript([b'\x02']), [b'\x02']),
+                          ('begin', scriptPubKey, [b'\x02']),
+                          ('step', 0, OP_2, [b'\x02', b'\x02']),
+                          ('step', 1, OP_EQUAL, [b'\x01']),
+                          ('end', scriptPubKey, [b'\x01'])])
+
+        # The failing op is reported too
+        tracer = Tracer()
+        with self.assertRaises(MissingOpArgumentsError):
+            EvalScript([], CScript([OP_1, OP_DROP, OP_DROP, OP_NOP]), txSpend, 0, tracer=tracer)
+        self.assertEqual([call[0:3] for call in tracer.calls[1:-1]],
+                         [('step', 0, OP_1), ('step', 1, OP_DROP), ('step', 2, OP_DROP)])
+        self.assertEqual(tracer.calls[-1][0], 'end')
+
+    def test_profiler(self):
+        scriptPubKey = CScript([OP_DUP, OP_HASH160, b'\x11'*20, OP_EQUALVERIFY, OP_CHECKSIG])
+        (txCredit, txSpend) = self.create_test_txs(CScript(), scriptPubKey)
+
+        profiler = ScriptProfiler()
+        for i in range(3):
+            with self.assertRaises(EvalScriptError):
+                EvalScript([b'\x01'], scriptPubKey, txSpend, 0, tracer=profiler)
+            EvalScript([], CScript([OP_1, OP_DUP]), txSpend, 0, tracer=profiler)
+
+        stats = json.loads(profiler.to_json())
+        self.assertEqual(stats['evaluations'], 6)
+        self.assertEqual(stats['scripts']['pubkeyhash']['evaluations'], 3)
+        self.assertEqual(stats['scripts']['nonstandard']['evaluations'], 3)
+        self.assertEqual(stats['opcodes']['OP_DUP']['count'], 6)
+        self.assertEqual(stats['scripts']['pubkeyhash']['opcodes']['PUSHDATA(20)']['count'], 3)
+        self.assertNotIn('OP_CHECKSIG', stats['opcodes'])
+
+        folded = profiler.to_folded().splitlines()
+        self.assertIn('EvalScript;nonstandard;OP_1', [line.split(' ')[0] for line in folded])
+        self.assertEqual(len(folded), 6)
+
+        profiler.clear()
+        self.assertEqual(profiler.to_dict(), {'evaluations': 0, 'opcodes': {}, 'scripts': {}})
+
+
+class Test_VerifyBlockScripts(unittest.TestCase):
+    def make_block(self, bad=()):
+        """Block of hash-locked spends; inputs at the (txIdx, inIdx) in bad fail"""
+        secret = b'secret'
+        scriptPubKey = CScript([OP_SHA256, hashlib.sha256(secret).digest(), OP_EQUAL])
+
+        prevouts = {}
+        vtx = [CTransaction([CTxIn(COutPoint(), CScript([b'coinbase']))],
+                            [CTxOut(0, scriptPubKey)])]
+        for txIdx in range(1, 10):
+            vin = []
+            for inIdx in range(txIdx % 4 + 1):
+                prevout = COutPoint(Hash(('%d,%d' % (txIdx, inIdx)).encode('ascii')), inIdx)
+                prevouts[prevout] = scriptPubKey
+                scriptSig = CScript([b'wrong' if (txIdx, inIdx) in bad else secret])
+                vin.append(CTxIn(prevout, scriptSig))
+            if txIdx == 5:
+                # Spends an output created earlier in the block
+                vin.append(CTxIn(COutPoint(vtx[3].GetTxid(), 0), CScript([secret])))
+            vtx.append(CTransaction(vin, [CTxOut(0, scriptPubKey)]))
+        return CBlock(vtx=vtx), prevouts
+
+    def test_valid(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        (block, prevouts) = self.make_block()
+        VerifyBlockScripts(block, prevouts)
+        VerifyBlockScripts(block, prevouts, flags={SCRIPT_VERIFY_P2SH}, workers=2)
+        with ThreadPoolExecutor(2) as executor:
+            for batch_size in (1, 3, 100):
+                VerifyBlockScripts(block, prevouts, executor=executor, batch_size=batch_size)
+            VerifyBlockScripts(block, prevouts, executor=executor, workers=5)
+
+        del prevouts[block.vtx[2].vin[0].prevout]
+        with self.assertRaises(KeyError):
+            VerifyBlockScripts(block, prevouts)
+
+    def test_first_failure(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        (block, prevouts) = self.make_block(bad={(3, 2), (8, 0), (9, 1)})
+
+        def T(**kwargs):
+            with self.assertRaises(VerifyBlockScriptsError) as cm:
+                VerifyBlockScripts(block, prevouts, **kwargs)
+            self.assertEqual((cm.exception.txIdx, cm.exception.inIdx), (3, 2))
+            self.assertIs(cm.exception.tx, block.vtx[3])
+
+        T()
+        T(workers=2, batch_size=2)
+        with ThreadPoolExecutor(3) as executor:
+            for batch_size in (1, 2, 5, 100):
+                T(executor=executor, batch_size=batch_size)
+            for workers in (1, 2, 7):
+                T(executor=executor, workers=workers)
+
+    def test_caches(self):
+        (block, prevouts) = self.make_block()
+        script_cache = ScriptExecutionCache()
+        sigcache = SignatureCache()
+        VerifyBlockScripts(block, prevouts, sigcache=sigcache, script_cache=script_cache)
+        self.assertEqual(len(script_cache), len(block.vtx) - 1)
+
+        # Everything is now skipped, even inputs whose prevouts are unknown
+        VerifyBlockScripts(block, {}, script_cache=script_cache)
+        self.assertEqual(script_cache.hits, len(block.vtx) - 1)
+
+        # ...but only for the same flags
+        with self.assertRaises(KeyError):
+            VerifyBlockScripts(block, {}, flags={SCRIPT_VERIFY_P2SH}, script_cache=script_cache)
@@ -40,6 +40,24 @@ class Test_Serializable(unittest.TestCase):
 
         FooSerializable.deserialize(b'\x00', allow_padding=True)
 
+    def test_extra_data_zerocopy(self):
+        """Serializable.deserialize(zerocopy=True) fails if extra data is present"""
+
+        class FooSerializable(Serializable):
+            @classmethod
+            def stream_deserialize(cls, f):
+                return cls()
+
+            def stream_serialize(self, f):
+                pass
+
+        with self.assertRaises(DeserializationExtraDataError) as cm:
+            FooSerializable.deserialize(b'\x00', zerocopy=True)
+        self.assertEqual(cm.exception.obj, FooSerializable())
+        self.assertEqual(cm.exception.padding, b'\x00')
+
+        FooSerializable.deserialize(b'\x00', allow_padding=True, zerocopy=True)
+
 class Test_VarIntSerializer(unittest.TestCase):
     def test(self):
         def T(value, expected):
@@ -48,6 +66,8 @@ class Test_VarIntSerializer(unittest.TestCase):
             self.assertEqual(actual, expected)
             roundtrip = VarIntSerializer.deserialize(actual)
             self.assertEqual(value, roundtrip)
+            roundtrip = VarIntSerializer.buffer_deserialize(memoryview(actual))
+            self.assertEqual((value, len(actual)), roundtrip)
         T(0x0, b'00')
         T(0xfc, b'fc')
         T(0xfd, b'fdfd00')
@@ -74,6 +94,8 @@ class Test_VarIntSerializer(unittest.TestCase):
             serialized = unhexlify(serialized)
             with self.assertRaises(SerializationTruncationError):
                 VarIntSerializer.deserialize(serialized)
+            with self.assertRaises(SerializationTruncationError):
+                VarIntSerializer.buffer_deserialize(memoryview(serialized))
         T(b'')
         T(b'fd')
         T(b'fd00')
@@ -93,6 +115,8 @@ class Test_BytesSerializer(unittest.TestCase):
             self.assertEqual(actual, expected)
             roundtrip = BytesSerializer.deserialize(actual)
             self.assertEqual(value, roundtrip)
+            roundtrip = BytesSerializer.buffer_deserialize(memoryview(actual))
+            self.assertEqual((value, len(actual)), roundtrip)
         T(b'', b'00')
         T(b'00', b'0100')
         T(b'00'*0xffff, b'fdffff' + b'00'*0xffff)
@@ -102,11 +126,37 @@ class Test_BytesSerializer(unittest.TestCase):
             serialized = unhexlify(serialized)
             with self.assertRaises(ex_cls):
                 BytesSerializer.deserialize(serialized)
+            with self.assertRaises(ex_cls):
+                BytesSerializer.buffer_deserialize(memoryview(serialized))
         T(b'')
         T(b'01')
         T(b'0200')
         T(b'ff00000000000000ff11223344', SerializationError) # > max_size
 
+class Test_intVectorSerializer(unittest.TestCase):
+    def test(self):
+        def T(value, expected):
+            expected = unhexlify(expected)
+            actual = intVectorSerializer.serialize(value)
+            self.assertEqual(actual, expected)
+            roundtrip = intVectorSerializer.deserialize(actual)
+            self.assertEqual(value, roundtrip)
+            roundtrip = intVectorSerializer.buffer_deserialize(memoryview(actual))
+            self.assertEqual((value, len(actual)), roundtrip)
+        T([], b'00')
+        T([1, -1], b'0201000000ffffffff')
+
+    def test_truncated(self):
+        def T(serialized):
+            serialized = unhexlify(serialized)
+            with self.assertRaises(SerializationTruncationError):
+                intVectorSerializer.deserialize(serialized)
+            with self.assertRaises(SerializationTruncationError):
+                intVectorSerializer.buffer_deserialize(memoryview(serialized))
+        T(b'01')
+        T(b'0201000000')
+        T(b'ffffffffffffffffff01000000')
+
 class Test_Compact(unittest.TestCase):
     def test_from_compact_zero(self):
         self.assertEqual(uint256_from_compact(0x00123456), 0)
@@ -0,0 +1,175 @@
+# Copyright (C) 2013-2015 The python-gozerlib developers
+#
+# This file is part of python-gozerlib.
+#
+# It is subject to the license terms in the LICENSE file found in the top-level
+# directory of this distribution.
+#
+# No part of python-gozerlib, including this file, may be copied, modified,
+# propagated, or distributed except according to the terms contained in the
+# LICENSE file.
+
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+import hashlib
+import threading
+import unittest
+
+import gozer.core.key
+import gozer.core.scripteval
+from gozer.core import *
+from gozer.core.scripteval import (VerifyScript, VerifyTransaction, ScriptExecutionCache,
+                                   SCRIPT_VERIFY_P2SH, SCRIPT_VERIFY_STRICTENC)
+from gozer.core.sigcache import SignatureCache, _ENTRY_SIZE
+
+from gozer.tests.test_transactions import load_test_vectors
+
+def _fake_verify(pubkey, hash, sig): # pylint: disable=redefined-builtin
+    """Stand-in for CPubKey.verify that doesn't touch any ECDSA backend
+
+    Deterministic, and says about half of all signatures are valid.
+    """
+    return hashlib.sha256(hash + sig).digest()[0:1] < b'\x80'
+
+class Test_SignatureCache(unittest.TestCase):
+    def test_contains(self):
+        cache = SignatureCache()
+        self.assertFalse(cache.contains(b'\x00'*32, b'pubkey', b'sig'))
+        cache.add(b'\x00'*32, b'pubkey', b'sig')
+        self.assertTrue(cache.contains(b'\x00'*32, b'pubkey', b'sig'))
+        self.assertFalse(cache.contains(b'\x01'*32, b'pubkey', b'sig'))
+        self.assertFalse(cache.contains(b'\x00'*32, b'pubkex', b'sig'))
+        self.assertFalse(cache.contains(b'\x00'*32, b'pubkey', b'sih'))
+        self.assertFalse(cache.contains(b'\x00'*32, b'pubke', b'ysig'))
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+
+        self.assertTrue(cache.contains(b'\x00'*32, b'pubkey', b'sig', erase=True))
+        self.assertFalse(cache.contains(b'\x00'*32, b'pubkey', b'sig'))
+        self.assertEqual(len(cache), 0)
+
+        cache.add(b'\x00'*32, b'pubkey', b'sig')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 0))
+
+    def test_eviction(self):
+        cache = SignatureCache(max_size=3 * _ENTRY_SIZE)
+        self.assertEqual(cache.max_entries, 3)
+        for i in range(3):
+            cache.add(('%d' % i).encode('ascii'), b'', b'')
+        self.assertTrue(cache.contains(b'0', b'', b''))
+
+        # 1 is now the least recently used
+        cache.add(b'3', b'', b'')
+        self.assertEqual(len(cache), 3)
+        self.assertFalse(cache.contains(b'1', b'', b''))
+        for i in (0, 2, 3):
+            self.assertTrue(cache.contains(('%d' % i).encode('ascii'), b'', b''))
+
+    def test_threads(self):
+        cache = SignatureCache(max_size=100 * _ENTRY_SIZE)
+        def T(n):
+            for i in range(1000):
+                cache.add(('%d' % n).encode('ascii'), ('%d' % i).encode('ascii'), b'')
+                cache.contains(('%d' % n).encode('ascii'), ('%d' % i).encode('ascii'), b'')
+        threads = [threading.Thread(target=T, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(cache), 100)
+        self.assertEqual(cache.hits + cache.misses, 4000)
+
+    def test_VerifyScript(self):
+        verify_calls = [0]
+        orig_verify = gozer.core.key.CPubKey.verify
+        def verify(self, hash, sig):
+            verify_calls[0] += 1
+            return _fake_verify(self, hash, sig)
+
+        cache = SignatureCache()
+        def verify_all():
+            verify_calls[0] = 0
+            for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+                flags = set()
+                if enforceP2SH:
+                    flags.add(SCRIPT_VERIFY_P2SH)
+                for i in range(len(tx.vin)):
+                    try:
+                        VerifyScript(tx.vin[i].scriptSig, prevouts[tx.vin[i].prevout], tx, i,
+                                     flags=flags, sigcache=cache)
+                    except ValidationError:
+                        pass
+            return verify_calls[0]
+
+        gozer.core.key.CPubKey.verify = verify
+        try:
+            first = verify_all()
+            n = len(cache)
+            first_hits = cache.hits # some vectors repeat signatures
+            self.assertTrue(n > 0)
+
+            # Every valid signature is now found in the cache
+            second = verify_all()
+            self.assertEqual(len(cache), n)
+            self.assertEqual(second, first - n)
+            self.assertEqual(cache.hits - first_hits, n + first_hits)
+        finally:
+            gozer.core.key.CPubKey.verify = orig_verify
+
+class Test_ScriptExecutionCache(unittest.TestCase):
+    def test_flags(self):
+        cache = ScriptExecutionCache()
+        tx = CTransaction([CTxIn()], [CTxOut()])
+        cache.add(tx, {SCRIPT_VERIFY_P2SH, SCRIPT_VERIFY_STRICTENC})
+        self.assertTrue(cache.contains(tx, [SCRIPT_VERIFY_STRICTENC, SCRIPT_VERIFY_P2SH]))
+        self.assertFalse(cache.contains(tx, {SCRIPT_VERIFY_P2SH}))
+        self.assertFalse(cache.contains(tx, ()))
+        self.assertFalse(cache.contains(CTransaction([CTxIn()], [CTxOut()], nLockTime=1),
+                                        {SCRIPT_VERIFY_P2SH, SCRIPT_VERIFY_STRICTENC}))
+        with self.assertRaises(ValueError):
+            cache.contains(tx, {object()})
+
+    def test_VerifyTransaction(self):
+        verify_calls = [0]
+        orig_VerifyScript = gozer.core.scripteval.VerifyScript
+        def counting_VerifyScript(*args, **kwargs):
+            verify_calls[0] += 1
+            return orig_VerifyScript(*args, **kwargs)
+
+        cache = ScriptExecutionCache()
+        def verify_all():
+            verify_calls[0] = 0
+            valid = 0
+            for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+                if tx.is_coinbase():
+                    # Nothing to verify, so never cached
+                    VerifyTransaction(tx, {}, script_cache=cache)
+                    continue
+                flags = set()
+                if enforceP2SH:
+                    flags.add(SCRIPT_VERIFY_P2SH)
+                try:
+                    VerifyTransaction(tx, prevouts, flags, script_cache=cache)
+                except ValidationError:
+                    continue
+                valid += 1
+            return valid, verify_calls[0]
+
+        orig_verify = gozer.core.key.CPubKey.verify
+        gozer.core.scripteval.VerifyScript = counting_VerifyScript
+        gozer.core.key.CPubKey.verify = _fake_verify
+        try:
+            (valid, first) = verify_all()
+            first_hits = cache.hits # some vectors are repeated
+            self.assertTrue(valid > 0)
+            self.assertTrue(len(cache) > 0)
+
+            # Only the transactions that failed are verified again
+            (valid2, second) = verify_all()
+            self.assertEqual(valid2, valid)
+            self.assertTrue(second < first)
+            self.assertEqual(cache.hits - first_hits, valid)
+        finally:
+            gozer.core.scripteval.VerifyScript = orig_VerifyScript
+            gozer.core.key.CPubKey.verify = orig_verify
@@ -13,8 +13,8 @@ from __future__ import absolute_import, division, print_function, unicode_litera
 
 import unittest
 
-from gozer.wallet import CGozerSecret
-from gozer.signmessage import GozerMessage, VerifyMessage, SignMessage
+from gozer.wallet import CGozerSecret, P2PKHGozerAddress
+from gozer.signmessage import GozerMessage, VerifyMessage, VerifyMessages, SignMessage
 import sys
 import os
 import json
@@ -67,6 +67,26 @@ class Test_SignVerifyMessage(unittest.TestCase):
             self.assertTrue(signature, "Failed to sign for [%s]" % vector['address'])
             self.assertTrue(VerifyMessage(vector['address'], message, vector['signature']), "Failed to verify signature for [%s]" % vector['address'])
 
+    def test_verify_messages(self):
+        items = []
+        for i in range(6):
+            key = CGozerSecret.from_secret_bytes(bytes(bytearray([i + 1] * 32)), compressed=i % 2 == 0)
+            address = P2PKHGozerAddress.from_pubkey(key.pub)
+            message = GozerMessage("message %d" % i)
+            items.append((address, message, SignMessage(key, message)))
+
+        # Signed by someone else, for a different message, and not base64
+        items[1] = (items[1][0], items[1][1], items[2][2])
+        items[3] = (items[3][0], GozerMessage("other"), items[3][2])
+        items[4] = (items[4][0], items[4][1], "=")
+
+        expected = [True, False, True, False, False, True]
+        self.assertEqual(VerifyMessages(items), expected)
+        self.assertEqual(VerifyMessages(iter(items), workers=2, batch_size=2), expected)
+        for ((address, message, sig), valid) in zip(items, expected):
+            if valid:
+                self.assertTrue(VerifyMessage(address, message, sig))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -12,11 +12,16 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import json
+import struct
 import unittest
 import os
 
 from gozer.core import *
+from gozer.core.script import (CScript, FindAndDelete, OP_CODESEPARATOR, RawSignatureHash,
+                                PrecomputedTransactionData, SIGHASH_ALL, SIGHASH_NONE,
+                                SIGHASH_SINGLE, SIGHASH_ANYONECANPAY)
 from gozer.core.scripteval import VerifyScript, SCRIPT_VERIFY_P2SH
+from gozer.core.serialize import SerializationTruncationError
 
 from gozer.tests.test_scripteval import parse_script
 
@@ -49,6 +54,22 @@ class Test_COutPoint(unittest.TestCase):
         self.assertFalse(COutPoint(hash=b'\x00'*31 + b'\x01').is_null())
         self.assertFalse(COutPoint(n=1).is_null())
 
+    def test_array(self):
+        outpoints = [COutPoint(Hash(b'\x00'*i), i) for i in range(10)]
+        serialized = COutPoint.serialize_array(outpoints)
+        self.assertEqual(serialized, b''.join(o.serialize() for o in outpoints))
+
+        outpoints2, offset = COutPoint.deserialize_array(serialized)
+        self.assertEqual(outpoints2, outpoints)
+        self.assertEqual(offset, 360)
+
+        outpoints2, offset = COutPoint.deserialize_array(memoryview(serialized), 36, 2)
+        self.assertEqual(outpoints2, outpoints[1:3])
+        self.assertEqual(offset, 108)
+
+        with self.assertRaises(SerializationTruncationError):
+            COutPoint.deserialize_array(serialized[:-1])
+
     def test_repr(self):
         def T(outpoint, expected):
             actual = repr(outpoint)
@@ -103,6 +124,64 @@ class Test_CMutableTxIn(unittest.TestCase):
 
         self.assertNotEqual(h1, txin.GetHash())
 
+class Test_CLazyTransaction(unittest.TestCase):
+    def assertLazyEqual(self, tx, lazy_tx):
+        self.assertIsInstance(lazy_tx, CLazyTransaction)
+        self.assertEqual(lazy_tx.GetTxid(), tx.GetTxid())
+        self.assertEqual(lazy_tx.GetHash(), tx.GetHash())
+        self.assertEqual(lazy_tx.has_witness(), tx.has_witness())
+        self.assertEqual(lazy_tx.serialize(), tx.serialize())
+        self.assertEqual(lazy_tx.vin, tx.vin)
+        self.assertEqual(lazy_tx.vout, tx.vout)
+        self.assertEqual(lazy_tx.wit, tx.wit)
+        self.assertEqual(lazy_tx.nLockTime, tx.nLockTime)
+        self.assertEqual(lazy_tx.nVersion, tx.nVersion)
+        self.assertEqual(lazy_tx, tx)
+        self.assertEqual(hash(lazy_tx), hash(tx))
+
+    def test_vectors(self):
+        for name in ('tx_valid.json', 'tx_invalid.json'):
+            for prevouts, tx, enforceP2SH in load_test_vectors(name):
+                serialized = tx.serialize()
+                self.assertLazyEqual(tx, CLazyTransaction.deserialize(serialized))
+                self.assertLazyEqual(tx, CLazyTransaction.deserialize(serialized, zerocopy=True))
+
+    def test_witness(self):
+        serialized = x('0100000000010115e180dc28a2327e687facc33f10f2a20da717e5548406f7ae8b4c811072f8560100000000ffffffff0100b4f505000000001976a9141d7cd6c75c2e86f4cbf98eaed221b30bd9a0b92888ac02483045022100df7b7e5cda14ddf91290e02ea10786e03eb11ee36ec02dd862fe9a326bbcb7fd02203f5b4496b667e6e281cc654a2da9e4f08660c620a1051337fa8965f727eb19190121038262a6c6cec93c2d3ecd6c6072efea86d02ff8e3328bbd0242b20af3425990ac00000000')
+        tx = CTransaction.deserialize(serialized)
+        lazy_tx = CLazyTransaction.deserialize(serialized)
+        self.assertTrue(lazy_tx.has_witness())
+        self.assertLazyEqual(tx, lazy_tx)
+        self.assertEqual(lazy_tx.serialize(dict(include_witness=False)),
+                         tx.serialize(dict(include_witness=False)))
+
+    def test_from_tx(self):
+        tx = CTransaction([CTxIn(COutPoint(b'\x11'*32, 1), CScript([1]))],
+                          [CTxOut(42, CScript([2]))], nLockTime=3)
+        lazy_tx = CLazyTransaction.from_tx(tx)
+        self.assertLazyEqual(tx, lazy_tx)
+        self.assertIs(CLazyTransaction.from_tx(lazy_tx), lazy_tx)
+        self.assertIs(CTransaction.from_tx(lazy_tx), lazy_tx)
+        self.assertEqual(CMutableTransaction.from_tx(lazy_tx), tx)
+
+        with self.assertRaises(TypeError):
+            CLazyTransaction(tx.vin, tx.vout)
+
+    def test_non_canonical(self):
+        """Non-canonical CompactSizes fall back to a regular CTransaction"""
+        tx = CTransaction([CTxIn(COutPoint(b'\x11'*32, 1), CScript([1]))],
+                          [CTxOut(42, CScript([2]))])
+        serialized = tx.serialize()
+        serialized = serialized[:4] + b'\xfd\x01\x00' + serialized[5:]
+        tx2 = CLazyTransaction.deserialize(serialized)
+        self.assertIs(tx2.__class__, CTransaction)
+        self.assertEqual(tx2, tx)
+
+    def test_truncated(self):
+        serialized = CTransaction([CTxIn()], [CTxOut()]).serialize()
+        with self.assertRaises(SerializationTruncationError):
+            CLazyTransaction.deserialize(serialized[:-1])
+
 class Test_CTransaction(unittest.TestCase):
     def test_is_coinbase(self):
         tx = CMutableTransaction()
@@ -120,6 +199,143 @@ class Test_CTransaction(unittest.TestCase):
         tx.vin.append(CTxIn())
         self.assertFalse(tx.is_coinbase())
 
+    def test_zerocopy_deserialize(self):
+        for name in ('tx_valid.json', 'tx_invalid.json'):
+            for prevouts, tx, enforceP2SH in load_test_vectors(name):
+                serialized = tx.serialize()
+                tx2 = CTransaction.deserialize(serialized, zerocopy=True)
+                self.assertEqual(tx, tx2)
+                self.assertEqual(tx.GetTxid(), tx2.GetTxid())
+                self.assertEqual(tx2.serialize(), serialized)
+
+                with self.assertRaises(SerializationTruncationError):
+                    CTransaction.deserialize(serialized[:-1], zerocopy=True)
+
+    def test_from_fields(self):
+        outpoint = COutPoint._from_fields(b'\x11'*32, 2)
+        self.assertEqual(outpoint, COutPoint(b'\x11'*32, 2))
+        txin = CTxIn._from_fields(outpoint, CScript([1]), 3)
+        self.assertEqual(txin, CTxIn(outpoint, CScript([1]), 3))
+        txout = CTxOut._from_fields(4, CScript([5]))
+        self.assertEqual(txout, CTxOut(4, CScript([5])))
+        tx = CTransaction._from_fields((txin,), (txout,), 6, 7)
+        self.assertEqual(tx, CTransaction([txin], [txout], 6, 7))
+        self.assertEqual(tx.wit, CTxWitness())
+
+        mtx = CMutableTransaction._from_fields((txin,), (txout,), 6, 7)
+        self.assertEqual(mtx, tx)
+        mtx.vin.append(txin)
+
+    def test_retained_raw(self):
+        """Hashes of deserialized transactions match freshly built ones"""
+        serialized = x('0100000000010115e180dc28a2327e687facc33f10f2a20da717e5548406f7ae8b4c811072f8560100000000ffffffff0100b4f505000000001976a9141d7cd6c75c2e86f4cbf98eaed221b30bd9a0b92888ac02483045022100df7b7e5cda14ddf91290e02ea10786e03eb11ee36ec02dd862fe9a326bbcb7fd02203f5b4496b667e6e281cc654a2da9e4f08660c620a1051337fa8965f727eb19190121038262a6c6cec93c2d3ecd6c6072efea86d02ff8e3328bbd0242b20af3425990ac00000000')
+        for zerocopy in (False, True):
+            tx = CTransaction.deserialize(serialized, zerocopy=zerocopy)
+            tx2 = CTransaction(tx.vin, tx.vout, tx.nLockTime, tx.nVersion, tx.wit)
+            self.assertEqual(tx.serialize(), serialized)
+            self.assertEqual(tx.GetHash(), tx2.GetHash())
+            self.assertEqual(tx.GetTxid(), tx2.GetTxid())
+            self.assertEqual(tx.serialize(dict(include_witness=False)),
+                             tx2.serialize(dict(include_witness=False)))
+
+            mtx = CMutableTransaction.deserialize(serialized, zerocopy=zerocopy)
+            self.assertEqual(mtx.GetTxid(), tx.GetTxid())
+            mtx.nLockTime = 1
+            self.assertNotEqual(mtx.GetTxid(), tx.GetTxid())
+            self.assertNotEqual(mtx.serialize(), serialized)
+
+        # Marker and flag with an empty witness serialize without them
+        stripped = tx.serialize(dict(include_witness=False))
+        empty_witness = stripped[:4] + b'\x00\x01' + stripped[4:-4] + b'\x00' + stripped[-4:]
+        tx = CTransaction.deserialize(empty_witness)
+        self.assertFalse(tx.has_witness())
+        self.assertEqual(tx.serialize(), stripped)
+        self.assertEqual(tx.GetHash(), tx.GetTxid())
+
+        # Non-canonical encodings aren't what the transaction serializes to
+        non_canonical = stripped[:4] + b'\xfd\x01\x00' + stripped[5:]
+        tx = CTransaction.deserialize(non_canonical)
+        self.assertEqual(tx.serialize(), stripped)
+        self.assertEqual(tx.GetHash(), Hash(stripped))
+
+    def test_size(self):
+        segwit = x('0100000000010115e180dc28a2327e687facc33f10f2a20da717e5548406f7ae8b4c811072f8560100000000ffffffff0100b4f505000000001976a9141d7cd6c75c2e86f4cbf98eaed221b30bd9a0b92888ac02483045022100df7b7e5cda14ddf91290e02ea10786e03eb11ee36ec02dd862fe9a326bbcb7fd02203f5b4496b667e6e281cc654a2da9e4f08660c620a1051337fa8965f727eb19190121038262a6c6cec93c2d3ecd6c6072efea86d02ff8e3328bbd0242b20af3425990ac00000000')
+        segwit_tx = CTransaction.deserialize(segwit)
+        txs = [tx for name in ('tx_valid.json', 'tx_invalid.json')
+                  for prevouts, tx, enforceP2SH in load_test_vectors(name)]
+        txs.append(segwit_tx)
+
+        for tx in txs:
+            serialized = tx.serialize()
+            stripped = tx.serialize(dict(include_witness=False))
+            for tx2 in (tx,
+                        CTransaction(tx.vin, tx.vout, tx.nLockTime, tx.nVersion, tx.wit),
+                        CLazyTransaction.deserialize(serialized),
+                        CMutableTransaction.from_tx(tx)):
+                self.assertEqual(tx2.size(), len(serialized))
+                self.assertEqual(tx2.stripped_size(), len(stripped))
+                self.assertEqual(tx2.weight(), len(stripped) * 3 + len(serialized))
+                self.assertEqual(tx2.vsize(), (tx2.weight() + 3) // 4)
+
+        self.assertEqual(segwit_tx.size(), len(segwit))
+        self.assertEqual(segwit_tx.stripped_size(), 85)
+        self.assertEqual(segwit_tx.weight(), 450)
+        self.assertEqual(segwit_tx.vsize(), 113)
+
+        # Not cached on mutable transactions
+        mtx = CMutableTransaction.from_tx(segwit_tx)
+        self.assertEqual(mtx.size(), len(segwit))
+        mtx.vout[0].scriptPubKey = CScript([1])
+        self.assertEqual(mtx.size(), len(mtx.serialize()))
+        self.assertEqual(mtx.stripped_size(), len(mtx.serialize(dict(include_witness=False))))
+
+    def test_RawSignatureHash(self):
+        def T(script, txTo, inIdx, hashtype):
+            # Reference implementation: actually build the modified transaction
+            if inIdx >= len(txTo.vin):
+                return None
+            txtmp = CMutableTransaction.from_tx(txTo)
+            for txin in txtmp.vin:
+                txin.scriptSig = CScript()
+            txtmp.vin[inIdx].scriptSig = FindAndDelete(script, CScript([OP_CODESEPARATOR]))
+            if hashtype & 0x1f in (SIGHASH_NONE, SIGHASH_SINGLE):
+                if hashtype & 0x1f == SIGHASH_NONE:
+                    txtmp.vout = []
+                else:
+                    if inIdx >= len(txtmp.vout):
+                        return None
+                    txtmp.vout = [CTxOut()] * inIdx + [txtmp.vout[inIdx]]
+                for i in range(len(txtmp.vin)):
+                    if i != inIdx:
+                        txtmp.vin[i].nSequence = 0
+            if hashtype & SIGHASH_ANYONECANPAY:
+                txtmp.vin = [txtmp.vin[inIdx]]
+            txtmp.wit = CTxWitness()
+            expected = Hash(txtmp.serialize() + struct.pack(b"<i", hashtype))
+
+            self.assertEqual(RawSignatureHash(script, txTo, inIdx, hashtype), (expected, None))
+            self.assertEqual(RawSignatureHash(script, txTo, inIdx, hashtype,
+                                              PrecomputedTransactionData(txTo)),
+                             (expected, None))
+
+        hashtypes = [SIGHASH_ALL, SIGHASH_NONE, SIGHASH_SINGLE, 0, 4, 0x7fffffff, -1]
+        hashtypes += [hashtype | SIGHASH_ANYONECANPAY for hashtype in hashtypes]
+        for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
+            for i in range(len(tx.vin)):
+                script = prevouts[tx.vin[i].prevout]
+                for hashtype in hashtypes:
+                    T(script, tx, i, hashtype)
+                    T(script, CMutableTransaction.from_tx(tx), i, hashtype)
+
+        # The SIGHASH_SINGLE bug
+        tx = CTransaction([CTxIn(), CTxIn()], [CTxOut()])
+        (h, err) = RawSignatureHash(CScript(), tx, 1, SIGHASH_SINGLE)
+        self.assertEqual(h, b'\x01' + b'\x00'*31)
+        self.assertIsNotNone(err)
+        (h, err) = RawSignatureHash(CScript(), tx, 2, SIGHASH_ALL)
+        self.assertEqual(h, b'\x01' + b'\x00'*31)
+        self.assertIsNotNone(err)
+
     def test_tx_valid(self):
         for prevouts, tx, enforceP2SH in load_test_vectors('tx_valid.json'):
             try:
@@ -156,15 +156,27 @@ class P2PKHGozerAddress(CGozerAddress):
 
         accept_bare_checksig          - Treat bare-checksig as P2PKH scriptPubKeys (default True)
         """
-        if accept_non_canonical_pushdata:
-            # Canonicalize script pushes
-            scriptPubKey = script.CScript(scriptPubKey) # in case it's not a CScript instance yet
+        scriptPubKey = script.CScript(scriptPubKey) # in case it's not a CScript instance yet
 
+        # Scripts are almost always already canonical, so the raw bytes are
+        # matched first, and only canonicalized if that fails.
+        addr = cls._from_canonical_scriptPubKey(scriptPubKey, accept_bare_checksig)
+        if addr is None and accept_non_canonical_pushdata:
+            # Canonicalize script pushes
             try:
                 scriptPubKey = script.CScript(tuple(scriptPubKey)) # canonicalize
             except gozer.core.script.CScriptInvalidError:
                 raise CGozerAddressError('not a P2PKH scriptPubKey: script is invalid')
 
+            addr = cls._from_canonical_scriptPubKey(scriptPubKey, accept_bare_checksig)
+
+        if addr is None:
+            raise CGozerAddressError('not a P2PKH scriptPubKey')
+        return addr
+
+    @classmethod
+    def _from_canonical_scriptPubKey(cls, scriptPubKey, accept_bare_checksig):
+        # Match the raw bytes of scriptPubKey; None if not P2PKH
         if scriptPubKey.is_witness_v0_keyhash():
             return cls.from_bytes(scriptPubKey[2:22], gozer.params.BASE58_PREFIXES['PUBKEY_ADDR'])
         elif scriptPubKey.is_witness_v0_nested_keyhash():
@@ -180,8 +192,8 @@ class P2PKHGozerAddress(CGozerAddress):
         elif accept_bare_checksig:
             pubkey = None
 
-            # We can operate on the raw bytes directly because we've
-            # canonicalized everything above.
+            # We can operate on the raw bytes directly because non-canonical
+            # scripts are canonicalized before being matched again.
             if (len(scriptPubKey) == 35 # compressed
                   and _bord(scriptPubKey[0])  == 0x21
                   and _bord(scriptPubKey[34]) == script.OP_CHECKSIG):
@@ -197,7 +209,7 @@ class P2PKHGozerAddress(CGozerAddress):
             if pubkey is not None:
                 return cls.from_pubkey(pubkey, accept_invalid=True)
 
-        raise CGozerAddressError('not a P2PKH scriptPubKey')
+        return None
 
     def to_scriptPubKey(self, nested=False):
         """Convert an address to a scriptPubKey"""
@@ -215,21 +227,27 @@ class CKey(object):
 
     """
     def __init__(self, secret, compressed=True):
-        self._cec_key = gozer.core.key.CECKey()
-        self._cec_key.set_secretbytes(secret)
-        self._cec_key.set_compressed(compressed)
+        self._backend = gozer.core.key._backend
+        self._key = self._backend.secret_key(secret)
 
-        self.pub = gozer.core.key.CPubKey(self._cec_key.get_pubkey(), self._cec_key)
+        self.pub = gozer.core.key.CPubKey(self._backend.get_pubkey(self._key, compressed))
 
     @property
     def is_compressed(self):
         return self.pub.is_compressed
 
     def sign(self, hash):
-        return self._cec_key.sign(hash)
+        return self._backend.sign(self._key, hash)
+
+    def sign_many(self, hashes):
+        """Sign many hashes, returning a list of DER signatures
+
+        Faster than calling sign() for each, as the key is only set up once.
+        """
+        return self._backend.sign_many(self._key, hashes)
 
     def sign_compact(self, hash):
-        return self._cec_key.sign_compact(hash)
+        return self._backend.sign_compact(self._key, hash)
 
 class CGozerSecretError(gozer.base58.Base58Error):
     pass
@@ -24,5 +24,6 @@ setup(name='python-gozerlib',
       packages=find_packages(),
       zip_safe=False,
       install_requires=requires,
+      extras_require={'numpy': ['numpy']},
       test_suite="gozer.tests"
      )